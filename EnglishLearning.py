@@ -1,11 +1,19 @@
 import streamlit as st
-import pandas as pd
 import random
-from deep_translator import GoogleTranslator
-from gtts import gTTS
 import io
 import os
+import threading
 from hybrid_progress_manager import HybridProgressManager
+from deck_cache import DeckFormatError, load_deck_from_path, load_deck_from_bytes, uploaded_deck_name
+from deck_catalog import get_deck_catalog
+from deck_loader import DECK_EXTENSIONS
+from deck_registry import get_deck_registry
+from translation_cache import get_translation_cache
+from pretranslation import start_pretranslation
+from audio_cache import get_audio_cache
+from scheduler import LeitnerScheduler
+from answer_matching import NEAR_MISS, AnswerIndex
+import perf_metrics
 
 # Configurazione pagina per mobile
 st.set_page_config(
@@ -66,39 +74,77 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def normalize_text(text):
-    """Normalizza il testo per il confronto: minuscolo, senza spazi extra"""
-    if not text:
-        return ""
-    return text.strip().lower()
+# Codici del traduttore per le lingue scritte nella prima riga dei mazzi
+LANG_CODES = {"english": "en", "italian": "it"}
+
+
+def tts_lang_code(lang):
+    """Codice lingua per gTTS"""
+    return 'en' if lang == 'english' else 'it'
 
 def text_to_speech(text, lang):
-    """Genera audio dal testo usando gTTS"""
+    """Genera audio dal testo usando gTTS (con cache audio condivisa)"""
     try:
-        # Determina il codice lingua per gTTS
-        lang_code = 'en' if lang == 'english' else 'it'
-        tts = gTTS(text=text, lang=lang_code, slow=False)
-        audio_bytes = io.BytesIO()
-        tts.write_to_fp(audio_bytes)
-        audio_bytes.seek(0)
-        return audio_bytes
+        audio = get_audio_cache().get_or_generate(text, tts_lang_code(lang), slow=False)
+        return io.BytesIO(audio)
     except Exception as e:
         st.error(f"Errore nella generazione audio: {e}")
         return None
 
+SMART_ORDER = "Ripasso intelligente"
+
+def get_scheduler(deck_name, words, progress_manager, deck_loaded=True):
+    """Scheduler di ripasso del mazzo, ricostruito dallo stato salvato quando cambia il mazzo
+    (e una volta a fine caricamento, per ritrovare lo stato delle parole lette in background)"""
+    if st.session_state.get('scheduler_deck') != (deck_name, deck_loaded):
+        st.session_state.scheduler = LeitnerScheduler(words, progress_manager.get_schedules())
+        st.session_state.scheduler_deck = (deck_name, deck_loaded)
+    return st.session_state.scheduler
+
+def get_next_idx(word_order, words_count, scheduler=None):
+    """Indice della prossima parola; in modalità casuale viene estratto in anticipo per il prefetch"""
+    if word_order == SMART_ORDER and scheduler is not None:
+        return scheduler.next_index(exclude=st.session_state.current_idx)
+    if word_order == "Casuale":
+        next_idx = st.session_state.get('next_idx')
+        if next_idx is None or next_idx >= words_count:
+            st.session_state.next_idx = random.randint(0, words_count-1)
+        return st.session_state.next_idx
+    return (st.session_state.current_idx + 1) % words_count
+
+def render_metrics(placeholder):
+    """Mostra i tempi per fase del rerun corrente (solo con PERF_METRICS=1)"""
+    metrics = perf_metrics.current()
+    if metrics is not None:
+        with placeholder.container():
+            st.caption("Tempi del rerun (ms)")
+            st.json(metrics.report())
+
 def main():
+    perf_metrics.start_rerun()
     st.title("🎯 English Learning App")
 
     # --- Selettore file dalla cartella Files ---
     files_dir = "Files"
-    excel_files = [f for f in os.listdir(files_dir) if f.endswith(('.xlsx', '.xls'))]
-    selected_file = st.selectbox("📂 Scegli un file dalla cartella Files:", [""] + excel_files)
+    # Catalogo persistente: la cartella si ricontrolla solo se cambia, i mazzi nuovi si indicizzano in background
+    with perf_metrics.span("file_listing"):
+        catalog = get_deck_catalog(files_dir)
+        catalog.refresh()
+        deck_files = catalog.names()
+    # Chiave ed etichette fisse: se l'indicizzazione finisce durante la sessione il widget
+    # non cambia identità (e non torna al primo mazzo); i metadati si mostrano sotto
+    selected_file = st.selectbox("📂 Scegli un file dalla cartella Files:", [""] + deck_files,
+                                 key="deck_file")
+    if selected_file:
+        st.caption(catalog.describe(selected_file))
 
     # --- Caricamento manuale ---
     uploaded_file = st.file_uploader(
-        "📁 Carica il tuo file Excel",
-        type=['xlsx', 'xls'],
-        help="File con una colonna: prima riga la lingua, poi le parole"
+        "📁 Carica il tuo file (Excel, CSV o Parquet)",
+        type=[extension.lstrip('.') for extension in DECK_EXTENSIONS],
+        help="Prima colonna: le parole, con la lingua nella prima riga. Colonne successive "
+             "(facoltative): le traduzioni, con la loro lingua nella prima riga "
+             "(oppure \"english-italian\" nella prima cella)"
     )
 
     # --- Scegli il file da usare ---
@@ -110,42 +156,79 @@ def main():
 
     if file_to_use:
         try:
-            # Se file_to_use è un path, apri con open; se è UploadedFile, passa direttamente
-            if isinstance(file_to_use, str):
-                df = pd.read_excel(file_to_use, header=None)
-            else:
-                df = pd.read_excel(file_to_use, header=None)
-            if df.shape[1] != 1:
-                st.error("❌ Il file deve avere UNA sola colonna")
+            # Il mazzo compilato è condiviso tra le sessioni e ricaricato solo se il file cambia
+            try:
+                with perf_metrics.span("deck_load"):
+                    if isinstance(file_to_use, str):
+                        deck = load_deck_from_path(file_to_use)
+                        deck_name = selected_file
+                    else:
+                        deck = load_deck_from_bytes(file_to_use.getvalue(), file_to_use.name)
+                        deck_name = uploaded_deck_name(deck)
+            except DeckFormatError as e:
+                st.error(f"❌ {e}")
                 return
 
+            # La sessione tiene solo un riferimento al mazzo condiviso del processo
+            deck_handle = st.session_state.get('deck_handle')
+            if deck_handle is None or deck_handle.content_hash != deck.content_hash:
+                deck_handle = get_deck_registry().acquire(deck)
+                st.session_state.deck_handle = deck_handle
+            deck = deck_handle.deck
+
             # Prima riga: lingua
-            source_lang = df.iloc[0, 0].strip().lower()
-            words = df.iloc[1:, 0].dropna().tolist()
+            source_lang = deck.source_lang
+            words = deck.words
+            # I mazzi grandi si leggono in background: il quiz parte con le parole già lette
+            if deck.load_error:
+                st.warning(f"⚠️ Lettura del mazzo interrotta dopo {len(words)} parole: {deck.load_error}")
+            elif not deck.is_loaded:
+                st.caption(f"⏳ Caricamento del mazzo in corso: {len(words)} parole lette")
 
-            # Lingue disponibili
+            # Lingue disponibili: quelle standard più quelle incluse nel mazzo
             lang_options = ["english", "italian"]
-            answer_lang = st.selectbox("Scegli la lingua della risposta:", lang_options, index=1 if source_lang == "english" else 0)
+            lang_options += [lang for lang in deck.languages if lang not in lang_options]
+            if deck.languages:
+                # Con traduzioni incluse si propone la loro lingua: nessuna richiesta online
+                default_lang = lang_options.index(deck.languages[0])
+            else:
+                default_lang = 1 if source_lang == "english" else 0
+            answer_lang = st.selectbox("Scegli la lingua della risposta:", lang_options, index=default_lang)
 
             # Scelta ordine parole
-            order_options = ["Casuale", "Sequenziale"]
+            order_options = ["Casuale", "Sequenziale", SMART_ORDER]
             word_order = st.selectbox("Ordine delle parole:", order_options, index=0)
 
             # Inizializza il gestore del progresso
-            if 'progress_manager' not in st.session_state or st.session_state.get('current_file') != selected_file:
-                file_name = selected_file if selected_file else "uploaded_file.xlsx"
-                st.session_state.progress_manager = HybridProgressManager(file_name)
-                st.session_state.current_file = selected_file
+            with perf_metrics.span("manager_init"):
+                if 'progress_manager' not in st.session_state or st.session_state.get('current_file') != deck_name:
+                    if 'progress_manager' in st.session_state:
+                        # Cambio mazzo: scrive le risposte ancora in attesa del mazzo precedente e
+                        # rilascia thread, file e connessioni del suo backend, senza bloccare il rerun
+                        threading.Thread(target=st.session_state.progress_manager.close,
+                                         name="progress-close", daemon=True).start()
+                    st.session_state.progress_manager = HybridProgressManager(deck_name)
+                    st.session_state.current_file = deck_name
 
-            progress_manager = st.session_state.progress_manager
+                progress_manager = st.session_state.progress_manager
+                scheduler = get_scheduler(deck_name, words, progress_manager, deck.is_loaded)
 
             # Mostra info backend (solo per debug/info)
             backend_info = progress_manager.get_backend_info()
             with st.expander("ℹ️ Info Storage", expanded=False):
                 st.json(backend_info)
+                st.caption("Cache traduzioni")
+                st.json(get_translation_cache().get_stats())
+                st.caption("Mazzi condivisi")
+                st.json(get_deck_registry().get_stats())
+                st.caption("Catalogo della cartella Files")
+                st.json(catalog.get_stats())
+                # Riempito a fine rerun, quando tutte le fasi sono state misurate
+                metrics_placeholder = st.empty()
 
             # Mostra statistiche generali
-            total_stats = progress_manager.get_total_stats()
+            with perf_metrics.span("stats_fetch"):
+                total_stats = progress_manager.get_total_stats()
             if total_stats['total_attempts'] > 0:
                 st.markdown(f"""
                 <div class="progress-stats">
@@ -157,7 +240,10 @@ def main():
 
             # Inizializza sessione
             if 'current_idx' not in st.session_state:
-                st.session_state.current_idx = random.randint(0, len(words)-1) if word_order == "Casuale" else 0
+                if word_order == SMART_ORDER:
+                    st.session_state.current_idx = scheduler.next_index()
+                else:
+                    st.session_state.current_idx = random.randint(0, len(words)-1) if word_order == "Casuale" else 0
                 st.session_state.show_answer = False
                 st.session_state.answer_result = None
                 st.session_state.score = 0
@@ -170,7 +256,8 @@ def main():
             current_word = words[st.session_state.current_idx]
             
             # Ottieni statistiche per la parola corrente
-            correct_count, wrong_count = progress_manager.get_word_stats(current_word)
+            with perf_metrics.span("stats_fetch"):
+                correct_count, wrong_count = progress_manager.get_word_stats(current_word)
             word_attempts = correct_count + wrong_count
 
             st.markdown(f"""
@@ -187,21 +274,54 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
             
+            # Prepara in background l'audio della parola corrente e della successiva
+            next_idx = get_next_idx(word_order, len(words), scheduler)
+            with perf_metrics.span("tts"):
+                try:
+                    get_audio_cache().prefetch([current_word, words[next_idx]], tts_lang_code(source_lang))
+                except Exception:
+                    pass
+
             # Pulsante per ascoltare la parola
             if st.button("🔊 Ascolta", key="listen_btn"):
-                audio_bytes = text_to_speech(current_word, source_lang)
+                with perf_metrics.span("tts"):
+                    audio_bytes = text_to_speech(current_word, source_lang)
                 if audio_bytes:
                     st.audio(audio_bytes, format='audio/mp3')
 
             # Scegli la lingua di destinazione
-            dest_lang = "en" if answer_lang == "english" else "it"
-            src_lang = "en" if source_lang == "english" else "it"
+            dest_lang = LANG_CODES.get(answer_lang, answer_lang)
+            src_lang = LANG_CODES.get(source_lang, source_lang)
+
+            # Pre-traduzione in background delle parole senza traduzione inclusa (una sola volta
+            # per processo, a mazzo letto tutto; nel frattempo si traduce solo la parola corrente)
+            pretranslator = None
+            if deck.is_loaded:
+                bundled = deck.translations.get(answer_lang)
+                with perf_metrics.span("translation"):
+                    pretranslator = start_pretranslation(deck.content_hash, words, src_lang, dest_lang, bundled)
+                    ready, total = pretranslator.progress()
+                if ready < total:
+                    st.progress(ready / total, text=f"🌐 Traduzioni pronte: {ready}/{total}")
+
             try:
-                translation = GoogleTranslator(source=src_lang, target=dest_lang).translate(current_word)
+                with perf_metrics.span("translation"):
+                    # Le traduzioni incluse nel mazzo hanno la precedenza sul traduttore
+                    translation = deck.bundled_translation(st.session_state.current_idx, answer_lang)
+                    is_bundled = translation is not None
+                    if translation is None and pretranslator is not None:
+                        translation = pretranslator.get(current_word)
+                    if translation is None:
+                        # Parola non ancora pronta: la traduce subito con priorità
+                        translation = get_translation_cache().translate(current_word, src_lang, dest_lang)
             except Exception as e:
                 st.warning(f"⚠️ Impossibile ottenere la traduzione online. Usa 'Mostra traduzione' per vedere la risposta corretta.")
                 translation = current_word  # Fallback
-            possible_answers = [normalize_text(translation)]
+                is_bundled = False
+            # Varianti accettate (senza accenti/articoli, con tolleranza ai refusi), calcolate
+            # una volta per mazzo e condivise tra le sessioni
+            answer_index = deck_handle.index(("answers", src_lang, dest_lang),
+                                             lambda: AnswerIndex.for_deck(deck, answer_lang, background=True))
 
             # Input utente
             user_answer = st.text_input(
@@ -212,11 +332,19 @@ def main():
 
             # Verifica risposta
             if user_answer:
-                is_correct = normalize_text(user_answer) in possible_answers
-                st.session_state.answer_result = "correct" if is_correct else "wrong"
+                with perf_metrics.span("answer_check"):
+                    match = answer_index.check(current_word, [translation], user_answer, bundled=is_bundled)
+                is_correct = match.is_correct
+                if match.verdict == NEAR_MISS:
+                    st.session_state.answer_result = "near_miss"
+                else:
+                    st.session_state.answer_result = "correct" if is_correct else "wrong"
                 
                 # Registra la risposta nel sistema di progresso
-                progress_manager.record_answer(current_word, is_correct)
+                with perf_metrics.span("progress_write"):
+                    progress_manager.record_answer(current_word, is_correct)
+                    box, due = scheduler.record(current_word, is_correct, index=st.session_state.current_idx)
+                    progress_manager.save_schedule(current_word, box, due)
                 
                 if is_correct:
                     st.session_state.show_translation = True
@@ -228,6 +356,13 @@ def main():
                     🎉 CORRETTO! 🎉
                 </div>
                 """, unsafe_allow_html=True)
+            elif st.session_state.answer_result == "near_miss":
+                st.markdown("""
+                <div class="wrong-answer">
+                    ✏️ QUASI! Controlla l'ortografia e riprova
+                </div>
+                """, unsafe_allow_html=True)
+                st.caption(f"✏️ Si scrive \"{translation}\"")
             elif st.session_state.answer_result == "wrong" and user_answer:
                 st.markdown("""
                 <div class="wrong-answer">
@@ -243,7 +378,9 @@ def main():
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("⬅️ Precedente", key="prev_btn"):
-                    if word_order == "Casuale":
+                    if word_order == SMART_ORDER:
+                        st.session_state.current_idx = next_idx
+                    elif word_order == "Casuale":
                         st.session_state.current_idx = random.randint(0, len(words)-1)
                     else:
                         st.session_state.current_idx = (st.session_state.current_idx - 1) % len(words)
@@ -254,10 +391,8 @@ def main():
                     st.rerun()
             with col2:
                 if st.button("➡️ Prossima", key="next_btn"):
-                    if word_order == "Casuale":
-                        st.session_state.current_idx = random.randint(0, len(words)-1)
-                    else:
-                        st.session_state.current_idx = (st.session_state.current_idx + 1) % len(words)
+                    st.session_state.current_idx = next_idx
+                    st.session_state.next_idx = None
                     st.session_state.show_answer = False
                     st.session_state.answer_result = None
                     st.session_state.input_key += 1
@@ -276,7 +411,9 @@ def main():
                     st.rerun()
             with col5:
                 if st.button("🔁 Reinizia", key="restart_btn"):
-                    if word_order == "Casuale":
+                    if word_order == SMART_ORDER:
+                        st.session_state.current_idx = scheduler.next_index()
+                    elif word_order == "Casuale":
                         st.session_state.current_idx = random.randint(0, len(words)-1)
                     else:
                         st.session_state.current_idx = 0
@@ -300,10 +437,11 @@ def main():
                         st.metric("Precisione", f"{total_stats['accuracy_percentage']}%")
                     
                     # Parole difficili
-                    difficult_words = progress_manager.get_difficult_words()
+                    with perf_metrics.span("stats_fetch"):
+                        difficult_words = progress_manager.get_difficult_words(limit=5)
                     if difficult_words:
                         st.subheader("🔴 Parole da ripassare")
-                        for i, word_data in enumerate(difficult_words[:5]):  # Top 5
+                        for i, word_data in enumerate(difficult_words):  # Top 5
                             error_rate = word_data['error_rate'] * 100
                             st.write(f"{i+1}. **{word_data['word']}** - "
                                    f"Errori: {error_rate:.1f}% "
@@ -317,19 +455,29 @@ def main():
                 else:
                     st.info("Inizia a praticare per vedere le statistiche!")
 
+            render_metrics(metrics_placeholder)
+
         except Exception as e:
             st.error(f"❌ Errore nel caricamento: {e}")
 
     else:
-        st.info("📱 Carica un file Excel per iniziare!")
-        with st.expander("📋 Come preparare il file Excel"):
+        st.info("📱 Carica un file per iniziare!")
+        with st.expander("📋 Come preparare il file"):
             st.markdown("""
-            1. Crea un file Excel con UNA sola colonna:
+            1. Crea un file Excel (o CSV/Parquet) con le parole nella prima colonna:
                - Prima riga: la lingua ("english" o "italian")
                - Righe successive: le parole
-            2. Salva il file come .xlsx
-            3. Caricalo usando il pulsante sopra
+            2. Facoltativo: aggiungi una o più colonne con le traduzioni
+               - Prima riga: la lingua della traduzione (es. "italian"),
+                 oppure scrivi la coppia nella prima cella (es. "english-italian")
+               - Più colonne nella stessa lingua sono traduzioni alternative
+               - Le parole con la traduzione inclusa non richiedono connessione
+            3. Salva il file come .xlsx, .csv o .parquet
+            4. Caricalo usando il pulsante sopra
             """)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        perf_metrics.finish_rerun()
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Confronto tra la risposta dell'utente e la traduzione attesa.
+Separato dall'interfaccia così può essere usato (e misurato) senza avviare Streamlit.
+
+Ogni traduzione accettata viene ridotta a una forma canonica (minuscolo, senza
+accenti, punteggiatura e articoli iniziali). Le celle del mazzo possono elencare
+traduzioni alternative separate da "/"; le traduzioni automatiche valgono solo
+intere. Le risposte con pochi errori di battitura vengono riconosciute con una
+ricerca a distanza di modifica limitata. Il verdetto è graduato: esatta, quasi
+corretta o errata; solo la risposta esatta conta come corretta, quella quasi
+corretta serve a indicare l'ortografia giusta.
+"""
+
+import re
+import sys
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+EXACT = "exact"
+NEAR_MISS = "near_miss"
+WRONG = "wrong"
+
+# Articoli iniziali ignorati nel confronto (italiano e inglese)
+ARTICLES = frozenset({
+    "il", "lo", "la", "i", "gli", "le", "un", "uno", "una",
+    "the", "a", "an", "to"
+})
+# Separatore tra traduzioni alternative in una cella del mazzo ("casa / abitazione")
+VARIANT_SEPARATOR = re.compile(r"\s*/\s*")
+# Massimo numero di refusi tollerati (vedi allowed_typos)
+MAX_TYPOS = 2
+
+# Solo articoli elisi: le preposizioni articolate ("nell'", "dell'") fanno parte della risposta
+_ELIDED_ARTICLE = re.compile(r"^(l|un)'\s*")
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalizza il testo per il confronto: minuscolo, senza spazi extra"""
+    if not text:
+        return ""
+    return text.strip().lower()
+
+
+def fold_accents(text: str) -> str:
+    """Rimuove accenti e segni diacritici ("città" -> "citta")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def canonical_form(text) -> str:
+    """Forma canonica usata per il confronto: senza accenti, punteggiatura e articolo iniziale."""
+    text = fold_accents(normalize_text(str(text) if text is not None else ""))
+    text = text.replace("’", "'")
+    text = _ELIDED_ARTICLE.sub("", text)
+    text = _SPACES.sub(" ", _NON_WORD.sub(" ", text)).strip()
+    tokens = text.split(" ")
+    if len(tokens) > 1 and tokens[0] in ARTICLES:
+        tokens = tokens[1:]
+    return " ".join(tokens)
+
+
+def split_variants(translation) -> List[str]:
+    """Divide una cella del mazzo con più traduzioni alternative."""
+    if translation is None:
+        return []
+    return [part for part in VARIANT_SEPARATOR.split(str(translation).strip()) if part]
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    Distanza di Levenshtein, interrotta appena supera max_distance.
+
+    Returns:
+        La distanza, oppure max_distance + 1 se è maggiore del limite
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, ch_b in enumerate(b, 1):
+            cost = 0 if ch_a == ch_b else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+def allowed_typos(text: str) -> int:
+    """
+    Errori di battitura tollerati in base alla lunghezza della risposta.
+
+    Le parole corte non ne tollerano: una lettera diversa dà spesso un'altra
+    parola ("pane" invece di "cane").
+    """
+    if len(text) <= 4:
+        return 0
+    if len(text) <= 7:
+        return 1
+    return MAX_TYPOS
+
+
+class MatchResult(NamedTuple):
+    verdict: str
+    # Variante accettata più vicina alla risposta (forma canonica)
+    matched: Optional[str] = None
+    distance: int = 0
+
+    @property
+    def is_correct(self) -> bool:
+        """Solo le risposte esatte sono corrette: quelle quasi corrette non promuovono la parola."""
+        return self.verdict == EXACT
+
+
+class VariantMatcher:
+    """Varianti accettate per una parola, pronte per il confronto."""
+
+    __slots__ = ("variants",)
+
+    def __init__(self, translations: Iterable, bundled: bool = False):
+        """
+        Args:
+            translations: Traduzioni accettate
+            bundled: True per le celle del mazzo, che possono elencare alternative
+                separate da "/"; le traduzioni automatiche non vengono divise
+        """
+        forms = []
+        for translation in translations:
+            for variant in (split_variants(translation) if bundled else [str(translation)]):
+                form = canonical_form(variant)
+                if form and form not in forms:
+                    forms.append(form)
+        self.variants: Tuple[str, ...] = tuple(forms)
+
+    def check(self, answer) -> MatchResult:
+        form = canonical_form(answer)
+        if not form:
+            return MatchResult(WRONG)
+        if form in self.variants:
+            return MatchResult(EXACT, form, 0)
+
+        max_distance = allowed_typos(form)
+        if max_distance == 0:
+            return MatchResult(WRONG)
+        # Poche varianti per parola: il confronto diretto con distanza limitata basta
+        best: Optional[Tuple[int, str]] = None
+        for variant in self.variants:
+            distance = bounded_levenshtein(form, variant, max_distance)
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, variant)
+        if best is not None:
+            return MatchResult(NEAR_MISS, best[1], best[0])
+        return MatchResult(WRONG)
+
+
+_ENTRY_TUPLE_BYTES = sys.getsizeof((None, None, None))
+
+
+class AnswerIndex:
+    """
+    Indice delle varianti accettate per tutte le parole di un mazzo e una coppia di lingue.
+
+    Le varianti delle traduzioni incluse nel mazzo vengono calcolate in blocco
+    alla creazione (for_deck), quelle delle traduzioni automatiche al primo
+    controllo; l'indice è condiviso da tutte le sessioni. I byte occupati sono
+    contati a ogni inserimento, per il budget di memoria del registro dei mazzi.
+    """
+
+    def __init__(self):
+        # parola_normalizzata -> (traduzioni di origine, incluse nel mazzo, matcher)
+        self._matchers: Dict[str, Tuple[Tuple[str, ...], bool, VariantMatcher]] = {}
+        self.nbytes = 0
+        # Riempito sia dalle sessioni sia dal thread di for_deck
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_deck(cls, deck, answer_lang: str, background: bool = False) -> "AnswerIndex":
+        """
+        Indice con le varianti delle traduzioni incluse nel mazzo precalcolate.
+
+        Args:
+            deck: Mazzo compilato (parole e colonne di traduzioni incluse)
+            answer_lang: Lingua della colonna di traduzioni
+            background: Se True il calcolo avviene in un thread, a mazzo letto tutto;
+                nel frattempo le parole vengono preparate al primo controllo
+        """
+        index = cls()
+        if background:
+            def warm_when_loaded():
+                deck.wait_until_loaded()
+                index._warm_deck(deck, answer_lang)
+
+            threading.Thread(target=warm_when_loaded, name="answer-index", daemon=True).start()
+        else:
+            index._warm_deck(deck, answer_lang)
+        return index
+
+    def _warm_deck(self, deck, answer_lang: str):
+        column = deck.translations.get(answer_lang)
+        if column is not None:
+            self.warm({word: [translation] for word, translation in zip(deck.words, column) if translation})
+
+    def __len__(self) -> int:
+        return len(self._matchers)
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self._matchers) + self.nbytes
+
+    @staticmethod
+    def _entry_bytes(key: str, sources: Tuple[str, ...], matcher: VariantMatcher) -> int:
+        return (sys.getsizeof(key) + sys.getsizeof(sources) + sum(sys.getsizeof(s) for s in sources)
+                + sys.getsizeof(matcher) + sys.getsizeof(matcher.variants)
+                + sum(sys.getsizeof(v) for v in matcher.variants) + _ENTRY_TUPLE_BYTES)
+
+    def matcher(self, word, translations: Iterable, bundled: bool = False) -> VariantMatcher:
+        """Matcher della parola, ricostruito solo se le traduzioni sono cambiate."""
+        key = normalize_text(str(word))
+        sources = tuple(str(t) for t in translations if t)
+        cached = self._matchers.get(key)
+        if cached is not None and cached[0] == sources and cached[1] == bundled:
+            return cached[2]
+        matcher = VariantMatcher(sources, bundled)
+        with self._lock:
+            previous = self._matchers.get(key)
+            if previous is not None:
+                self.nbytes -= self._entry_bytes(key, previous[0], previous[2])
+            self._matchers[key] = (sources, bundled, matcher)
+            self.nbytes += self._entry_bytes(key, sources, matcher)
+        return matcher
+
+    def warm(self, translations: Dict[str, Iterable], bundled: bool = True):
+        """Precalcola le varianti di molte parole (di solito le traduzioni incluse nel mazzo)."""
+        for word, word_translations in translations.items():
+            self.matcher(word, word_translations, bundled)
+
+    def check(self, word, translations: Iterable, answer, bundled: bool = False) -> MatchResult:
+        """
+        Confronta la risposta con le traduzioni della parola.
+
+        Args:
+            bundled: True se le traduzioni vengono dal mazzo (alternative separate da "/")
+        """
+        return self.matcher(word, translations, bundled).check(answer)
@@ -0,0 +1,512 @@
+"""
+Server HTTP/JSON asincrono per il quiz, senza Streamlit.
+Un solo event loop asyncio serve tutte le connessioni (HTTP/1.1 con keep-alive,
+solo libreria standard): le operazioni sul progresso vanno sull'interfaccia
+asincrona dei backend, mentre lettura dei mazzi e traduzioni online girano nei
+thread, così nessuna richiesta blocca le altre. Ogni client ha la sua sessione
+(mazzo, parola corrente, scheduler), isolata con runtime.session_scope.
+
+Endpoint:
+    POST /api/next-word      {"deck", "session"?, "user"?, "order"?, "answer_lang"?}
+    POST /api/check-answer   {"session", "answer", "record"?}
+    POST /api/record-answer  {"session", "correct"}
+    GET  /api/stats?session=...&limit=10
+    GET  /api/metrics
+    GET  /health
+
+Uso:
+    python api_server.py --port 8080 --files Files
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import perf_metrics
+import runtime
+from answer_matching import AnswerIndex
+from deck_cache import DeckFormatError, load_deck_from_path
+from deck_registry import DeckHandle, get_deck_registry
+from hybrid_progress_manager import BACKEND_CHOICES, HybridProgressManager
+from scheduler import LeitnerScheduler
+
+logger = logging.getLogger(__name__)
+
+# Codici del traduttore per le lingue scritte nella prima riga dei mazzi (come in EnglishLearning.py)
+LANG_CODES = {"english": "en", "italian": "it"}
+ORDERS = ("ripasso", "casuale", "sequenziale")
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Sessioni inattive oltre questo tempo vengono dimenticate
+SESSION_TTL_SECONDS = 30 * 60
+MAX_SESSIONS = 100_000
+# Gestori del progresso aperti (uno per mazzo e utente, ciascuno con il suo thread)
+MAX_MANAGERS = 256
+# Intervallo minimo tra due controlli del file di un mazzo già aperto
+DECK_RECHECK_SECONDS = 2.0
+# Campioni per endpoint su cui si calcolano i percentili
+TIMING_SAMPLES = 2048
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+            500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    """Errore da restituire al client con il suo codice HTTP."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RequestTimings:
+    """Numero di richieste, errori e ultimi tempi di risposta per endpoint."""
+
+    def __init__(self, samples: int = TIMING_SAMPLES):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._max_samples = samples
+
+    def record(self, endpoint: str, elapsed_ms: float, failed: bool):
+        samples = self._samples.get(endpoint)
+        if samples is None:
+            samples = self._samples[endpoint] = deque(maxlen=self._max_samples)
+        samples.append(elapsed_ms)
+        self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+        if failed:
+            self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {endpoint: {'count': self._counts[endpoint],
+                           'errors': self._errors.get(endpoint, 0),
+                           'p50_ms': round(perf_metrics.percentile(samples, 0.5), 3),
+                           'p95_ms': round(perf_metrics.percentile(samples, 0.95), 3),
+                           'p99_ms': round(perf_metrics.percentile(samples, 0.99), 3)}
+                for endpoint, samples in self._samples.items()}
+
+
+class ClientSession:
+    """Stato di un client: mazzo, parola corrente e scheduler di ripasso."""
+
+    __slots__ = ("session_id", "user_id", "state", "deck_name", "handle", "scheduler",
+                 "order", "answer_lang", "current", "translation", "last_seen")
+
+    def __init__(self, session_id: str, user_id: str):
+        self.session_id = session_id
+        self.user_id = user_id
+        # Stato di sessione dei backend (runtime.session_scope)
+        self.state: Dict[str, object] = {'user_id': user_id}
+        self.deck_name: Optional[str] = None
+        self.handle: Optional[DeckHandle] = None
+        self.scheduler: Optional[LeitnerScheduler] = None
+        self.order = "ripasso"
+        self.answer_lang: Optional[str] = None
+        self.current: Optional[int] = None
+        self.translation: Optional[str] = None
+        self.last_seen = time.monotonic()
+
+
+class QuizServer:
+    def __init__(self, files_dir: str = "Files"):
+        """
+        Args:
+            files_dir: Cartella dei mazzi; i client indicano solo il nome del file
+        """
+        self.files_dir = files_dir
+        self.timings = RequestTimings()
+        self._sessions: "OrderedDict[str, ClientSession]" = OrderedDict()
+        self._managers: "OrderedDict[Tuple[str, Optional[str]], HybridProgressManager]" = OrderedDict()
+        self._manager_locks: Dict[Tuple[str, Optional[str]], asyncio.Lock] = {}
+        # Richieste in corso che usano ciascun gestore, e gestori già usciti dall'LRU
+        # che verranno chiusi quando l'ultima di queste richieste termina
+        self._manager_users: Dict[HybridProgressManager, int] = {}
+        self._retired_managers: Set[HybridProgressManager] = set()
+        # nome del mazzo -> (handle, ultimo controllo del file)
+        self._decks: Dict[str, Tuple[DeckHandle, float]] = {}
+        self._routes: Dict[Tuple[str, str], Callable[[dict], Awaitable[dict]]] = {
+            ("POST", "/api/next-word"): self.next_word,
+            ("POST", "/api/check-answer"): self.check_answer,
+            ("POST", "/api/record-answer"): self.record_answer,
+            ("GET", "/api/stats"): self.stats,
+            ("GET", "/api/metrics"): self.metrics,
+            ("GET", "/health"): self.health,
+        }
+
+    # --- Risorse condivise ---
+
+    async def _deck(self, name: str) -> DeckHandle:
+        """Mazzo della cartella Files, ricontrollato sul disco al massimo ogni DECK_RECHECK_SECONDS."""
+        cached = self._decks.get(name)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < DECK_RECHECK_SECONDS:
+            return cached[0]
+        path = os.path.join(self.files_dir, name)
+        try:
+            deck = await asyncio.to_thread(load_deck_from_path, path)
+        except FileNotFoundError:
+            raise ApiError(404, f"Mazzo non trovato: {name}")
+        except DeckFormatError as e:
+            raise ApiError(400, str(e))
+        handle = cached[0] if cached is not None and cached[0].content_hash == deck.content_hash else None
+        if handle is None:
+            handle = get_deck_registry().acquire(deck)
+        self._decks[name] = (handle, now)
+        return handle
+
+    async def _manager(self, session: ClientSession) -> HybridProgressManager:
+        """Gestore del progresso del mazzo e dell'utente della sessione, aperto al primo uso."""
+        deck_name, user_id = session.deck_name, session.user_id
+        # Il backend a file JSON non distingue gli utenti: un solo gestore per mazzo
+        for key in ((deck_name, None), (deck_name, user_id)):
+            manager = self._managers.get(key)
+            if manager is not None:
+                self._managers.move_to_end(key)
+                return manager
+
+        key = (deck_name, user_id)
+        lock = self._manager_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            manager = self._managers.get((deck_name, None)) or self._managers.get(key)
+            if manager is None:
+                with runtime.session_scope(session.state):
+                    # to_thread copia il contesto: il backend vede lo stato di questa sessione
+                    manager = await asyncio.to_thread(HybridProgressManager, deck_name, user_id)
+                if manager.backend_type == "local_files":
+                    key = (deck_name, None)
+                self._managers[key] = manager
+                self._evict_managers()
+        self._manager_locks.pop((deck_name, user_id), None)
+        return manager
+
+    @asynccontextmanager
+    async def _using_manager(self, session: ClientSession) -> AsyncIterator[HybridProgressManager]:
+        """Gestore della sessione, che non viene chiuso finché la richiesta lo usa."""
+        manager = await self._manager(session)
+        self._manager_users[manager] = self._manager_users.get(manager, 0) + 1
+        try:
+            yield manager
+        finally:
+            users = self._manager_users.pop(manager) - 1
+            if users:
+                self._manager_users[manager] = users
+            elif manager in self._retired_managers:
+                self._retired_managers.discard(manager)
+                self._close_manager(manager)
+
+    def _close_manager(self, manager: HybridProgressManager):
+        # Flush e chiusura nei thread: possono fare I/O
+        asyncio.get_running_loop().run_in_executor(None, manager.close)
+
+    def _evict_managers(self):
+        while len(self._managers) > MAX_MANAGERS:
+            _, manager = self._managers.popitem(last=False)
+            if manager in self._manager_users:
+                # Richieste in corso lo usano ancora: lo chiude l'ultima che termina
+                self._retired_managers.add(manager)
+            else:
+                self._close_manager(manager)
+
+    def _session(self, params: dict, create: bool = False) -> ClientSession:
+        session_id = params.get("session")
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            if not create:
+                raise ApiError(404, "Sessione sconosciuta o scaduta")
+            session_id = session_id or uuid.uuid4().hex
+            session = ClientSession(session_id, str(params.get("user") or session_id))
+            self._sessions[session_id] = session
+            self._expire_sessions()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = time.monotonic()
+        return session
+
+    def _expire_sessions(self):
+        """Dimentica le sessioni inattive (le più vecchie sono in testa)."""
+        deadline = time.monotonic() - SESSION_TTL_SECONDS
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen >= deadline and len(self._sessions) <= MAX_SESSIONS:
+                break
+            self._sessions.popitem(last=False)
+
+    async def _translation(self, handle: DeckHandle, index: int, answer_lang: str) -> str:
+        """Traduzione inclusa nel mazzo o dalla cache/traduttore online (in un thread)."""
+        deck = handle.deck
+        translation = deck.bundled_translation(index, answer_lang)
+        if translation is not None:
+            return translation
+        from translation_cache import get_translation_cache
+        word = deck.words[index]
+        try:
+            return await asyncio.to_thread(get_translation_cache().translate, word,
+                                           LANG_CODES.get(deck.source_lang, deck.source_lang),
+                                           LANG_CODES.get(answer_lang, answer_lang))
+        except Exception as e:
+            logger.warning("Traduzione di %s non disponibile: %s", word, e)
+            # Come nell'app: in mancanza di traduzione la risposta attesa è la parola stessa
+            return word
+
+    # --- Endpoint ---
+
+    async def next_word(self, params: dict) -> dict:
+        deck_name = params.get("deck")
+        if not deck_name or not isinstance(deck_name, str):
+            raise ApiError(400, "Campo 'deck' obbligatorio")
+        # Solo file della cartella dei mazzi, niente percorsi
+        deck_name = os.path.basename(deck_name)
+        order = params.get("order", "ripasso")
+        if order not in ORDERS:
+            raise ApiError(400, f"Ordine non valido: {order}")
+
+        handle = await self._deck(deck_name)
+        session = self._session(params, create=True)
+        deck = handle.deck
+        if session.deck_name != deck_name or session.handle is not handle:
+            session.deck_name = deck_name
+            session.handle = handle
+            session.current = None
+            session.scheduler = None
+        if order == "ripasso" and session.scheduler is None:
+            async with self._using_manager(session) as manager:
+                schedules = await manager.async_backend.get_schedules()
+            session.scheduler = LeitnerScheduler(deck.words, schedules)
+        session.order = order
+        session.answer_lang = params.get("answer_lang") or session.answer_lang or (
+            deck.languages[0] if deck.languages else "italian")
+
+        if order == "ripasso":
+            index = session.scheduler.next_index(exclude=session.current)
+        elif order == "casuale":
+            index = random.randrange(len(deck))
+        else:
+            index = 0 if session.current is None else (session.current + 1) % len(deck)
+        session.current = index
+        session.translation = await self._translation(handle, index, session.answer_lang)
+        return {
+            'session': session.session_id,
+            'deck': deck_name,
+            'index': index,
+            'word': deck.words[index],
+            'source_lang': deck.source_lang,
+            'answer_lang': session.answer_lang,
+            'deck_loaded': deck.is_loaded,
+            'deck_size': len(deck)
+        }
+
+    def _current_word(self, session: ClientSession) -> str:
+        if session.current is None or session.handle is None:
+            raise ApiError(409, "Nessuna parola in corso: chiamare prima /api/next-word")
+        return session.handle.deck.words[session.current]
+
+    async def _record(self, session: ClientSession, word: str, is_correct: bool) -> dict:
+        """Registra la risposta e lo stato di ripasso sul backend (attesi, ma senza bloccare il loop)."""
+        async with self._using_manager(session) as manager:
+            backend = manager.async_backend
+            await backend.record_answer(word, is_correct)
+            result = {'word': word, 'recorded': True}
+            if session.scheduler is not None:
+                box, due = session.scheduler.record(word, is_correct, index=session.current)
+                await backend.save_schedule(word, box, due)
+                result.update(box=box, due=due)
+        return result
+
+    async def check_answer(self, params: dict) -> dict:
+        session = self._session(params)
+        word = self._current_word(session)
+        answer = params.get("answer")
+        if not isinstance(answer, str):
+            raise ApiError(400, "Campo 'answer' obbligatorio")
+        src, dest = session.handle.source_lang, session.answer_lang
+        deck = session.handle.deck
+        answer_index = session.handle.index(("answers", LANG_CODES.get(src, src), LANG_CODES.get(dest, dest)),
+                                            lambda: AnswerIndex.for_deck(deck, dest, background=True))
+        bundled = deck.bundled_translation(session.current, dest) is not None
+        match = answer_index.check(word, [session.translation], answer, bundled=bundled)
+        result = {
+            'word': word,
+            'verdict': match.verdict,
+            'correct': match.is_correct,
+            'translation': session.translation,
+            'matched': match.matched,
+            'distance': match.distance,
+            'recorded': False
+        }
+        if params.get("record", True):
+            result.update(await self._record(session, word, match.is_correct))
+        return result
+
+    async def record_answer(self, params: dict) -> dict:
+        """Registra un esito deciso dal client (es. flashcard autovalutate)."""
+        session = self._session(params)
+        word = self._current_word(session)
+        if not isinstance(params.get("correct"), bool):
+            raise ApiError(400, "Campo 'correct' obbligatorio (true/false)")
+        return await self._record(session, word, params["correct"])
+
+    async def stats(self, params: dict) -> dict:
+        session = self._session(params)
+        if session.deck_name is None:
+            raise ApiError(409, "Nessun mazzo scelto: chiamare prima /api/next-word")
+        try:
+            limit = int(params.get("limit", 10))
+        except (TypeError, ValueError):
+            raise ApiError(400, "Campo 'limit' non valido")
+        async with self._using_manager(session) as manager:
+            totals = await manager.async_backend.get_total_stats()
+            difficult = await manager.async_backend.get_difficult_words(3, limit)
+        return {'deck': session.deck_name, 'totals': totals, 'difficult_words': difficult}
+
+    async def metrics(self, params: dict) -> dict:
+        return {
+            'endpoints': self.timings.report(),
+            'sessions': len(self._sessions),
+            'progress_managers': len(self._managers),
+            'decks': get_deck_registry().get_stats()
+        }
+
+    async def health(self, params: dict) -> dict:
+        return {'status': 'ok'}
+
+    # --- HTTP ---
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, dict]:
+        """Esegue la richiesta e ne misura il tempo; restituisce (codice HTTP, risposta)."""
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        endpoint = url.path
+        started = time.perf_counter()
+        status = 200
+        try:
+            if handler is None:
+                known_path = any(path == url.path for _, path in self._routes)
+                endpoint = "other"
+                raise ApiError(405 if known_path else 404, "Endpoint non disponibile")
+            params = dict(parse_qsl(url.query))
+            if body:
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    raise ApiError(400, "JSON non valido")
+                if not isinstance(payload, dict):
+                    raise ApiError(400, "Il corpo deve essere un oggetto JSON")
+                params.update(payload)
+            response = await handler(params)
+        except ApiError as e:
+            status, response = e.status, {'error': e.message}
+        except Exception as e:
+            logger.exception("Errore in %s", url.path)
+            status, response = 500, {'error': str(e)}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.timings.record(endpoint, elapsed_ms, status >= 500)
+        if perf_metrics.METRICS_FILE:
+            perf_metrics.write_report({'timestamp': time.time(), 'total_ms': round(elapsed_ms, 3),
+                                       'phases_ms': {endpoint: round(elapsed_ms, 3)}, 'status': status})
+        response['elapsed_ms'] = round(elapsed_ms, 3)
+        return status, response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve le richieste di una connessione finché il client la tiene aperta."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    self._write_response(writer, 431, {'error': "Intestazioni troppo grandi"}, False)
+                    break
+                try:
+                    request_line, *header_lines = head.decode('latin-1').rstrip("\r\n").split("\r\n")
+                    method, target, version = request_line.split(" ", 2)
+                    headers = {}
+                    for line in header_lines:
+                        name, _, value = line.partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    self._write_response(writer, 400, {'error': "Richiesta HTTP non valida"}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    self._write_response(writer, 413, {'error': "Corpo della richiesta troppo grande"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                status, response = await self.dispatch(method, target, body)
+                self._write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        timing = f"Server-Timing: app;dur={payload['elapsed_ms']}\r\n" if 'elapsed_ms' in payload else ""
+        writer.write((f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                      f"Content-Type: application/json; charset=utf-8\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"{timing}"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + body)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+    async def close(self):
+        """Scrive le risposte in attesa di tutti i gestori del progresso."""
+        managers = list(self._managers.values()) + list(self._retired_managers)
+        self._managers.clear()
+        self._retired_managers.clear()
+        await asyncio.gather(*(asyncio.to_thread(manager.close) for manager in managers))
+
+
+async def serve(host: str, port: int, files_dir: str):
+    quiz = QuizServer(files_dir)
+    server = await quiz.start(host, port)
+    logger.info("Server in ascolto su http://%s:%d", host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await quiz.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Server HTTP/JSON del quiz")
+    parser.add_argument("--host", default="127.0.0.1", help="Indirizzo di ascolto")
+    parser.add_argument("--port", type=int, default=8080, help="Porta di ascolto")
+    parser.add_argument("--files", default="Files", help="Cartella dei mazzi")
+    parser.add_argument("--backend", choices=BACKEND_CHOICES,
+                        help="Backend del progresso (default: PROGRESS_BACKEND o auto)")
+    args = parser.parse_args(argv)
+    if args.backend:
+        os.environ["PROGRESS_BACKEND"] = args.backend
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.files))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Interfaccia asincrona per i backend del progresso.
+Le operazioni dei backend (che possono fare I/O di rete o su disco) vengono
+eseguite su un event loop asyncio dedicato in un thread in background, così
+il thread che disegna la pagina Streamlit non attende mai il database.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+
+
+class AsyncProgressBackend(Protocol):
+    """Varianti asincrone di tutte le operazioni di un backend del progresso."""
+
+    async def get_word_stats(self, word: str) -> Tuple[int, int]: ...
+
+    async def record_answer(self, word: str, is_correct: bool) -> None: ...
+
+    async def get_total_stats(self) -> Dict[str, int]: ...
+
+    async def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list: ...
+
+    async def get_schedules(self) -> Dict[str, Tuple[int, float]]: ...
+
+    async def save_schedule(self, word: str, box: int, due: float) -> None: ...
+
+    async def verify_totals(self) -> bool: ...
+
+    async def reset_all_progress(self) -> None: ...
+
+    async def upsert_progress(self, records: list) -> None: ...
+
+    async def flush(self) -> None: ...
+
+
+class _BackgroundLoop:
+    """Event loop asyncio in esecuzione su un thread daemon."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="progress-event-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro) -> Future:
+        """Pianifica una coroutine sul loop e restituisce un Future thread-safe."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+_background_loop: Optional[_BackgroundLoop] = None
+_background_lock = threading.Lock()
+
+
+def get_background_loop() -> _BackgroundLoop:
+    """Restituisce l'event loop di background condiviso dal processo."""
+    global _background_loop
+    if _background_loop is None:
+        with _background_lock:
+            if _background_loop is None:
+                _background_loop = _BackgroundLoop()
+    return _background_loop
+
+
+class ThreadedBackendAdapter:
+    """
+    Adatta un backend sincrono (DatabaseManager, ProgressManager, SQLite) al
+    protocollo asincrono.
+
+    Le chiamate bloccanti girano su un executor a un solo thread per backend:
+    l'ordine delle operazioni è preservato (una lettura vede sempre le
+    risposte registrate prima) e il backend non è mai usato in parallelo.
+    """
+
+    runs_inline = False
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="progress-backend")
+
+    async def _call(self, method: str, *args) -> Any:
+        function: Optional[Callable] = getattr(self.backend, method, None)
+        if function is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: function(*args))
+
+    async def get_word_stats(self, word: str) -> Tuple[int, int]:
+        return await self._call('get_word_stats', word)
+
+    async def record_answer(self, word: str, is_correct: bool) -> None:
+        await self._call('record_answer', word, is_correct)
+
+    async def get_total_stats(self) -> Dict[str, int]:
+        return await self._call('get_total_stats')
+
+    async def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list:
+        return await self._call('get_difficult_words', min_attempts, limit)
+
+    async def get_schedules(self) -> Dict[str, Tuple[int, float]]:
+        return await self._call('get_schedules') or {}
+
+    async def save_schedule(self, word: str, box: int, due: float) -> None:
+        await self._call('save_schedule', word, box, due)
+
+    async def verify_totals(self) -> bool:
+        result = await self._call('verify_totals')
+        return True if result is None else result
+
+    async def reset_all_progress(self) -> None:
+        await self._call('reset_all_progress')
+
+    async def upsert_progress(self, records: list) -> None:
+        await self._call('upsert_progress', records)
+
+    async def flush(self) -> None:
+        await self._call('flush')
+
+    def close(self):
+        """Non accetta altre operazioni; quelle già accodate vengono completate."""
+        self._executor.shutdown(wait=False)
+
+
+class InlineBackendAdapter(ThreadedBackendAdapter):
+    """
+    Adattatore per backend che devono girare nel thread dello script
+    (SessionStateManager usa st.session_state): nessun I/O, chiamata diretta.
+    """
+
+    runs_inline = True
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def close(self):
+        pass
+
+    async def _call(self, method: str, *args) -> Any:
+        function: Optional[Callable] = getattr(self.backend, method, None)
+        return function(*args) if function is not None else None
+
+    def call_sync(self, method: str, *args) -> Any:
+        """Esegue subito l'operazione nel thread chiamante."""
+        coro = getattr(self, method)(*args)
+        try:
+            coro.send(None)
+        except StopIteration as done:
+            return done.value
+        raise RuntimeError(f"{method} non è completata in modo sincrono")
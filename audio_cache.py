@@ -0,0 +1,184 @@
+"""
+Cache audio indirizzata per contenuto per le pronunce generate con gTTS.
+Ogni audio è identificato dall'hash di (testo, lingua, lento) e conservato in
+memoria e su disco entro un budget massimo di byte. Le parole successive del
+quiz possono essere generate in anticipo in background.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import perf_metrics
+
+CACHE_DIR = os.path.join("Cache", "audio")
+MAX_PREFETCH_WORKERS = 2
+
+
+def audio_key(text, lang: str, slow: bool = False) -> str:
+    """Chiave di contenuto dell'audio."""
+    payload = f"{lang}\0{int(bool(slow))}\0{str(text).strip()}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, cache_dir: str = CACHE_DIR,
+                 memory_budget_bytes: int = 16 * 1024 * 1024,
+                 disk_budget_bytes: int = 256 * 1024 * 1024):
+        """
+        Inizializza la cache audio.
+
+        Args:
+            cache_dir: Cartella dove salvare gli MP3
+            memory_budget_bytes: Byte massimi tenuti in memoria
+            disk_budget_bytes: Byte massimi occupati su disco
+        """
+        self.cache_dir = cache_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MAX_PREFETCH_WORKERS,
+                                            thread_name_prefix="audio-prefetch")
+        self._disk_enabled = self._init_disk()
+
+    def _init_disk(self) -> bool:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                                   if entry.name.endswith('.mp3'))
+            return True
+        except OSError:
+            return False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _remember(self, key: str, audio: bytes):
+        """Inserisce in memoria rispettando il budget (da chiamare con il lock acquisito)."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_budget_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _store_on_disk(self, key: str, audio: bytes):
+        if not self._disk_enabled:
+            return
+        try:
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(audio)
+            with self._lock:
+                # Sostituendo un file esistente si conta solo la differenza di dimensione
+                try:
+                    previous_size = os.path.getsize(path)
+                except OSError:
+                    previous_size = 0
+                os.replace(tmp_path, path)
+                self._disk_bytes += len(audio) - previous_size
+                if self._disk_bytes > self.disk_budget_bytes:
+                    self._evict_disk()
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        """Elimina gli audio meno recenti fino al 90% del budget su disco."""
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.mp3')]
+        entries.sort(key=lambda entry: entry.stat().st_atime)
+        self._disk_bytes = sum(entry.stat().st_size for entry in entries)
+        target = int(self.disk_budget_bytes * 0.9)
+        for entry in entries:
+            if self._disk_bytes <= target:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
+
+    def get(self, text, lang: str, slow: bool = False) -> Optional[bytes]:
+        """Cerca l'audio in memoria o su disco, senza generarlo."""
+        key = audio_key(text, lang, slow)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                return audio
+
+        if self._disk_enabled:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    audio = f.read()
+                with self._lock:
+                    self._remember(key, audio)
+                return audio
+            except OSError:
+                pass
+        return None
+
+    def _generate(self, key: str, text, lang: str, slow: bool) -> bytes:
+        try:
+            perf_metrics.count_global("tts_requests")
+            # Importato solo alla prima pronuncia da generare (l'audio in cache non lo richiede)
+            from gtts import gTTS
+            tts = gTTS(text=str(text), lang=lang, slow=slow)
+            buffer = io.BytesIO()
+            tts.write_to_fp(buffer)
+            audio = buffer.getvalue()
+            with self._lock:
+                self._remember(key, audio)
+            self._store_on_disk(key, audio)
+            return audio
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _submit(self, text, lang: str, slow: bool) -> Optional[Future]:
+        """Avvia la generazione in background, riusando quella già in corso."""
+        key = audio_key(text, lang, slow)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._generate, key, text, lang, slow)
+                self._inflight[key] = future
+        return future
+
+    def get_or_generate(self, text, lang: str, slow: bool = False) -> bytes:
+        """Restituisce l'audio dalla cache o lo genera (attendendo un prefetch già avviato)."""
+        audio = self.get(text, lang, slow)
+        if audio is not None:
+            return audio
+        return self._submit(text, lang, slow).result()
+
+    def prefetch(self, texts: Iterable, lang: str, slow: bool = False):
+        """Genera in background gli audio non ancora presenti in cache."""
+        for text in texts:
+            if self.get(text, lang, slow) is None:
+                self._submit(text, lang, slow)
+
+
+_shared_cache: Optional[AudioCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_audio_cache() -> AudioCache:
+    """Restituisce la cache audio condivisa dal processo."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = AudioCache()
+    return _shared_cache
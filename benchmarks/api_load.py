@@ -0,0 +1,151 @@
+"""
+Generatore di carico per il server API (api_server.py), tutto in locale.
+
+Avvia il server nello stesso processo su una porta libera, in una cartella
+temporanea con un mazzo sintetico (traduzioni incluse: nessuna richiesta di
+rete), poi simula molti client concorrenti, ciascuno con la sua sessione e una
+connessione keep-alive, che alternano next-word e check-answer.
+
+Uso:
+    python benchmarks/api_load.py --clients 1000 --rounds 20
+    python benchmarks/api_load.py --backend sqlite --clients 200 --output carico.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import perf_metrics  # noqa: E402
+
+DECK_NAME = "Load.csv"
+DECK_SIZE = 5000
+
+
+def write_deck(files_dir: str, size: int):
+    os.makedirs(files_dir, exist_ok=True)
+    with open(os.path.join(files_dir, DECK_NAME), 'w', encoding='utf-8') as f:
+        f.write("english,italian\n")
+        for i in range(size):
+            f.write(f"word{i},parola{i}\n")
+
+
+class Client:
+    """Client HTTP/1.1 minimo su una connessione keep-alive."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method: str, path: str, payload: dict = None) -> dict:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.decode('latin-1').split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        response = json.loads(await self.reader.readexactly(length))
+        if not head.startswith(b"HTTP/1.1 200"):
+            raise RuntimeError(f"{path}: {response.get('error')}")
+        return response
+
+
+async def run_client(port: int, rounds: int, latencies: List[float], user: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    client = Client(reader, writer)
+    session = None
+    try:
+        for round_number in range(rounds):
+            started = time.perf_counter()
+            word = await client.request("POST", "/api/next-word",
+                                        {"deck": DECK_NAME, "session": session, "user": user})
+            latencies.append(time.perf_counter() - started)
+            session = word['session']
+            # Una risposta su quattro sbagliata, le altre corrette
+            answer = "sbagliata" if round_number % 4 == 3 else word['word'].replace("word", "parola")
+            started = time.perf_counter()
+            await client.request("POST", "/api/check-answer", {"session": session, "answer": answer})
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def run(clients: int, rounds: int, concurrency: int) -> Tuple[dict, dict]:
+    from api_server import QuizServer
+    quiz = QuizServer("Files")
+    server = await quiz.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    latencies: List[float] = []
+    # Limita le connessioni aperte insieme (descrittori di file)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(index: int):
+        async with semaphore:
+            await run_client(port, rounds, latencies, f"user{index}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    server_metrics = await quiz.metrics({})
+    server.close()
+    await server.wait_closed()
+    await quiz.close()
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(perf_metrics.percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(perf_metrics.percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(perf_metrics.percentile(latencies, 0.99) * 1000, 3)
+    }, server_metrics
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Carico sul server API del quiz")
+    parser.add_argument("--clients", type=int, default=500, help="Sessioni simulate")
+    parser.add_argument("--rounds", type=int, default=10, help="Parole per sessione")
+    parser.add_argument("--concurrency", type=int, default=256, help="Connessioni aperte insieme")
+    parser.add_argument("--backend", default="session", help="Backend del progresso (PROGRESS_BACKEND)")
+    parser.add_argument("--output", help="File JSON dei risultati")
+    args = parser.parse_args(argv)
+
+    os.environ["PROGRESS_BACKEND"] = args.backend
+    workdir = tempfile.mkdtemp(prefix="api_load_")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        write_deck("Files", DECK_SIZE)
+        client_stats, server_metrics = asyncio.run(run(args.clients, args.rounds, args.concurrency))
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{client_stats['requests']} richieste in {client_stats['seconds']} s: "
+          f"{client_stats['requests_per_second']} req/s, p50 {client_stats['p50_ms']} ms, "
+          f"p95 {client_stats['p95_ms']} ms, p99 {client_stats['p99_ms']} ms")
+    for endpoint, stats in sorted(server_metrics['endpoints'].items()):
+        print(f"  {endpoint:<20} n={stats['count']:<7} p50={stats['p50_ms']:.3f} ms  "
+              f"p95={stats['p95_ms']:.3f} ms  errori={stats['errors']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'python': platform.python_version(),
+                       'backend': args.backend, 'clients': args.clients, 'rounds': args.rounds,
+                       'client': client_stats, 'server': server_metrics}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
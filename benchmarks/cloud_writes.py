@@ -0,0 +1,302 @@
+"""
+Verifica delle scritture del progresso verso Supabase, con il client finto.
+
+Controlla i round trip per risposta di DatabaseManager senza buffer (ogni
+risposta scritta subito) e con il buffer write-behind, e che al cambio mazzo
+le risposte in attesa vengano scritte. Poi più sessioni dello stesso utente
+scrivono insieme sulle stesse parole, con una latenza di rete simulata: con la
+funzione increment_progress nessun aggiornamento va perso, mentre il ripiego
+lettura + upsert (funzione non installata) può perderne; per ogni percorso si
+misura la latenza per risposta. Infine controlla che su un database senza le
+colonne box/due_at il progresso venga letto e scritto comunque, e che
+un'esportazione a blocchi più grandi del limite di righe di PostgREST legga
+tutte le parole. Lo script
+termina con codice 1 se un controllo non è rispettato.
+
+Uso:
+    python benchmarks/cloud_writes.py
+    python benchmarks/cloud_writes.py --answers 500 --writers 16 --latency-ms 10
+    python benchmarks/cloud_writes.py --output scritture.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import perf_metrics  # noqa: E402
+from fake_supabase import FakeSupabaseClient  # noqa: E402
+
+FILE_NAME = "Cloud.xlsx"
+OTHER_FILE_NAME = "Other.xlsx"
+USER_ID = "cloud-check"
+WORDS = 100
+
+
+def install_client(client: FakeSupabaseClient):
+    """Fa usare il client finto a DatabaseManager (pool condiviso compreso)."""
+    import database_manager
+    import runtime
+    import supabase_pool
+
+    if supabase_pool._shared_pool is not None:
+        supabase_pool._shared_pool.close()
+    supabase_pool.create_client = lambda url, key: client
+    supabase_pool._shared_pool = None
+    database_manager.SUPABASE_AVAILABLE = True
+    database_manager._rpc_available = None
+    runtime.set_secrets({"SUPABASE_URL": "http://cloud-check", "SUPABASE_KEY": "cloud-check"})
+
+
+def answer_words(count: int) -> List[str]:
+    return [f"word{i % WORDS:03d}" for i in range(count)]
+
+
+def round_trips_per_answer(answers: int, max_pending: int) -> dict:
+    """Round trip per risposta con il buffer limitato a max_pending parole."""
+    import database_manager
+
+    client = FakeSupabaseClient()
+    install_client(client)
+    manager = database_manager.DatabaseManager(FILE_NAME, user_id=USER_ID)
+    manager._write_buffer.max_pending = max_pending
+    manager.refresh()
+    client.round_trips = 0
+    for i, word in enumerate(answer_words(answers)):
+        manager.record_answer(word, i % 3 != 0)
+    manager.flush()
+    expected = answers // 3 * 2 + (1 if answers % 3 == 2 else 0)
+    correct = sum(row["correct_count"] for row in client.rows.values())
+    return {'round_trips': client.round_trips,
+            'round_trips_per_answer': round(client.round_trips / answers, 4),
+            'lost_answers': expected - correct}
+
+
+def deck_switch_flush(answers: int) -> dict:
+    """Risposte date prima di un cambio mazzo: devono essere sul database dopo il flush."""
+    from hybrid_progress_manager import HybridProgressManager
+
+    client = FakeSupabaseClient()
+    install_client(client)
+    os.environ["PROGRESS_BACKEND"] = "supabase"
+    manager = HybridProgressManager(FILE_NAME, user_id=USER_ID)
+    manager.get_total_stats()
+    client.round_trips = 0
+    for word in answer_words(answers):
+        manager.record_answer(word, True)
+    before_switch = client.round_trips
+    # Come EnglishLearning.py al cambio mazzo
+    manager.flush(wait=True)
+    flushed = client.round_trips - before_switch
+    other = HybridProgressManager(OTHER_FILE_NAME, user_id=USER_ID)
+    stored = sum(row["correct_count"] for key, row in client.rows.items() if key[1] == FILE_NAME)
+    pending = manager.get_backend_info().get("pending_writes", 0)
+    manager.close()
+    other.close()
+    return {'round_trips_before_switch': before_switch, 'round_trips_on_switch': flushed,
+            'stored_answers': stored, 'pending_after_switch': pending}
+
+
+def unmigrated_schema(answers: int) -> dict:
+    """Database senza box/due_at: lettura, risposte e importazione non devono fallire."""
+    from database_manager import DatabaseManager
+    from progress_stats import ProgressRecord
+
+    client = FakeSupabaseClient(schedule_columns=False)
+    client.seed(USER_ID, FILE_NAME, answer_words(WORDS))
+    install_client(client)
+    manager = DatabaseManager(FILE_NAME, user_id=USER_ID)
+    loaded = manager.get_total_stats()["total_words_practiced"]
+    for word in answer_words(answers):
+        manager.record_answer(word, True)
+        manager.save_schedule(word, 2, 0.0)
+    written = manager.flush()
+    manager.upsert_progress([ProgressRecord("imported", 3, 1, 2, 0.0)])
+    stored = sum(row["correct_count"] for key, row in client.rows.items() if key[1] == FILE_NAME)
+    return {'loaded_words': loaded, 'flushed': written,
+            'stored_answers': stored - WORDS - 3, 'imported': (USER_ID, FILE_NAME, "imported") in client.rows}
+
+
+def cloud_export(words: int, batch_size: int) -> dict:
+    """Esporta words parole a blocchi di batch_size (anche oltre il limite di righe per richiesta)."""
+    from database_manager import DatabaseManager
+
+    client = FakeSupabaseClient()
+    client.seed(USER_ID, FILE_NAME, [f"export{i:06d}" for i in range(words)])
+    install_client(client)
+    manager = DatabaseManager(FILE_NAME, user_id=USER_ID)
+    client.round_trips = 0
+    sizes = [len(batch) for batch in manager.iter_progress(batch_size)]
+    return {'words': words, 'batch_size': batch_size, 'exported': sum(sizes),
+            'batches': len(sizes), 'largest_batch': max(sizes, default=0), 'round_trips': client.round_trips}
+
+
+def concurrent_writers(writers: int, answers: int, latency: float, rpc_installed: bool,
+                       max_pending: int) -> dict:
+    """
+    Sessioni concorrenti dello stesso utente che rispondono alle stesse parole.
+
+    Args:
+        writers: Sessioni (thread), ognuna con il proprio DatabaseManager
+        answers: Risposte per sessione
+        latency: Secondi di latenza simulata per round trip
+        rpc_installed: False per usare il ripiego lettura + upsert
+        max_pending: Parole distinte nel buffer prima del flush (1 = nessun buffer)
+    """
+    import database_manager
+
+    client = FakeSupabaseClient(latency_seconds=latency, rpc_installed=rpc_installed)
+    install_client(client)
+    managers = []
+    for _ in range(writers):
+        manager = database_manager.DatabaseManager(FILE_NAME, user_id=USER_ID)
+        manager._write_buffer.max_pending = max_pending
+        manager.refresh()
+        managers.append(manager)
+    client.round_trips = 0
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+    start = threading.Barrier(writers)
+
+    def run(manager):
+        timings = []
+        start.wait()
+        for word in answer_words(answers):
+            started = time.perf_counter()
+            manager.record_answer(word, True)
+            timings.append(time.perf_counter() - started)
+        manager.flush()
+        with latencies_lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=run, args=(manager,)) for manager in managers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stored = sum(row["correct_count"] for row in client.rows.values())
+    return {
+        'path': "rpc" if database_manager._rpc_available else "legacy",
+        'lost_updates': writers * answers - stored,
+        'round_trips_per_answer': round(client.round_trips / (writers * answers), 4),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p95_ms': round(perf_metrics.percentile(latencies, 0.95) * 1000, 3),
+        'seconds': round(elapsed, 3)
+    }
+
+
+def check(report: dict, answers: int, switch_answers: int) -> List[str]:
+    """Restituisce i controlli non rispettati."""
+    from database_manager import FLUSH_MAX_PENDING_WORDS
+
+    problems = []
+    unbuffered, buffered, switch = report['unbuffered'], report['buffered'], report['deck_switch']
+    if unbuffered['round_trips_per_answer'] < 1:
+        problems.append(f"senza buffer attesi >= 1 round trip per risposta: {unbuffered}")
+    # Un flush (una RPC) ogni FLUSH_MAX_PENDING_WORDS parole distinte, più quello finale
+    limit = answers // FLUSH_MAX_PENDING_WORDS + 1
+    if buffered['round_trips'] > limit:
+        problems.append(f"con buffer attesi <= {limit} round trip: {buffered}")
+    for name in ('unbuffered', 'buffered'):
+        if report[name]['lost_answers']:
+            problems.append(f"{name}: risposte perse {report[name]['lost_answers']}")
+    if switch['round_trips_before_switch'] != 0:
+        problems.append(f"round trip prima del cambio mazzo: {switch}")
+    if switch['round_trips_on_switch'] != 1:
+        problems.append(f"atteso un solo round trip al cambio mazzo: {switch}")
+    if switch['stored_answers'] != switch_answers or switch['pending_after_switch']:
+        problems.append(f"risposte non scritte al cambio mazzo: {switch}")
+
+    unmigrated = report['unmigrated_schema']
+    if (unmigrated['loaded_words'] != WORDS or not unmigrated['flushed']
+            or unmigrated['stored_answers'] != switch_answers or not unmigrated['imported']):
+        problems.append(f"database senza box/due_at: progresso non letto o non scritto: {unmigrated}")
+
+    export = report['export']
+    if export['exported'] != export['words'] or export['largest_batch'] > export['batch_size']:
+        problems.append(f"esportazione incompleta o a blocchi errati: {export}")
+
+    concurrent = report['concurrent']
+    for name, result in concurrent.items():
+        expected_path = "legacy" if name.startswith("legacy") else "rpc"
+        if result['path'] != expected_path:
+            problems.append(f"{name}: percorso {result['path']} invece di {expected_path}")
+        if expected_path == "rpc" and result['lost_updates']:
+            problems.append(f"{name}: {result['lost_updates']} aggiornamenti persi con la RPC atomica")
+    # Senza buffer la RPC costa un round trip per risposta invece dei due di lettura + upsert
+    if concurrent['rpc_unbuffered']['mean_ms'] >= concurrent['legacy_unbuffered']['mean_ms']:
+        problems.append("la RPC non riduce la latenza per risposta rispetto a lettura + upsert")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Round trip delle scritture del progresso su Supabase")
+    parser.add_argument("--answers", type=int, default=300, help="Risposte per misura")
+    parser.add_argument("--writers", type=int, default=8, help="Sessioni concorrenti")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latenza simulata per round trip")
+    parser.add_argument("--output", help="File JSON dei risultati")
+    args = parser.parse_args(argv)
+
+    from database_manager import FLUSH_MAX_PENDING_WORDS
+
+    # Meno parole distinte del limite del buffer: il flush al cambio mazzo è uno solo
+    switch_answers = 15
+    workdir = tempfile.mkdtemp(prefix="cloud_writes_")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = {
+            'unbuffered': round_trips_per_answer(args.answers, max_pending=1),
+            'buffered': round_trips_per_answer(args.answers, max_pending=FLUSH_MAX_PENDING_WORDS),
+            'deck_switch': deck_switch_flush(switch_answers),
+            'unmigrated_schema': unmigrated_schema(switch_answers),
+            'export': cloud_export(12_345, batch_size=5000)
+        }
+        # Meno risposte per sessione: senza buffer ognuna attende la latenza simulata
+        concurrent_answers = max(1, args.answers // 5)
+        latency = args.latency_ms / 1000
+        report['concurrent'] = {
+            f"{path}_{mode}": concurrent_writers(args.writers, concurrent_answers, latency,
+                                                 rpc_installed=path == "rpc", max_pending=max_pending)
+            for path in ("rpc", "legacy")
+            for mode, max_pending in (("unbuffered", 1), ("buffered", FLUSH_MAX_PENDING_WORDS))
+        }
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name in ('unbuffered', 'buffered'):
+        print(f"{name:<12} {report[name]['round_trips']:>6} round trip, "
+              f"{report[name]['round_trips_per_answer']} per risposta")
+    print(f"cambio mazzo {report['deck_switch']}")
+    print(f"senza box/due_at {report['unmigrated_schema']}")
+    print(f"esportazione {report['export']}")
+    print(f"\n{args.writers} sessioni concorrenti, latenza simulata {args.latency_ms} ms:")
+    for name, result in report['concurrent'].items():
+        print(f"  {name:<18} persi {result['lost_updates']:>5}  "
+              f"{result['round_trips_per_answer']:>6} round trip/risposta  "
+              f"media {result['mean_ms']:>7.3f} ms  p95 {result['p95_ms']:>7.3f} ms")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    problems = check(report, args.answers, switch_answers)
+    for problem in problems:
+        print(f"ERRORE: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Client Supabase finto, in memoria, per i benchmark di DatabaseManager.
+Implementa solo le chiamate usate dall'app (select/eq/gt/in_/order/limit/upsert/delete/rpc)
+e conta i round trip; come PostgREST una select restituisce al massimo
+MAX_ROWS righe, qualunque sia il limit richiesto; una latenza simulata opzionale rende visibile il costo
+delle chiamate di rete. Come in Postgres ogni istruzione (e la funzione
+increment_progress) è atomica, ma due istruzioni dello stesso client no: con
+più thread la lettura + upsert può perdere aggiornamenti, la RPC no.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+Key = Tuple[str, str, str]
+# Limite di righe per risposta di PostgREST (max-rows di Supabase)
+MAX_ROWS = 1000
+
+
+class FakeResponse:
+    def __init__(self, data: List[dict]):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabaseClient", table: str):
+        self.client = client
+        self.table_name = table
+        self.filters: Dict[str, object] = {}
+        self.in_filter: Optional[Tuple[str, set]] = None
+        self.operation = "select"
+        self.payload: List[dict] = []
+        self.row_limit: Optional[int] = None
+        self.greater: Dict[str, object] = {}
+        self.order_by: Optional[str] = None
+        self.columns: set = set()
+
+    def select(self, *columns):
+        self.operation = "select"
+        self.columns = {column.strip() for spec in columns for column in spec.split(",")}
+        return self
+
+    def eq(self, column: str, value):
+        self.filters[column] = value
+        return self
+
+    def gt(self, column: str, value):
+        self.greater[column] = value
+        return self
+
+    def in_(self, column: str, values):
+        self.in_filter = (column, set(values))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def order(self, column: str):
+        self.order_by = column
+        return self
+
+    def upsert(self, rows, on_conflict: Optional[str] = None):
+        self.operation = "upsert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def _matches(self, row: dict) -> bool:
+        if any(row.get(column) != value for column, value in self.filters.items()):
+            return False
+        if any(not row.get(column) > value for column, value in self.greater.items()):
+            return False
+        if self.in_filter is not None:
+            column, values = self.in_filter
+            return row.get(column) in values
+        return True
+
+    def execute(self) -> FakeResponse:
+        self.client.round_trip()
+        with self.client.lock:
+            return self._execute()
+
+    def _is_keyset_page(self) -> bool:
+        return (self.order_by == "word" and set(self.filters) == {"user_id", "file_name"}
+                and set(self.greater) <= {"word"})
+
+    def _check_columns(self):
+        if self.client.schedule_columns:
+            return
+        used = set(self.columns)
+        for row in self.payload:
+            used.update(row)
+        for column in ("box", "due_at"):
+            if column in used:
+                # Messaggio di Postgres per una colonna non migrata
+                raise RuntimeError(f"{{'code': '42703', 'message': 'column progress.{column} does not exist'}}")
+
+    def _execute(self) -> FakeResponse:
+        self._check_columns()
+        rows = self.client.rows
+        if self.operation == "select":
+            if "word" in self.filters:
+                key = (self.filters.get("user_id"), self.filters.get("file_name"), self.filters["word"])
+                found = [rows[key]] if key in rows else []
+            elif self.in_filter is not None and self.in_filter[0] == "word":
+                user_id, file_name = self.filters.get("user_id"), self.filters.get("file_name")
+                found = [rows[key] for key in ((user_id, file_name, word) for word in self.in_filter[1])
+                         if key in rows]
+            elif self._is_keyset_page():
+                # Come un indice (user_id, file_name, word): la pagina costa quanto le righe lette
+                user_id, file_name = self.filters["user_id"], self.filters["file_name"]
+                words = self.client.sorted_words(user_id, file_name)
+                start = bisect.bisect_right(words, self.greater["word"]) if self.greater else 0
+                end = len(words) if self.row_limit is None else start + self.row_limit
+                found = [rows[(user_id, file_name, word)] for word in words[start:end]]
+            else:
+                found = [row for row in rows.values() if self._matches(row)]
+            if self.order_by is not None:
+                found = sorted(found, key=lambda row: row.get(self.order_by))
+            if self.row_limit is not None:
+                found = found[:self.row_limit]
+            found = found[:MAX_ROWS]
+            return FakeResponse([dict(row) for row in found])
+        if self.operation == "upsert":
+            for row in self.payload:
+                key = (row["user_id"], row["file_name"], row["word"])
+                if key not in rows:
+                    self.client.invalidate_index()
+                existing = rows.setdefault(key, {"correct_count": 0, "wrong_count": 0})
+                existing.update(row)
+            return FakeResponse(self.payload)
+        if self.operation == "delete":
+            removed = [key for key, row in rows.items() if self._matches(row)]
+            for key in removed:
+                del rows[key]
+            if removed:
+                self.client.invalidate_index()
+            return FakeResponse([])
+        raise ValueError(f"Operazione non supportata: {self.operation}")
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeSupabaseClient", name: str, params: dict):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        if self.name != "increment_progress":
+            raise ValueError(f"Funzione non supportata: {self.name}")
+        self.client.round_trip()
+        if not self.client.rpc_installed:
+            # Messaggio di PostgREST per una funzione non installata
+            raise RuntimeError("{'code': 'PGRST202', 'message': 'Could not find the function "
+                               "public.increment_progress in the schema cache'}")
+        user_id, file_name = self.params["p_user_id"], self.params["p_file_name"]
+        with self.client.lock:
+            for increment in self.params["p_increments"]:
+                key = (user_id, file_name, increment["word"])
+                if key not in self.client.rows:
+                    self.client.invalidate_index()
+                row = self.client.rows.setdefault(key, {
+                    "user_id": user_id, "file_name": file_name, "word": increment["word"],
+                    "correct_count": 0, "wrong_count": 0
+                })
+                row["correct_count"] += increment["correct"]
+                row["wrong_count"] += increment["wrong"]
+        return FakeResponse([])
+
+
+class FakeSupabaseClient:
+    def __init__(self, latency_seconds: float = 0.0, rpc_installed: bool = True,
+                 schedule_columns: bool = True):
+        """
+        Args:
+            latency_seconds: Attesa simulata per ogni round trip
+            rpc_installed: False per simulare un database senza la funzione increment_progress
+            schedule_columns: False per simulare un database senza le colonne box/due_at
+        """
+        self.latency_seconds = latency_seconds
+        self.rpc_installed = rpc_installed
+        self.schedule_columns = schedule_columns
+        self.rows: Dict[Key, dict] = {}
+        self.round_trips = 0
+        # (user_id, file_name) -> parole ordinate, ricostruito quando cambiano le chiavi
+        self._sorted_words: Dict[Tuple[str, str], List[str]] = {}
+        # Rende atomica ogni istruzione rispetto ai thread che usano lo stesso client
+        self.lock = threading.Lock()
+
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def sorted_words(self, user_id: str, file_name: str) -> List[str]:
+        """Parole del mazzo in ordine (da chiamare con il lock acquisito)."""
+        words = self._sorted_words.get((user_id, file_name))
+        if words is None:
+            words = self._sorted_words[(user_id, file_name)] = sorted(
+                word for (row_user, row_file, word) in self.rows if (row_user, row_file) == (user_id, file_name)
+            )
+        return words
+
+    def invalidate_index(self):
+        self._sorted_words.clear()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[dict] = None) -> FakeRpc:
+        return FakeRpc(self, name, params or {})
+
+    def seed(self, user_id: str, file_name: str, words, correct: int = 1, wrong: int = 2):
+        """Popola il progresso di un mazzo senza contare round trip."""
+        self.invalidate_index()
+        for word in words:
+            self.rows[(user_id, file_name, word)] = {
+                "user_id": user_id, "file_name": file_name, "word": word,
+                "correct_count": correct, "wrong_count": wrong
+            }
@@ -0,0 +1,148 @@
+"""
+Benchmark del tempo di avvio a freddo: quanto costa importare i moduli dell'app.
+
+Ogni misura avvia un nuovo interprete con `python -X importtime` che importa
+gli stessi moduli di EnglishLearning.py (Streamlit escluso: viene importato
+prima e non è sotto il nostro controllo) e somma i tempi dei moduli caricati.
+Lo script fallisce se all'avvio viene importata una dipendenza pesante che
+dovrebbe caricarsi solo al primo uso (traduttore, TTS, Supabase, Excel).
+
+Uso:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --output avvio.json
+    python benchmarks/import_time.py --compare avvio.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Moduli importati da EnglishLearning.py all'avvio
+APP_MODULES = (
+    "hybrid_progress_manager", "deck_cache", "deck_catalog", "deck_loader", "deck_registry",
+    "translation_cache", "pretranslation", "audio_cache", "scheduler", "answer_matching",
+    "perf_metrics",
+)
+# Dipendenze che devono caricarsi solo al primo uso
+LAZY_PACKAGES = ("pandas", "deep_translator", "gtts", "supabase", "openpyxl", "pyarrow")
+MARKER = "--- app imports ---"
+DEFAULT_REPEAT = 5
+
+_CHILD_CODE = f"""
+import sys
+try:
+    import streamlit
+except ImportError:
+    sys.exit("streamlit non installato: il benchmark richiede le dipendenze dell'app")
+sys.stderr.write({MARKER!r} + "\\n")
+sys.stderr.flush()
+import {", ".join(APP_MODULES)}
+"""
+
+
+def measure_once() -> Dict[str, object]:
+    """Avvia un interprete pulito e restituisce i tempi di import dei moduli dell'app."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD_CODE],
+                               cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else
+                           f"codice di uscita {completed.returncode}")
+
+    modules: Dict[str, int] = {}
+    after_marker = False
+    for line in completed.stderr.splitlines():
+        if line.strip() == MARKER:
+            after_marker = True
+            continue
+        if not after_marker or not line.startswith("import time:"):
+            continue
+        # "import time: self [us] | cumulative | imported package"
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = int(fields[0])
+    return {
+        'total_ms': sum(modules.values()) / 1000,
+        'modules': modules,
+        'lazy_imported': sorted({name.split(".")[0] for name in modules} & set(LAZY_PACKAGES))
+    }
+
+
+def run(repeat: int) -> dict:
+    samples = [measure_once() for _ in range(repeat)]
+    totals = [sample['total_ms'] for sample in samples]
+    # Dettaglio dei moduli più costosi dalla misura mediana
+    median_sample = sorted(samples, key=lambda sample: sample['total_ms'])[len(samples) // 2]
+    slowest = sorted(median_sample['modules'].items(), key=lambda item: item[1], reverse=True)[:15]
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'median_ms': round(statistics.median(totals), 3),
+        'min_ms': round(min(totals), 3),
+        'module_count': len(median_sample['modules']),
+        'slowest_modules_us': dict(slowest),
+        'lazy_imported': sorted({name for sample in samples for name in sample['lazy_imported']})
+    }
+
+
+def check(report: dict, baseline: Optional[dict], threshold: float) -> List[str]:
+    """Problemi riscontrati: dipendenze pesanti importate all'avvio o avvio più lento del riferimento."""
+    problems = [f"{name} importato all'avvio: deve caricarsi al primo uso"
+                for name in report['lazy_imported']]
+    # Il minimo è la misura meno disturbata dal rumore della macchina
+    if baseline and baseline.get('min_ms'):
+        ratio = report['min_ms'] / baseline['min_ms']
+        if ratio > 1 + threshold:
+            problems.append(f"avvio più lento: {baseline['min_ms']} -> {report['min_ms']} ms "
+                            f"(x{ratio:.2f})")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Tempo di import a freddo dei moduli dell'app")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Interpreti da avviare")
+    parser.add_argument("--output", help="File JSON dei risultati")
+    parser.add_argument("--compare", help="JSON di riferimento con cui confrontare i risultati")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Rallentamento tollerato rispetto al riferimento (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # Letto subito: --output potrebbe sovrascrivere lo stesso file
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    try:
+        report = run(args.repeat)
+    except RuntimeError as e:
+        print(f"Misura non riuscita: {e}")
+        return 2
+
+    print(f"Import dei moduli dell'app: mediana {report['median_ms']:.1f} ms "
+          f"(min {report['min_ms']:.1f} ms, {report['module_count']} moduli)")
+    for name, us in report['slowest_modules_us'].items():
+        print(f"  {name:<45} {us / 1000:>8.2f} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    problems = check(report, baseline, args.threshold)
+    for problem in problems:
+        print(f"REGRESSIONE: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""
+Microbenchmark dei gestori del progresso, del caricamento dei mazzi e del
+confronto delle risposte, su mazzi sintetici di 100, 10.000 e 100.000 parole.
+
+Uso:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 100,10000 --output risultati.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/precedente.json
+
+I risultati vengono scritti in JSON (tempo mediano e minimo per operazione in
+microsecondi, più i round trip verso Supabase) così da poter confrontare due
+esecuzioni: con --compare lo script termina con codice 1 se un benchmark è
+più lento della soglia indicata rispetto al riferimento.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_supabase import FakeSupabaseClient  # noqa: E402
+
+DEFAULT_SIZES = (100, 10_000, 100_000)
+DEFAULT_REPEAT = 5
+# Numero massimo di operazioni per misura (i mazzi grandi non vanno percorsi tutti)
+MAX_OPS = 2000
+FILE_NAME = "Bench.xlsx"
+USER_ID = "bench"
+
+
+def synthetic_words(size: int) -> List[str]:
+    return [f"word{i:06d}" for i in range(size)]
+
+
+def seeded_progress(words: List[str]) -> Dict[str, Dict[str, int]]:
+    """Progresso sintetico: una parola su tre è difficile."""
+    return {word: {'correct': i % 3, 'wrong': 2 if i % 3 == 0 else 1} for i, word in enumerate(words)}
+
+
+class BenchmarkRunner:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: List[dict] = []
+
+    def measure(self, name: str, size: int, fn: Callable[[], None], ops: int = 1,
+                repeat: Optional[int] = None, setup: Optional[Callable[[], None]] = None,
+                **extra) -> dict:
+        """Esegue fn più volte e registra il tempo per operazione."""
+        timings = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        result = {
+            'name': name,
+            'size': size,
+            'ops': ops,
+            'median_us': round(statistics.median(timings) / ops * 1e6, 3),
+            'min_us': round(min(timings) / ops * 1e6, 3)
+        }
+        result.update(extra)
+        self.results.append(result)
+        print(f"{name:<45} {size:>7}  {result['median_us']:>12.3f} us/op  (min {result['min_us']:.3f})")
+        return result
+
+
+def answers(words: List[str]) -> List[tuple]:
+    ops = min(len(words), MAX_OPS)
+    step = max(1, len(words) // ops)
+    return [(words[(i * step) % len(words)], i % 3 != 0) for i in range(ops)]
+
+
+def bench_manager(runner: BenchmarkRunner, prefix: str, size: int, manager, words: List[str],
+                  after_answers: Optional[Callable[[], None]] = None):
+    """record_answer, get_total_stats e get_difficult_words di un gestore."""
+    batch = answers(words)
+
+    def record():
+        for word, is_correct in batch:
+            manager.record_answer(word, is_correct)
+        if after_answers is not None:
+            after_answers()
+
+    runner.measure(f"{prefix}.record_answer", size, record, ops=len(batch))
+    runner.measure(f"{prefix}.get_total_stats", size,
+                   lambda: [manager.get_total_stats() for _ in range(100)], ops=100)
+    runner.measure(f"{prefix}.get_difficult_words", size,
+                   lambda: [manager.get_difficult_words(limit=5) for _ in range(100)], ops=100)
+
+
+def bench_progress_manager(runner: BenchmarkRunner, size: int, words: List[str]):
+    from progress_manager import ProgressManager
+
+    for mode in ("journal", "json"):
+        manager = ProgressManager(FILE_NAME, storage_mode=mode, fsync_policy="never")
+        manager.reset_all_progress()
+        for word, stats in seeded_progress(words).items():
+            manager.progress[word] = stats
+        manager.totals = type(manager.totals).from_progress(manager.progress)
+        manager._difficult = type(manager._difficult).from_progress(manager.progress)
+        # Nel formato json ogni risposta riscrive l'intero file: basta un campione
+        sample = words if mode == "journal" else words[:min(len(words), 50)]
+        bench_manager(runner, f"progress_manager[{mode}]", size, manager, sample)
+        manager.close()
+
+
+def bench_sqlite(runner: BenchmarkRunner, size: int, words: List[str], workdir: str):
+    from sqlite_progress_manager import SQLiteProgressManager
+
+    manager = SQLiteProgressManager(FILE_NAME, db_path=os.path.join(workdir, f"bench_{size}.sqlite3"))
+    conn = manager._connection()
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO progress (user_id, file_name, word, correct_count, wrong_count, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(manager.user_id, FILE_NAME, word, stats['correct'], stats['wrong'], now)
+             for word, stats in seeded_progress(words).items()]
+        )
+        manager._write_totals(conn, manager._aggregate_totals(conn))
+    bench_manager(runner, "sqlite_progress_manager", size, manager, words)
+
+
+def bench_session_state(runner: BenchmarkRunner, size: int, words: List[str]):
+    import hybrid_progress_manager
+    import runtime
+
+    # Fuori da Streamlit lo stato di sessione è un dizionario in memoria
+    with runtime.session_scope() as state:
+        manager = hybrid_progress_manager.SessionStateManager(FILE_NAME)
+        state[manager.storage_key] = seeded_progress(words)
+        for key in (manager.totals_key, manager.difficult_key):
+            del state[key]
+        manager = hybrid_progress_manager.SessionStateManager(FILE_NAME)
+    bench_manager(runner, "session_state_manager", size, manager, words)
+
+
+def bench_database_manager(runner: BenchmarkRunner, size: int, words: List[str]):
+    import database_manager
+    import runtime
+    import supabase_pool
+
+    client = FakeSupabaseClient()
+    client.seed(USER_ID, FILE_NAME, words)
+    supabase_pool.create_client = lambda url, key: client
+    supabase_pool._shared_pool = None
+    database_manager.SUPABASE_AVAILABLE = True
+    runtime.set_secrets({"SUPABASE_URL": "http://bench", "SUPABASE_KEY": "bench"})
+
+    manager = database_manager.DatabaseManager(FILE_NAME, user_id=USER_ID)
+    client.round_trips = 0
+    result = runner.measure("database_manager.load_snapshot", size, manager.refresh, repeat=1)
+    result['round_trips'] = client.round_trips
+
+    batch = answers(words)
+    client.round_trips = 0
+
+    def record():
+        for word, is_correct in batch:
+            manager.record_answer(word, is_correct)
+        manager.flush()
+
+    result = runner.measure("database_manager.record_answer", size, record, ops=len(batch), repeat=1)
+    result['round_trips_per_answer'] = round(client.round_trips / len(batch), 4)
+    runner.measure("database_manager.get_total_stats", size,
+                   lambda: [manager.get_total_stats() for _ in range(100)], ops=100)
+    runner.measure("database_manager.get_difficult_words", size,
+                   lambda: [manager.get_difficult_words(limit=5) for _ in range(100)], ops=100)
+    supabase_pool._shared_pool.close()
+    supabase_pool._shared_pool = None
+
+
+def bench_deck_loading(runner: BenchmarkRunner, size: int, words: List[str], workdir: str):
+    import csv
+    import deck_cache
+    import deck_registry
+
+    paths = {}
+    paths["csv"] = os.path.join(workdir, f"deck_{size}.csv")
+    with open(paths["csv"], "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["english", "italian"])
+        writer.writerows((word, f"{word}_it") for word in words)
+    try:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(["english"])
+        for word in words:
+            sheet.append([word])
+        paths["xlsx"] = os.path.join(workdir, f"deck_{size}.xlsx")
+        workbook.save(paths["xlsx"])
+    except ImportError as e:
+        print(f"deck loading xlsx saltato: {e}")
+    repeat = 1 if size >= 100_000 else None
+    # Mazzo dell'ultima misura: la lettura in background va finita prima di ripartire
+    last = []
+
+    def forget_memory():
+        while last:
+            last.pop().wait_until_loaded()
+        deck_registry._shared_registry = None
+        deck_cache._path_index.clear()
+
+    def forget_all():
+        forget_memory()
+        shutil.rmtree(deck_cache.CACHE_DIR, ignore_errors=True)
+
+    def first_words(path):
+        last.append(deck_cache.load_deck_from_path(path))
+
+    def load_all(path):
+        deck = deck_cache.load_deck_from_path(path)
+        deck.wait_until_loaded()
+        return deck
+
+    for fmt, path in paths.items():
+        # Tempo prima che il quiz possa iniziare (le prime parole) e lettura completa
+        runner.measure(f"deck.{fmt}.first_words", size, lambda: first_words(path),
+                       repeat=repeat, setup=forget_all)
+        runner.measure(f"deck.{fmt}.load_cold", size, lambda: load_all(path),
+                       repeat=repeat, setup=forget_all)
+        deck = load_all(path)
+        runner.measure(f"deck.{fmt}.load_compiled", size, lambda: load_all(path),
+                       setup=forget_memory, memory_bytes=deck.memory_bytes())
+        runner.measure(f"deck.{fmt}.load_warm", size, lambda: deck_cache.load_deck_from_path(path))
+    forget_memory()
+
+
+def bench_difficult_index(runner: BenchmarkRunner, size: int, words: List[str]) -> List[str]:
+    """
+    Classifica con molte parole sotto la soglia di tentativi (una risposta errata ciascuna).
+
+    Returns:
+        I controlli non rispettati: top() deve esaminare O(k) voci, non tutte le parole
+    """
+    from progress_stats import DifficultWordsIndex
+
+    index = DifficultWordsIndex()
+    for word in words:
+        index.update(word, 0, 1)
+    for i in range(10):
+        index.update(f"qualified{i}", 1, 5 + i)
+    limit = 5
+    index.top(min_attempts=3, limit=limit)
+    result = runner.measure("difficult_index.top_below_threshold", size,
+                            lambda: [index.top(min_attempts=3, limit=limit) for _ in range(100)], ops=100)
+    result['scanned_entries'] = index.last_scanned
+    if index.last_scanned > limit:
+        return [f"difficult_index.top [{size}]: esaminate {index.last_scanned} voci per {limit} parole"]
+    return []
+
+
+def bench_answer_matching(runner: BenchmarkRunner, size: int, words: List[str]):
+    from answer_matching import normalize_text
+
+    batch = answers(words)
+    expected = [[normalize_text(f"  {word.upper()} ")] for word, _ in batch]
+
+    def match():
+        for (word, _), possible_answers in zip(batch, expected):
+            normalize_text(word) in possible_answers
+
+    runner.measure("answer_matching.normalize_text", size, match, ops=len(batch))
+
+    from answer_matching import AnswerIndex
+
+    index = AnswerIndex()
+    translations = {word: [f"la {word}é / {word}s"] for word, _ in batch}
+    runner.measure("answer_matching.index_warm", size, lambda: AnswerIndex().warm(translations),
+                   ops=len(batch), repeat=1)
+    index.warm(translations)
+    typo_answers = [(word, word[:-1] + "x") for word, _ in batch]
+
+    def check():
+        for word, answer in typo_answers:
+            index.check(word, translations[word], answer, bundled=True)
+
+    runner.measure("answer_matching.check_near_miss", size, check, ops=len(typo_answers))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path: str) -> Dict[tuple, dict]:
+    with open(path, encoding='utf-8') as f:
+        return {(r['name'], r['size']): r for r in json.load(f)['results']}
+
+
+def compare(results: List[dict], baseline: Dict[tuple, dict], threshold: float) -> List[str]:
+    """Restituisce i benchmark più lenti del riferimento oltre la soglia."""
+    regressions = []
+    for result in results:
+        reference = baseline.get((result['name'], result['size']))
+        if not reference or not reference['median_us']:
+            continue
+        ratio = result['median_us'] / reference['median_us']
+        if ratio > 1 + threshold:
+            regressions.append(f"{result['name']} [{result['size']}]: {reference['median_us']} -> "
+                               f"{result['median_us']} us/op (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmark dell'app English Learning")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Dimensioni dei mazzi sintetici, separate da virgola")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Ripetizioni per misura")
+    parser.add_argument("--output", help="File JSON dei risultati (default benchmarks/results/)")
+    parser.add_argument("--compare", help="JSON di riferimento con cui confrontare i risultati")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Rallentamento tollerato rispetto al riferimento (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    # Letto subito: --output potrebbe sovrascrivere lo stesso file
+    baseline = load_baseline(args.compare) if args.compare else None
+    runner = BenchmarkRunner(args.repeat)
+    problems: List[str] = []
+    workdir = tempfile.mkdtemp(prefix="english-bench-")
+    previous_cwd = os.getcwd()
+    # I gestori scrivono in UserData/ e Cache/ relativi alla cartella corrente
+    os.chdir(workdir)
+    try:
+        for size in sizes:
+            words = synthetic_words(size)
+            bench_progress_manager(runner, size, words)
+            bench_sqlite(runner, size, words, workdir)
+            bench_session_state(runner, size, words)
+            bench_database_manager(runner, size, words)
+            bench_deck_loading(runner, size, words, workdir)
+            bench_answer_matching(runner, size, words)
+            problems.extend(bench_difficult_index(runner, size, words))
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': sizes,
+        'repeat': args.repeat,
+        'results': runner.results
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRisultati salvati in {output}")
+
+    for problem in problems:
+        print(f"ERRORE: {problem}")
+
+    if baseline is not None:
+        regressions = compare(runner.results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressioni rispetto al riferimento:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\nNessuna regressione rispetto al riferimento")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,128 +5,390 @@ Gestisce il progresso dell'utente utilizzando un database PostgreSQL remoto.
 
 import os
 import json
-from typing import Dict, Tuple, Optional
-import streamlit as st
-
-# Import condizionale per non bloccare l'app se non c'è supabase
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
-    # Crea mock classes per evitare errori
-    class Client:
-        pass
+import logging
+import threading
+import time
+import weakref
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+
+import runtime
+from progress_stats import (BULK_BATCH_SIZE, DifficultWordsIndex, ProgressRecord, ProgressTotals,
+                            batched, normalize_records, verify_totals)
+# Import condizionale di supabase gestito in supabase_pool
+from supabase_pool import SUPABASE_AVAILABLE, get_supabase_pool
+
+logger = logging.getLogger(__name__)
+
+# Soglie del buffer write-behind
+FLUSH_MAX_PENDING_WORDS = 20
+FLUSH_MAX_AGE_SECONDS = 10.0
+FLUSH_MAX_RETRIES = 3
+FLUSH_BACKOFF_SECONDS = 0.5
+
+# Durata della copia locale del progresso prima di ricaricarla dal database
+SNAPSHOT_TTL_SECONDS = 300.0
+# Dopo un caricamento fallito si riprova dopo questo intervallo, non dopo il TTL intero
+SNAPSHOT_RETRY_SECONDS = 10.0
+# Righe per pagina nelle letture complete (PostgREST restituisce al massimo 1000 righe per richiesta)
+CLOUD_PAGE_SIZE = 1000
+
+
+class WriteBehindBuffer:
+    """
+    Buffer che accumula in memoria gli incrementi per parola e li scrive in blocco.
+
+    Gli incrementi della stessa parola vengono fusi (lo stato di ripasso tiene
+    solo l'ultimo valore); il flush avviene quando il
+    buffer supera una soglia di dimensione o di età, oppure su richiesta esplicita.
+    Non mantiene riferimenti al DatabaseManager, così può essere svuotato anche
+    quando il manager viene distrutto (fine sessione).
+    """
+
+    def __init__(self, writer: Callable[[Dict[str, List[int]], Dict[str, Tuple[int, float]]], None],
+                 max_pending: int = FLUSH_MAX_PENDING_WORDS,
+                 max_age: float = FLUSH_MAX_AGE_SECONDS,
+                 max_retries: int = FLUSH_MAX_RETRIES,
+                 backoff: float = FLUSH_BACKOFF_SECONDS):
+        self.writer = writer
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._pending: Dict[str, List[int]] = {}
+        self._schedules: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.RLock()
+        # Serializza i flush: chi legge dopo un flush vede le scritture già concluse
+        self._write_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, word: str, correct: int, wrong: int):
+        """Accumula un incremento e, se serve, avvia il flush."""
+        with self._lock:
+            counts = self._pending.setdefault(word, [0, 0])
+            counts[0] += correct
+            counts[1] += wrong
+            should_flush = len(self._pending) >= self.max_pending
+            if not should_flush:
+                self._start_timer()
+        if should_flush:
+            self.flush()
+    
+    def set_schedule(self, word: str, box: int, due: float):
+        """Accumula lo stato di ripasso di una parola (vince l'ultimo valore)."""
+        with self._lock:
+            self._schedules[word] = (box, due)
+            self._start_timer()
+    
+    def _start_timer(self):
+        """Avvia il flush a tempo, se non già avviato (da chiamare con il lock acquisito)."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.max_age, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending_items(self) -> Dict[str, Tuple[int, int]]:
+        """Incrementi ancora da scrivere, per parola."""
+        with self._lock:
+            return {word: (counts[0], counts[1]) for word, counts in self._pending.items()}
+
+    def discard(self):
+        """Scarta gli incrementi in attesa (es. dopo un reset)."""
+        with self._lock:
+            self._pending = {}
+            self._schedules = {}
+            self._cancel_timer()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self) -> bool:
+        """
+        Scrive tutti gli incrementi in attesa con retry e backoff.
+
+        Returns:
+            True se il buffer è stato scritto (o era vuoto), False altrimenti
+        """
+        with self._write_lock:
+            with self._lock:
+                self._cancel_timer()
+                batch = self._pending
+                schedules = self._schedules
+                self._pending = {}
+                self._schedules = {}
+            if not batch and not schedules:
+                return True
+
+            for attempt in range(self.max_retries):
+                try:
+                    self.writer(batch, schedules)
+                    return True
+                except Exception as e:
+                    logger.warning("Flush del progresso fallito (tentativo %d): %s", attempt + 1, e)
+                    time.sleep(self.backoff * (2 ** attempt))
+
+            # Rimette gli incrementi nel buffer per non perderli
+            with self._lock:
+                for word, (correct, wrong) in batch.items():
+                    counts = self._pending.setdefault(word, [0, 0])
+                    counts[0] += correct
+                    counts[1] += wrong
+                for word, schedule in schedules.items():
+                    self._schedules.setdefault(word, schedule)
+                # Nuovo tentativo a tempo anche se non arrivano altre risposte
+                self._start_timer()
+            return False
+
+
+# None = non ancora verificato; False = funzione RPC non installata nel database
+_rpc_available: Optional[bool] = None
+
+
+def _is_missing_function_error(error: Exception) -> bool:
+    """Riconosce l'errore PostgREST per funzione RPC inesistente."""
+    message = str(error)
+    return "PGRST202" in message or ("increment_progress" in message and "not find" in message)
+
+
+def _write_increments_legacy(client, user_id: str, file_name: str, batch: Dict[str, List[int]]):
+    """Applica gli incrementi con una lettura e un upsert in blocco (non atomico)."""
+    current = {}
+    # Una lettura per blocco: oltre CLOUD_PAGE_SIZE righe PostgREST tronca la risposta
+    for words in batched(batch.keys(), CLOUD_PAGE_SIZE):
+        existing = client.table("progress").select("word, correct_count, wrong_count").eq(
+            "user_id", user_id
+        ).eq("file_name", file_name).in_("word", words).execute()
+        current.update((record["word"], (record["correct_count"], record["wrong_count"]))
+                       for record in (existing.data or []))
+    rows = []
+    for word, (correct, wrong) in batch.items():
+        base_correct, base_wrong = current.get(word, (0, 0))
+        rows.append({
+            "user_id": user_id,
+            "file_name": file_name,
+            "word": word,
+            "correct_count": base_correct + correct,
+            "wrong_count": base_wrong + wrong
+        })
+    client.table("progress").upsert(rows, on_conflict="user_id,file_name,word").execute()
+
+
+def _has_schedule_columns(client) -> bool:
+    """
+    True se la tabella progress ha le colonne box/due_at.
+
+    Lo verifica SupabasePool una volta all'avvio (e di nuovo nei controlli
+    periodici finché mancano); un client senza questa informazione si
+    considera migrato.
+    """
+    return getattr(client, "has_schedule_columns", True)
+
+
+def _write_schedules(client, user_id: str, file_name: str, schedules: Dict[str, Tuple[int, float]]):
+    """Salva lo stato di ripasso con un upsert in blocco delle sole colonne box/due_at."""
+    if not _has_schedule_columns(client):
+        # Database non migrato: lo stato di ripasso resta nella sessione
+        return
+    rows = [{
+        "user_id": user_id,
+        "file_name": file_name,
+        "word": word,
+        "box": box,
+        "due_at": due
+    } for word, (box, due) in schedules.items()]
+    try:
+        client.table("progress").upsert(rows, on_conflict="user_id,file_name,word").execute()
+    except Exception as e:
+        # Colonne non ancora migrate: lo stato di ripasso non è critico, i contatori sì
+        logger.warning("Stato di ripasso non salvato (colonne box/due_at mancanti?): %s", e)
+
+
+def _write_increments(client, user_id: str, file_name: str, batch: Dict[str, List[int]],
+                      schedules: Optional[Dict[str, Tuple[int, float]]] = None):
+    """
+    Applica un blocco di incrementi in modo atomico lato server.
+
+    Usa la funzione SQL increment_progress (vedi DEPLOYMENT.md): un solo
+    round trip e nessun aggiornamento perso tra sessioni concorrenti. Se la
+    funzione non è installata si ripiega sul percorso lettura + upsert.
+    Lo stato di ripasso, se presente, viene scritto dopo gli incrementi.
+    """
+    if batch:
+        _apply_increments(client, user_id, file_name, batch)
+    if schedules:
+        _write_schedules(client, user_id, file_name, schedules)
+
+
+def _apply_increments(client, user_id: str, file_name: str, batch: Dict[str, List[int]]):
+    """Incrementi via RPC atomica, con ripiego sul percorso non atomico."""
+    global _rpc_available
+    if _rpc_available is not False:
+        increments = [{"word": word, "correct": correct, "wrong": wrong}
+                      for word, (correct, wrong) in batch.items()]
+        try:
+            client.rpc("increment_progress", {
+                "p_user_id": user_id,
+                "p_file_name": file_name,
+                "p_increments": increments
+            }).execute()
+            _rpc_available = True
+            return
+        except Exception as e:
+            if not _is_missing_function_error(e):
+                raise
+            logger.warning("Funzione increment_progress assente: uso il salvataggio non atomico")
+            _rpc_available = False
+
+    _write_increments_legacy(client, user_id, file_name, batch)
+
 
 class DatabaseManager:
-    def __init__(self, file_name: str, user_id: Optional[str] = None):
+    def __init__(self, file_name: str, user_id: Optional[str] = None,
+                 snapshot_ttl: float = SNAPSHOT_TTL_SECONDS):
         """
         Inizializza il gestore database cloud.
         
         Args:
             file_name: Nome del file Excel (es. "Words.xlsx")
             user_id: ID utente unico (se None, usa session state)
+            snapshot_ttl: Secondi dopo i quali la copia locale viene ricaricata
         """
         self.file_name = file_name
+        # Stato di sessione (Streamlit o in memoria): ID utente e fallback locale
+        self._state = runtime.session_state()
         self.user_id = user_id or self._get_user_id()
+        # Client condiviso dal processo (SupabasePool), stessa interfaccia del client Supabase
         self.supabase_client = None
         self.is_cloud_enabled = False
+        self._write_buffer = None
+        # Copia locale del progresso: caricata una volta e aggiornata a ogni scrittura
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot: Optional[Dict[str, Dict[str, int]]] = None
+        self._snapshot_loaded_at = 0.0
+        self._totals = ProgressTotals()
+        self._difficult = DifficultWordsIndex()
         
         # Tenta di inizializzare Supabase
         self._init_supabase()
+        
+        if self.is_cloud_enabled:
+            # Le risposte vengono accumulate e scritte in blocco
+            self._write_buffer = WriteBehindBuffer(
+                partial(_write_increments, self.supabase_client, self.user_id, self.file_name)
+            )
+            # Svuota il buffer quando il manager viene distrutto (fine sessione o uscita)
+            weakref.finalize(self, self._write_buffer.flush)
     
     def _get_user_id(self) -> str:
         """Genera o recupera un ID utente univoco dalla sessione."""
-        if 'user_id' not in st.session_state:
+        if 'user_id' not in self._state:
             import uuid
-            st.session_state.user_id = str(uuid.uuid4())
-        return st.session_state.user_id
+            self._state['user_id'] = str(uuid.uuid4())
+        return self._state['user_id']
     
     def _init_supabase(self):
         """Inizializza la connessione a Supabase se le credenziali sono disponibili."""
         try:
             # Prova a leggere le credenziali da secrets o variabili d'ambiente
-            supabase_url = st.secrets.get("SUPABASE_URL") or os.getenv("SUPABASE_URL")
-            supabase_key = st.secrets.get("SUPABASE_KEY") or os.getenv("SUPABASE_KEY")
+            supabase_url = runtime.get_secret("SUPABASE_URL")
+            supabase_key = runtime.get_secret("SUPABASE_KEY")
             
             if supabase_url and supabase_key and SUPABASE_AVAILABLE:
-                self.supabase_client = create_client(supabase_url, supabase_key)
+                # Client e verifica dello schema sono condivisi: nessun round trip al cambio mazzo
+                self.supabase_client = get_supabase_pool(supabase_url, supabase_key)
                 self.is_cloud_enabled = True
-                self._ensure_table_exists()
             else:
                 self.is_cloud_enabled = False
         except Exception as e:
-            st.warning(f"Database cloud non disponibile, usando Session State locale: {e}")
+            runtime.warning(f"Database cloud non disponibile, usando Session State locale: {e}")
             self.is_cloud_enabled = False
     
-    def _ensure_table_exists(self):
-        """Crea la tabella se non esiste (solo per demo - in produzione usare migrations)."""
-        if not self.supabase_client:
-            return
-        
-        try:
-            # Verifica se la tabella esiste provando a fare una query
-            self.supabase_client.table("progress").select("*").limit(1).execute()
-        except Exception:
-            # Se la query fallisce, probabilmente la tabella non esiste
-            # In un deployment reale, useresti le migrations di Supabase
-            pass
-    
-    def _get_progress_from_cloud(self) -> Dict[str, Dict[str, int]]:
-        """Carica il progresso dal database cloud."""
+    def _get_progress_from_cloud(self) -> Optional[Dict[str, Dict[str, int]]]:
+        """Carica il progresso dal database cloud (None se il caricamento fallisce)."""
         if not self.is_cloud_enabled:
             return {}
         
         try:
-            response = self.supabase_client.table("progress").select("*").eq(
-                "user_id", self.user_id
-            ).eq("file_name", self.file_name).execute()
-            
-            if response.data:
-                # Converte i record del database in formato dictionary
-                progress = {}
-                for record in response.data:
-                    word = record["word"].lower().strip()
-                    progress[word] = {
-                        "correct": record["correct_count"],
-                        "wrong": record["wrong_count"]
-                    }
-                return progress
-            return {}
+            # Converte i record del database in formato dictionary
+            progress = {}
+            for page in self._iter_cloud_pages(CLOUD_PAGE_SIZE):
+                for record in page:
+                    progress[record.word.lower().strip()] = record.as_stats()
+            return progress
         except Exception as e:
-            st.error(f"Errore nel caricamento dal database: {e}")
-            return {}
+            runtime.error(f"Errore nel caricamento dal database: {e}")
+            return None
     
-    def _save_progress_to_cloud(self, word: str, correct: int, wrong: int):
-        """Salva o aggiorna il progresso nel database cloud."""
-        if not self.is_cloud_enabled:
+    def _iter_cloud_pages(self, page_size: int, after: Optional[str] = None) -> Iterator[List[ProgressRecord]]:
+        """
+        Legge il progresso dal database una pagina alla volta, in ordine di parola.
+        
+        Ogni pagina riparte dall'ultima parola letta (paginazione per chiave):
+        il costo per pagina non cresce con la posizione come con un offset.
+        Le pagine non superano CLOUD_PAGE_SIZE righe: oltre il limite di
+        PostgREST una pagina troncata sembrerebbe l'ultima.
+        """
+        page_size = min(page_size, CLOUD_PAGE_SIZE)
+        columns = "word, correct_count, wrong_count"
+        if _has_schedule_columns(self.supabase_client):
+            columns += ", box, due_at"
+        last = after
+        while True:
+            query = self.supabase_client.table("progress").select(columns).eq("user_id", self.user_id).eq("file_name", self.file_name)
+            if last is not None:
+                query = query.gt("word", last)
+            rows = query.order("word").limit(page_size).execute().data or []
+            if rows:
+                yield [ProgressRecord(row["word"], row["correct_count"], row["wrong_count"],
+                                      row.get("box") or 0, row.get("due_at") or 0.0) for row in rows]
+            if len(rows) < page_size:
+                return
+            last = rows[-1]["word"]
+    
+    def refresh(self):
+        """
+        Ricarica la copia locale dal database.
+        
+        Le risposte in attesa vengono scritte prima, così il database è aggiornato;
+        quelle che non è stato possibile scrivere vengono riapplicate sopra.
+        Se il caricamento fallisce resta la copia precedente e si riprova dopo
+        SNAPSHOT_RETRY_SECONDS.
+        """
+        self._write_buffer.flush()
+        progress = self._get_progress_from_cloud()
+        if progress is None:
+            if self._snapshot is None:
+                # Nessuna copia precedente: solo le risposte di questa sessione
+                self._snapshot = {}
+                self._totals = ProgressTotals()
+                self._difficult = DifficultWordsIndex()
+                for word, (correct, wrong) in self._write_buffer.pending_items().items():
+                    self._snapshot[word] = {"correct": correct, "wrong": wrong}
+                    self._totals.update(None, (correct, wrong))
+                    self._difficult.update(word, correct, wrong)
+            self._snapshot_loaded_at = time.monotonic() - self.snapshot_ttl + SNAPSHOT_RETRY_SECONDS
             return
+        for word, (correct, wrong) in self._write_buffer.pending_items().items():
+            stats = progress.setdefault(word, {"correct": 0, "wrong": 0})
+            stats["correct"] += correct
+            stats["wrong"] += wrong
+        self._snapshot = progress
+        self._totals = ProgressTotals.from_progress(progress)
+        self._difficult = DifficultWordsIndex.from_progress(progress)
+        self._snapshot_loaded_at = time.monotonic()
+    
+    def _get_progress(self) -> Dict[str, Dict[str, int]]:
+        """Restituisce il progresso senza chiamate di rete, salvo il primo caricamento o TTL scaduto."""
+        if self.is_cloud_enabled:
+            expired = time.monotonic() - self._snapshot_loaded_at > self.snapshot_ttl
+            if self._snapshot is None or expired:
+                self.refresh()
+            return self._snapshot
         
-        try:
-            # Controlla se esiste già un record per questa parola
-            existing = self.supabase_client.table("progress").select("*").eq(
-                "user_id", self.user_id
-            ).eq("file_name", self.file_name).eq("word", word.lower().strip()).execute()
-            
-            data = {
-                "user_id": self.user_id,
-                "file_name": self.file_name,
-                "word": word.lower().strip(),
-                "correct_count": correct,
-                "wrong_count": wrong
-            }
-            
-            if existing.data:
-                # Aggiorna record esistente
-                self.supabase_client.table("progress").update(data).eq(
-                    "user_id", self.user_id
-                ).eq("file_name", self.file_name).eq("word", word.lower().strip()).execute()
-            else:
-                # Inserisci nuovo record
-                self.supabase_client.table("progress").insert(data).execute()
-                
-        except Exception as e:
-            st.error(f"Errore nel salvataggio sul database: {e}")
+        # Fallback a session state per uso locale
+        return self._state.setdefault('local_progress', {}).get(self.file_name, {})
     
     def get_word_stats(self, word: str) -> Tuple[int, int]:
         """
@@ -138,13 +400,7 @@ class DatabaseManager:
         Returns:
             Tupla (risposte_corrette, risposte_errate)
         """
-        if self.is_cloud_enabled:
-            progress = self._get_progress_from_cloud()
-        else:
-            # Fallback a session state per uso locale
-            if 'local_progress' not in st.session_state:
-                st.session_state.local_progress = {}
-            progress = st.session_state.local_progress.get(self.file_name, {})
+        progress = self._get_progress()
         
         word_lower = word.lower().strip()
         if word_lower in progress:
@@ -163,97 +419,165 @@ class DatabaseManager:
         word_lower = word.lower().strip()
         
         if self.is_cloud_enabled:
-            # Ottieni stats attuali e aggiorna
-            correct, wrong = self.get_word_stats(word)
+            # Aggiorna la copia locale e accumula l'incremento per il buffer write-behind
+            progress = self._get_progress()
+            is_new_word = word_lower not in progress
+            stats = progress.setdefault(word_lower, {'correct': 0, 'wrong': 0})
             if is_correct:
-                correct += 1
+                stats['correct'] += 1
             else:
-                wrong += 1
-            self._save_progress_to_cloud(word_lower, correct, wrong)
+                stats['wrong'] += 1
+            self._totals.record(is_new_word, is_correct)
+            self._difficult.update(word_lower, stats['correct'], stats['wrong'])
+            self._write_buffer.add(word_lower, int(is_correct), int(not is_correct))
         else:
             # Fallback a session state per uso locale
-            if 'local_progress' not in st.session_state:
-                st.session_state.local_progress = {}
-            if self.file_name not in st.session_state.local_progress:
-                st.session_state.local_progress[self.file_name] = {}
-            
-            if word_lower not in st.session_state.local_progress[self.file_name]:
-                st.session_state.local_progress[self.file_name][word_lower] = {'correct': 0, 'wrong': 0}
-            
+            local_progress = self._state.setdefault('local_progress', {})
+            stats = local_progress.setdefault(self.file_name, {}).setdefault(
+                word_lower, {'correct': 0, 'wrong': 0}
+            )
             if is_correct:
-                st.session_state.local_progress[self.file_name][word_lower]['correct'] += 1
+                stats['correct'] += 1
             else:
-                st.session_state.local_progress[self.file_name][word_lower]['wrong'] += 1
+                stats['wrong'] += 1
     
     def get_total_stats(self) -> Dict[str, int]:
         """Ottiene le statistiche totali."""
+        progress = self._get_progress()
         if self.is_cloud_enabled:
-            progress = self._get_progress_from_cloud()
-        else:
-            if 'local_progress' not in st.session_state:
-                st.session_state.local_progress = {}
-            progress = st.session_state.local_progress.get(self.file_name, {})
-        
-        total_correct = sum(stats.get('correct', 0) for stats in progress.values())
-        total_wrong = sum(stats.get('wrong', 0) for stats in progress.values())
-        total_words = len(progress)
-        total_attempts = total_correct + total_wrong
-        
-        accuracy = (total_correct / total_attempts * 100) if total_attempts > 0 else 0
-        
-        return {
-            'total_words_practiced': total_words,
-            'total_correct': total_correct,
-            'total_wrong': total_wrong,
-            'total_attempts': total_attempts,
-            'accuracy_percentage': round(accuracy, 1)
-        }
+            # Totali mantenuti insieme alla copia locale
+            return self._totals.as_stats()
+        return ProgressTotals.from_progress(progress).as_stats()
+    
+    def verify_totals(self) -> bool:
+        """Verifica che i totali incrementali coincidano con un ricalcolo completo."""
+        if not self.is_cloud_enabled:
+            return True
+        return verify_totals(self._totals, self._get_progress())
     
-    def get_difficult_words(self, min_attempts: int = 3) -> list:
+    def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list:
         """Ottiene le parole più difficili."""
+        progress = self._get_progress()
         if self.is_cloud_enabled:
-            progress = self._get_progress_from_cloud()
-        else:
-            if 'local_progress' not in st.session_state:
-                st.session_state.local_progress = {}
-            progress = st.session_state.local_progress.get(self.file_name, {})
-        
-        difficult_words = []
-        
-        for word, stats in progress.items():
-            correct = stats.get('correct', 0)
-            wrong = stats.get('wrong', 0)
-            total = correct + wrong
-            
-            if total >= min_attempts and wrong > correct:
-                error_rate = wrong / total
-                difficult_words.append({
-                    'word': word,
-                    'correct': correct,
-                    'wrong': wrong,
-                    'error_rate': error_rate
-                })
-        
-        difficult_words.sort(key=lambda x: x['error_rate'], reverse=True)
-        return difficult_words
+            # Classifica mantenuta insieme alla copia locale
+            return self._difficult.top(min_attempts, limit)
+        return DifficultWordsIndex.from_progress(progress).top(min_attempts, limit)
     
     def reset_all_progress(self):
         """Reset di tutto il progresso."""
         if self.is_cloud_enabled:
+            self._write_buffer.discard()
+            self._snapshot = {}
+            self._totals = ProgressTotals()
+            self._difficult = DifficultWordsIndex()
+            self._snapshot_loaded_at = time.monotonic()
             try:
                 self.supabase_client.table("progress").delete().eq(
                     "user_id", self.user_id
                 ).eq("file_name", self.file_name).execute()
             except Exception as e:
-                st.error(f"Errore nel reset del database: {e}")
+                runtime.error(f"Errore nel reset del database: {e}")
         else:
-            if 'local_progress' in st.session_state and self.file_name in st.session_state.local_progress:
-                del st.session_state.local_progress[self.file_name]
+            self._state.get('local_progress', {}).pop(self.file_name, None)
+    
+    def get_schedules(self) -> Dict[str, Tuple[int, float]]:
+        """Stato di ripasso per parola: {parola: (scatola, scadenza)}."""
+        return {word: (stats['box'], stats['due'])
+                for word, stats in self._get_progress().items() if 'box' in stats}
+    
+    def save_schedule(self, word: str, box: int, due: float):
+        """Aggiorna lo stato di ripasso nella copia locale e lo accoda per il database."""
+        word_lower = word.lower().strip()
+        stats = self._get_progress().get(word_lower)
+        if stats is None:
+            return
+        stats['box'] = box
+        stats['due'] = due
+        if self.is_cloud_enabled:
+            self._write_buffer.set_schedule(word_lower, box, due)
+    
+    def iter_progress(self, batch_size: int = BULK_BATCH_SIZE,
+                      after: Optional[str] = None) -> Iterator[List[ProgressRecord]]:
+        """
+        Esporta il progresso a blocchi, in ordine di parola.
+        
+        In cloud le risposte in attesa vengono scritte prima e il database viene
+        letto a pagine, senza passare dalla copia locale.
+        
+        Args:
+            after: Riprende dalla parola successiva a questa (es. da un checkpoint)
+        """
+        if not self.is_cloud_enabled:
+            progress = self._get_progress()
+            words = sorted(word for word in progress if after is None or word > after)
+            for chunk in batched(words, batch_size):
+                yield [ProgressRecord.from_stats(word, progress[word]) for word in chunk]
+            return
+        self._write_buffer.flush()
+        # Le pagine del database (al massimo CLOUD_PAGE_SIZE righe) vengono riunite in blocchi
+        records = (record for page in self._iter_cloud_pages(batch_size, after) for record in page)
+        yield from batched(records, batch_size)
+    
+    def upsert_progress(self, records: Iterable[ProgressRecord]):
+        """
+        Imposta il progresso completo delle parole indicate (importazione in blocco).
+        
+        In cloud le righe vengono scritte con un upsert per blocco; la copia
+        locale, se già caricata, viene aggiornata insieme a totali e classifica.
+        """
+        records = normalize_records(records)
+        if not records:
+            return
+        if not self.is_cloud_enabled:
+            progress = self._state.setdefault('local_progress', {}).setdefault(self.file_name, {})
+            for word, record in records.items():
+                progress[word] = record.as_stats()
+            return
+        
+        # Gli incrementi in attesa vanno scritti prima, o verrebbero sommati ai nuovi valori
+        if not self._write_buffer.flush():
+            raise RuntimeError("Risposte in attesa non scritte sul database: importazione annullata")
+        with_schedule = _has_schedule_columns(self.supabase_client)
+        for chunk in batched(records.values(), CLOUD_PAGE_SIZE):
+            rows = []
+            for record in chunk:
+                row = {
+                    "user_id": self.user_id,
+                    "file_name": self.file_name,
+                    "word": record.word,
+                    "correct_count": record.correct,
+                    "wrong_count": record.wrong
+                }
+                if with_schedule:
+                    row["box"] = record.box
+                    row["due_at"] = record.due
+                rows.append(row)
+            self.supabase_client.table("progress").upsert(rows, on_conflict="user_id,file_name,word").execute()
+        
+        if self._snapshot is not None:
+            for word, record in records.items():
+                old = self._snapshot.get(word)
+                self._totals.update(None if old is None else (old.get('correct', 0), old.get('wrong', 0)),
+                                    (record.correct, record.wrong))
+                self._snapshot[word] = record.as_stats()
+                self._difficult.update(word, record.correct, record.wrong)
+    
+    def flush(self) -> bool:
+        """Scrive subito sul database le risposte in attesa nel buffer."""
+        if self._write_buffer is None:
+            return True
+        return self._write_buffer.flush()
     
     def get_status_info(self) -> Dict[str, str]:
         """Restituisce informazioni sullo stato del database."""
-        return {
+        info = {
             "storage_type": "Database Cloud (Supabase)" if self.is_cloud_enabled else "Session State Locale",
             "is_persistent": "Sì" if self.is_cloud_enabled else "No (solo durante la sessione)",
-            "user_id": self.user_id[:8] + "..." if self.user_id else "N/A"
-        }
\ No newline at end of file
+            "user_id": self.user_id[:8] + "..." if self.user_id else "N/A",
+            "pending_writes": len(self._write_buffer.pending_items()) if self._write_buffer else 0,
+            "snapshot_age_seconds": round(time.monotonic() - self._snapshot_loaded_at)
+            if self._snapshot is not None else "N/A"
+        }
+        if self.is_cloud_enabled:
+            info.update(self.supabase_client.get_status_info())
+        return info
\ No newline at end of file
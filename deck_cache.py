@@ -0,0 +1,288 @@
+"""
+Cache dei mazzi compilati.
+Ogni file viene analizzato una sola volta e salvato in forma binaria compatta,
+indicizzata per hash del contenuto. La versione in memoria è condivisa tra tutte
+le sessioni Streamlit dello stesso processo tramite il registro dei mazzi.
+
+I mazzi nuovi vengono letti in streaming (vedi deck_loader): le prime righe
+vengono lette subito e il resto in background, così il quiz può iniziare prima
+che un file molto grande sia stato letto tutto.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from deck_loader import (DeckFormatError, Source, WordTable, cell_text, deck_format,
+                         iter_rows, parse_header)
+from deck_registry import get_deck_registry
+
+logger = logging.getLogger(__name__)
+
+# Versione del formato compilato: cambiarla invalida tutti i file in cache
+CACHE_FORMAT_VERSION = 3
+CACHE_DIR = os.path.join("Cache", "decks")
+# Parole lette prima di restituire il mazzo; il resto arriva in background
+INITIAL_WORDS = 1000
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class CompiledDeck:
+    """
+    Mazzo già analizzato: lingua sorgente, tabella compatta delle parole e le
+    eventuali traduzioni incluse nel file, allineate alle parole per lingua.
+
+    Durante la lettura in background le tabelle crescono in coda: len() e
+    le parole già lette sono sempre consistenti, is_loaded indica la fine.
+    """
+
+    __slots__ = ("content_hash", "source_lang", "words", "translations", "load_error", "_loaded")
+
+    def __init__(self, content_hash: str, source_lang: str, words: Sequence,
+                 translations: Optional[Dict[str, Sequence]] = None, loaded: bool = True):
+        self.content_hash = content_hash
+        self.source_lang = source_lang
+        self.words = words
+        # lingua -> tabella allineata a words ("" se la parola non ha traduzione)
+        self.translations = translations or {}
+        self.load_error: Optional[str] = None
+        self._loaded = threading.Event()
+        if loaded:
+            self._loaded.set()
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        return self._loaded.wait(timeout)
+
+    @property
+    def languages(self) -> Tuple[str, ...]:
+        """Lingue con traduzioni incluse nel mazzo."""
+        return tuple(self.translations)
+
+    def bundled_translation(self, index: int, lang: str) -> Optional[str]:
+        """Traduzione inclusa nel file per la parola in posizione index, se presente."""
+        column = self.translations.get(lang)
+        if column is None or index >= len(column):
+            return None
+        return column[index] or None
+
+    def memory_bytes(self) -> int:
+        """Byte occupati da parole e traduzioni incluse."""
+        return self.words.nbytes() + sum(column.nbytes() for column in self.translations.values())
+
+
+# Indice condiviso a livello di processo (i mazzi in memoria stanno nel registro)
+# path -> (mtime_ns, size, content_hash): evita di rileggere file invariati
+_path_index: Dict[str, Tuple[int, int, str]] = {}
+_lock = threading.Lock()
+# content_hash -> lock: un solo thread analizza lo stesso mazzo
+_compile_locks: Dict[str, threading.Lock] = {}
+
+
+def hash_bytes(data: bytes) -> str:
+    """Hash del contenuto usato come chiave della cache."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """Hash del contenuto di un file, letto a blocchi senza caricarlo tutto in memoria."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _DeckReader:
+    """Riempie le tabelle di un mazzo leggendo le righe del file."""
+
+    def __init__(self, deck: CompiledDeck, rows: Iterator[Sequence], answer_langs: List[str]):
+        self.deck = deck
+        self.rows = rows
+        self.answer_langs = answer_langs
+        self.done = False
+
+    def read(self, min_words: Optional[int] = None):
+        """Legge finché il mazzo ha almeno min_words parole (tutto il file se None)."""
+        deck = self.deck
+        words = deck.words
+        columns = deck.translations
+        answer_langs = self.answer_langs
+        for row in self.rows:
+            word = cell_text(row[0]) if row else ""
+            if not word.strip():
+                continue
+            merged: Dict[str, str] = {}
+            for column, lang in enumerate(answer_langs, start=1):
+                value = cell_text(row[column]).strip() if column < len(row) else ""
+                if value:
+                    # Colonne nella stessa lingua: traduzioni alternative
+                    merged[lang] = f"{merged[lang]} / {value}" if lang in merged else value
+            # Prima le traduzioni, poi la parola: chi legge len(words) le trova già
+            for lang, table in columns.items():
+                table.append(merged.get(lang, ""))
+            words.append(word)
+            if min_words is not None and len(words) >= min_words:
+                return
+        self.done = True
+
+    def finish(self):
+        """Legge il resto del file (in background) e salva il mazzo compilato."""
+        try:
+            self.read()
+        except Exception as e:
+            self.deck.load_error = str(e)
+            logger.warning("Lettura del mazzo %s interrotta: %s", self.deck.content_hash[:12], e)
+        finally:
+            self.rows.close()
+            self.deck._loaded.set()
+        if self.deck.load_error is None:
+            _store_compiled(self.deck)
+
+
+def _compile(content_hash: str, source: Source, fmt: str) -> Tuple[CompiledDeck, Optional[_DeckReader]]:
+    """
+    Legge la prima riga e le prime parole del mazzo.
+
+    Returns:
+        Il mazzo e il lettore da completare in background (None se il file è già finito)
+    """
+    rows = iter_rows(source, fmt)
+    try:
+        header = next(rows, None)
+        if header is None:
+            raise DeckFormatError("Il file è vuoto")
+        source_lang, answer_langs = parse_header(header)
+        deck = CompiledDeck(content_hash, source_lang, WordTable(),
+                            {lang: WordTable() for lang in dict.fromkeys(answer_langs)}, loaded=False)
+        reader = _DeckReader(deck, rows, answer_langs)
+        reader.read(INITIAL_WORDS)
+    except BaseException:
+        rows.close()
+        raise
+    if len(deck) == 0:
+        rows.close()
+        raise DeckFormatError("Il mazzo non contiene parole")
+    if reader.done:
+        rows.close()
+        deck._loaded.set()
+        _store_compiled(deck)
+        return deck, None
+    return deck, reader
+
+
+def _compiled_path(content_hash: str) -> str:
+    return os.path.join(CACHE_DIR, f"{content_hash}.v{CACHE_FORMAT_VERSION}.deck")
+
+
+def _load_compiled(content_hash: str):
+    """Legge il mazzo compilato dal disco, se presente e valido."""
+    path = _compiled_path(content_hash)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            source_lang, words, translations = pickle.load(f)
+        return CompiledDeck(content_hash, source_lang, WordTable.from_state(words),
+                            {lang: WordTable.from_state(column) for lang, column in translations.items()})
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        # File corrotto o di un formato precedente: verrà ricompilato
+        return None
+
+
+def _store_compiled(deck: CompiledDeck):
+    """Salva il mazzo compilato con scrittura atomica."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = _compiled_path(deck.content_hash)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((deck.source_lang, deck.words.to_state(),
+                         {lang: column.to_state() for lang, column in deck.translations.items()}),
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        # La cache su disco è solo un'ottimizzazione
+        pass
+
+
+def _get_or_compile(content_hash: str, source: Source, fmt: str) -> CompiledDeck:
+    """Restituisce il mazzo dalla memoria, dal disco o analizzandolo da zero."""
+    registry = get_deck_registry()
+    deck = registry.get(content_hash)
+    if deck is not None:
+        return deck
+
+    with _lock:
+        compile_lock = _compile_locks.setdefault(content_hash, threading.Lock())
+    try:
+        with compile_lock:
+            # Un'altra sessione potrebbe averlo appena registrato
+            deck = registry.get(content_hash)
+            if deck is not None:
+                return deck
+
+            deck = _load_compiled(content_hash)
+            if deck is not None:
+                return registry.add(deck)
+
+            deck, reader = _compile(content_hash, source, fmt)
+            deck = registry.add(deck)
+            if reader is not None:
+                threading.Thread(target=reader.finish, name=f"deck-loader-{content_hash[:8]}",
+                                 daemon=True).start()
+            return deck
+    finally:
+        with _lock:
+            _compile_locks.pop(content_hash, None)
+
+
+def load_deck_from_path(path: str) -> CompiledDeck:
+    """
+    Carica un mazzo da un file su disco.
+
+    Se mtime e dimensione non sono cambiati il file non viene nemmeno riletto:
+    il mazzo arriva dalla memoria o dalla cache compilata su disco.
+    """
+    fmt = deck_format(path)
+    stat = os.stat(path)
+    cached = _path_index.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        content_hash = cached[2]
+    else:
+        content_hash = hash_file(path)
+    deck = _get_or_compile(content_hash, path, fmt)
+
+    remember_path(path, stat.st_mtime_ns, stat.st_size, content_hash)
+    return deck
+
+
+def remember_path(path: str, mtime_ns: int, size: int, content_hash: str):
+    """Registra l'hash di un file già noto (es. dal catalogo dei mazzi) per non doverlo ricalcolare."""
+    with _lock:
+        _path_index[path] = (mtime_ns, size, content_hash)
+
+
+def load_deck_from_bytes(data: bytes, name: str = "deck.xlsx") -> CompiledDeck:
+    """
+    Carica un mazzo dal contenuto di un file caricato dall'utente.
+
+    Args:
+        data: Contenuto del file
+        name: Nome del file, da cui si ricava il formato
+    """
+    return _get_or_compile(hash_bytes(data), data, deck_format(name))
+
+
+def uploaded_deck_name(deck: CompiledDeck) -> str:
+    """Nome stabile per un file caricato, basato sull'hash del contenuto."""
+    return f"upload_{deck.content_hash[:16]}.xlsx"
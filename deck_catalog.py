@@ -0,0 +1,221 @@
+"""
+Catalogo persistente dei mazzi nella cartella Files.
+Per ogni file conserva numero di parole, lingua sorgente, lingue incluse, hash del
+contenuto e data di modifica. Ad ogni rerun la cartella viene ricontrollata solo
+se è cambiata (o dopo un intervallo minimo) e vengono indicizzati soltanto i file
+nuovi o modificati, in background: l'indicizzazione compila anche il mazzo, così
+la cache è già calda quando l'utente lo sceglie.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import deck_cache
+from deck_loader import DECK_EXTENSIONS, DeckFormatError
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.path.join("Cache", "deck_catalog.json")
+CATALOG_VERSION = 1
+# Anche se la cartella non cambia, i file vengono ricontrollati dopo questo intervallo
+RESCAN_INTERVAL_SECONDS = 5.0
+
+
+class DeckInfo(NamedTuple):
+    name: str
+    mtime_ns: int
+    size: int
+    # Campi seguenti valorizzati dopo l'indicizzazione
+    content_hash: Optional[str] = None
+    word_count: Optional[int] = None
+    source_lang: Optional[str] = None
+    languages: Tuple[str, ...] = ()
+    error: Optional[str] = None
+
+    @property
+    def indexed(self) -> bool:
+        return self.content_hash is not None or self.error is not None
+
+
+class DeckCatalog:
+    def __init__(self, files_dir: str = "Files", catalog_path: str = CATALOG_PATH,
+                 rescan_interval: float = RESCAN_INTERVAL_SECONDS):
+        """
+        Carica il catalogo salvato e accoda l'indicizzazione dei file cambiati.
+
+        Args:
+            files_dir: Cartella dei mazzi
+            catalog_path: File JSON del catalogo
+            rescan_interval: Secondi minimi tra due controlli dei file
+        """
+        self.files_dir = files_dir
+        self.catalog_path = catalog_path
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[str, DeckInfo] = {}
+        self._queued: set = set()
+        self._dir_mtime_ns: Optional[int] = None
+        self._last_scan = 0.0
+        # Un solo mazzo alla volta: l'indicizzazione non deve rubare CPU al quiz
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deck-catalog")
+
+        self._load()
+        self.refresh(force=True)
+
+    def _load(self):
+        try:
+            with open(self.catalog_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != CATALOG_VERSION:
+            return
+        for item in data.get('decks', []):
+            try:
+                info = DeckInfo(**{**item, 'languages': tuple(item.get('languages', ()))})
+            except TypeError:
+                continue
+            self._entries[info.name] = info
+            if info.content_hash is not None:
+                # Il mazzo si riapre dalla cache compilata senza rileggere il file
+                deck_cache.remember_path(self._path(info.name), info.mtime_ns, info.size, info.content_hash)
+
+    def _save(self):
+        """Salva il catalogo con scrittura atomica."""
+        with self._lock:
+            data = {'version': CATALOG_VERSION,
+                    'decks': [info._asdict() for info in self._entries.values()]}
+        try:
+            os.makedirs(os.path.dirname(self.catalog_path) or ".", exist_ok=True)
+            tmp_path = f"{self.catalog_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.catalog_path)
+        except OSError:
+            # Il catalogo è solo un'ottimizzazione: al prossimo avvio si reindicizza
+            pass
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.files_dir, name)
+
+    def refresh(self, force: bool = False):
+        """
+        Aggiorna il catalogo con i file aggiunti, modificati o rimossi.
+
+        Costa un solo stat della cartella se non è cambiata dall'ultimo controllo.
+        """
+        try:
+            dir_mtime_ns = os.stat(self.files_dir).st_mtime_ns
+        except OSError:
+            return
+        now = time.monotonic()
+        if (not force and dir_mtime_ns == self._dir_mtime_ns
+                and now - self._last_scan < self.rescan_interval):
+            return
+
+        found: Dict[str, os.stat_result] = {}
+        try:
+            with os.scandir(self.files_dir) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(DECK_EXTENSIONS) and entry.is_file():
+                        found[entry.name] = entry.stat()
+        except OSError:
+            return
+
+        changed = False
+        to_index = []
+        with self._lock:
+            self._dir_mtime_ns = dir_mtime_ns
+            self._last_scan = now
+            for name in [name for name in self._entries if name not in found]:
+                del self._entries[name]
+                changed = True
+            for name, stat in found.items():
+                info = self._entries.get(name)
+                if info is None or info.mtime_ns != stat.st_mtime_ns or info.size != stat.st_size:
+                    info = DeckInfo(name, stat.st_mtime_ns, stat.st_size)
+                    self._entries[name] = info
+                    changed = True
+                if not info.indexed and name not in self._queued:
+                    self._queued.add(name)
+                    to_index.append(info)
+
+        for info in to_index:
+            self._executor.submit(self._index, info)
+        if changed:
+            self._save()
+
+    def _index(self, info: DeckInfo):
+        """Compila il mazzo (scaldando la cache) e ne registra i metadati."""
+        try:
+            deck = deck_cache.load_deck_from_path(self._path(info.name))
+            deck.wait_until_loaded()
+            indexed = info._replace(content_hash=deck.content_hash, word_count=len(deck),
+                                    source_lang=deck.source_lang, languages=deck.languages,
+                                    error=deck.load_error)
+        except (DeckFormatError, OSError) as e:
+            indexed = info._replace(error=str(e))
+        except Exception as e:
+            logger.warning("Indicizzazione di %s fallita: %s", info.name, e)
+            indexed = info._replace(error=str(e))
+
+        with self._lock:
+            self._queued.discard(info.name)
+            current = self._entries.get(info.name)
+            # Il file potrebbe essere cambiato durante l'indicizzazione
+            if current is None or (current.mtime_ns, current.size) != (info.mtime_ns, info.size):
+                return
+            self._entries[info.name] = indexed
+        self._save()
+
+    def names(self) -> List[str]:
+        """Nomi dei mazzi in ordine alfabetico."""
+        with self._lock:
+            return sorted(self._entries)
+
+    def get(self, name: str) -> Optional[DeckInfo]:
+        with self._lock:
+            return self._entries.get(name)
+
+    def describe(self, name: str) -> str:
+        """Etichetta del mazzo con i suoi metadati, per il selettore."""
+        info = self.get(name)
+        if info is None:
+            return name
+        if info.error is not None and info.content_hash is None:
+            return f"{name} — ⚠️ formato non valido"
+        if not info.indexed:
+            return f"{name} — indicizzazione…"
+        langs = info.source_lang or "?"
+        if info.languages:
+            langs += " → " + ", ".join(info.languages)
+        words = "parola" if info.word_count == 1 else "parole"
+        return f"{name} — {info.word_count} {words} · {langs}"
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            'decks': len(entries),
+            'indexed': sum(1 for info in entries if info.indexed),
+            'words': sum(info.word_count or 0 for info in entries)
+        }
+
+
+_shared_catalog: Optional[DeckCatalog] = None
+_shared_lock = threading.Lock()
+
+
+def get_deck_catalog(files_dir: str = "Files") -> DeckCatalog:
+    """Restituisce il catalogo condiviso dal processo, creandolo al primo uso."""
+    global _shared_catalog
+    if _shared_catalog is None or _shared_catalog.files_dir != files_dir:
+        with _shared_lock:
+            if _shared_catalog is None or _shared_catalog.files_dir != files_dir:
+                _shared_catalog = DeckCatalog(files_dir)
+    return _shared_catalog
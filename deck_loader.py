@@ -0,0 +1,230 @@
+"""
+Lettura in streaming dei mazzi.
+I file vengono letti una riga alla volta (openpyxl in sola lettura per .xlsx,
+csv della libreria standard, pyarrow a blocchi per Parquet) e le parole finiscono
+in una tabella compatta basata su array, così anche un mazzo da un milione di
+righe si apre con memoria limitata e senza passare da un DataFrame.
+"""
+
+import csv
+import io
+import os
+import sys
+from array import array
+from typing import IO, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Estensioni riconosciute nella cartella Files e nel caricamento manuale
+DECK_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.tsv', '.parquet')
+# Righe lette per blocco dai file Parquet
+PARQUET_BATCH_ROWS = 8192
+
+Source = Union[str, bytes]
+
+
+class DeckFormatError(ValueError):
+    """Il file non rispetta il formato atteso per un mazzo."""
+
+
+class WordTable(Sequence):
+    """
+    Sequenza di stringhe compatta: testo UTF-8 in un unico buffer più gli offset.
+
+    Costa pochi byte per parola (offset a 32 bit, fino a 4 GB di testo)
+    invece di un oggetto str ciascuna. Le righe si aggiungono solo in coda,
+    quindi un thread può riempire la tabella mentre altri la leggono: la
+    lunghezza cresce solo a riga completa.
+    """
+
+    __slots__ = ("_data", "_offsets")
+
+    def __init__(self, values=()):
+        self._data = bytearray()
+        self._offsets = array('I', [0])
+        for value in values:
+            self.append(value)
+
+    @classmethod
+    def from_state(cls, state: Tuple[bytes, bytes]) -> "WordTable":
+        """Ricostruisce la tabella dai buffer salvati con to_state()."""
+        table = cls()
+        data, offsets = state
+        table._data = bytearray(data)
+        table._offsets = array('I')
+        table._offsets.frombytes(offsets)
+        return table
+
+    def to_state(self) -> Tuple[bytes, bytes]:
+        return bytes(self._data), self._offsets.tobytes()
+
+    def append(self, value: str):
+        self._data += value.encode('utf-8')
+        # L'offset si aggiunge dopo il testo: i lettori vedono solo righe complete
+        self._offsets.append(len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indice fuori dal mazzo")
+        return self._data[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def nbytes(self) -> int:
+        """Byte occupati dai buffer."""
+        return sys.getsizeof(self._data) + sys.getsizeof(self._offsets)
+
+
+def deck_format(name: str) -> str:
+    """Formato del mazzo dedotto dall'estensione del file."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in DECK_EXTENSIONS:
+        raise DeckFormatError(f"Formato non supportato: {extension or name}")
+    return extension.lstrip('.')
+
+
+def cell_text(value) -> str:
+    """Testo di una cella; vuoto per celle mancanti o NaN."""
+    if type(value) is str:
+        return value
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value != value:
+            return ""
+        if value.is_integer():
+            # Numeri interi letti come float (csv/xls): "3" e non "3.0"
+            return str(int(value))
+    return str(value)
+
+
+def _open_binary(source: Source) -> IO[bytes]:
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else open(source, 'rb')
+
+
+def _rows_xlsx(source: Source) -> Iterator[Sequence]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise DeckFormatError("Per i file .xlsx serve il pacchetto openpyxl")
+    stream = _open_binary(source)
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        stream.close()
+        raise DeckFormatError(f"File Excel non leggibile: {e}")
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+        stream.close()
+
+
+def _rows_xls(source: Source) -> Iterator[Sequence]:
+    # Il vecchio formato binario non si legge in streaming: passa da pandas (xlrd)
+    import pandas as pd
+    try:
+        df = pd.read_excel(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source,
+                           header=None)
+    except Exception as e:
+        raise DeckFormatError(f"File Excel non leggibile: {e}")
+    for row in df.itertuples(index=False, name=None):
+        yield row
+
+
+def _rows_csv(source: Source, delimiter: Optional[str] = None) -> Iterator[Sequence]:
+    stream = _open_binary(source)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if delimiter is None:
+            sample = text.read(4096)
+            text.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+            except csv.Error:
+                delimiter = ','
+        yield from csv.reader(text, delimiter=delimiter)
+    except UnicodeDecodeError:
+        raise DeckFormatError("Il file CSV deve essere in UTF-8")
+    finally:
+        text.close()
+
+
+def _rows_parquet(source: Source) -> Iterator[Sequence]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise DeckFormatError("Per i file Parquet serve il pacchetto pyarrow")
+    stream = _open_binary(source)
+    try:
+        parquet = pq.ParquetFile(stream)
+        # I nomi delle colonne fanno da prima riga (le lingue)
+        yield parquet.schema_arrow.names
+        for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_ROWS):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+    finally:
+        stream.close()
+
+
+def iter_rows(source: Source, fmt: str) -> Iterator[Sequence]:
+    """
+    Righe del file una alla volta, prima riga compresa.
+
+    Args:
+        source: Percorso del file o suo contenuto
+        fmt: Formato restituito da deck_format()
+    """
+    if fmt == 'xlsx':
+        return _rows_xlsx(source)
+    if fmt == 'xls':
+        return _rows_xls(source)
+    if fmt == 'csv':
+        return _rows_csv(source)
+    if fmt == 'tsv':
+        return _rows_csv(source, delimiter='\t')
+    if fmt == 'parquet':
+        return _rows_parquet(source)
+    raise DeckFormatError(f"Formato non supportato: {fmt}")
+
+
+def parse_header(header: Sequence) -> Tuple[str, List[str]]:
+    """
+    Lingua sorgente e lingua di ogni colonna di risposta.
+
+    La prima riga contiene una lingua per colonna ("english", "italian", ...);
+    in alternativa la prima cella può indicare la coppia ("english-italian"),
+    e allora tutte le altre colonne sono traduzioni nella seconda lingua.
+    Più colonne nella stessa lingua sono traduzioni alternative.
+    """
+    labels = [cell_text(cell).strip().lower() for cell in header]
+    # Celle vuote in coda (comuni nei fogli Excel) non sono colonne
+    while labels and not labels[-1]:
+        labels.pop()
+    if not labels or not labels[0]:
+        raise DeckFormatError("La prima riga deve indicare la lingua delle parole")
+
+    source = labels[0]
+    pair = None
+    for separator in ("->", "-", ">", "/"):
+        if separator in source:
+            left, right = (part.strip() for part in source.split(separator, 1))
+            if left and right:
+                source, pair = left, right
+                break
+
+    answer_langs = []
+    for column, label in enumerate(labels[1:], start=2):
+        if pair is not None:
+            answer_langs.append(pair)
+        elif label:
+            answer_langs.append(label)
+        else:
+            raise DeckFormatError(f"Manca la lingua nella prima riga della colonna {column}")
+    return source, answer_langs
@@ -0,0 +1,257 @@
+"""
+Registro dei mazzi condiviso da tutte le sessioni Streamlit del processo.
+Ogni mazzo compilato e le sue traduzioni esistono in una sola copia immutabile;
+le sessioni tengono solo un riferimento leggero (DeckHandle). La memoria
+occupata viene stimata (comprese le strutture derivate dal mazzo, come
+l'indice delle risposte) e, oltre il budget, i mazzi non usati da nessuna
+sessione vengono rimossi in ordine LRU.
+"""
+
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+
+
+class TranslationTable(dict):
+    """
+    Tabella parola_normalizzata -> traduzione che tiene il conto dei propri byte.
+
+    La dimensione viene aggiornata a ogni inserimento, così la stima della
+    memoria del registro non deve scorrere le tabelle. Va scritta solo con
+    table[parola] = traduzione (l'unico uso dei job di pre-traduzione).
+    """
+
+    __slots__ = ("nbytes", "_lock")
+
+    def __init__(self):
+        super().__init__()
+        self.nbytes = 0
+        # Le tabelle vengono riempite da più thread di pre-traduzione
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key: str, value: str):
+        with self._lock:
+            previous = self.get(key)
+            if previous is None:
+                self.nbytes += sys.getsizeof(key) + sys.getsizeof(value)
+            else:
+                self.nbytes += sys.getsizeof(value) - sys.getsizeof(previous)
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            value = self[key]
+            super().__delitem__(key)
+            self.nbytes -= sys.getsizeof(key) + sys.getsizeof(value)
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self) + self.nbytes
+
+
+def _index_bytes(value) -> int:
+    """Byte di una struttura derivata: quelli che dichiara (memory_bytes) o una stima minima."""
+    memory_bytes = getattr(value, "memory_bytes", None)
+    return memory_bytes() if memory_bytes is not None else sys.getsizeof(value)
+
+
+class DeckEntry:
+    """Mazzo registrato con le sue traduzioni e il numero di sessioni che lo usano."""
+
+    __slots__ = ("deck", "translations", "indexes", "pins", "last_used")
+
+    def __init__(self, deck):
+        self.deck = deck
+        # (lingua_sorgente, lingua_destinazione) -> {parola_normalizzata: traduzione}
+        self.translations: Dict[Tuple[str, str], TranslationTable] = {}
+        # Strutture derivate dal mazzo (es. indice delle risposte), per chiave
+        self.indexes: Dict[object, object] = {}
+        self.pins = 0
+        self.last_used = time.time()
+
+    def memory_bytes(self) -> int:
+        """Byte stimati: mazzo, traduzioni e strutture derivate (possono crescere in background)."""
+        return (self.deck.memory_bytes()
+                + sum(table.memory_bytes() for table in list(self.translations.values()))
+                + sum(_index_bytes(value) for value in list(self.indexes.values())))
+
+
+class DeckHandle:
+    """
+    Riferimento di una sessione a un mazzo del registro.
+
+    Finché l'handle è vivo (di solito in st.session_state) il mazzo non può
+    essere rimosso; quando la sessione termina l'handle viene raccolto e il
+    mazzo torna candidabile all'eliminazione.
+    """
+
+    __slots__ = ("deck", "_registry", "__weakref__")
+
+    def __init__(self, registry: "DeckRegistry", deck):
+        self.deck = deck
+        self._registry = registry
+        weakref.finalize(self, registry._release, deck.content_hash)
+
+    @property
+    def content_hash(self) -> str:
+        return self.deck.content_hash
+
+    @property
+    def source_lang(self) -> str:
+        return self.deck.source_lang
+
+    @property
+    def words(self) -> Tuple:
+        return self.deck.words
+
+    def translations(self, src: str, dest: str) -> Dict[str, str]:
+        """Tabella condivisa delle traduzioni del mazzo per una coppia di lingue."""
+        return self._registry.translations(self.deck.content_hash, src, dest)
+
+    def index(self, key, factory: Callable[[], object]):
+        """Struttura derivata condivisa del mazzo (vedi DeckRegistry.index)."""
+        return self._registry.index(self.deck.content_hash, key, factory)
+
+
+class DeckRegistry:
+    def __init__(self, memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES):
+        """
+        Inizializza il registro.
+
+        Args:
+            memory_budget_bytes: Byte oltre i quali i mazzi non usati vengono rimossi
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries: "OrderedDict[str, DeckEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._evict_listeners: List[Callable[[str], None]] = []
+        self._evictions = 0
+
+    def get(self, content_hash: str):
+        """Restituisce il mazzo registrato, se presente."""
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                return None
+            self._touch(content_hash, entry)
+            return entry.deck
+
+    def add(self, deck):
+        """Registra un mazzo; se ne esiste già uno con lo stesso hash restituisce quello."""
+        with self._lock:
+            entry = self._entries.get(deck.content_hash)
+            if entry is None:
+                entry = DeckEntry(deck)
+                self._entries[deck.content_hash] = entry
+                self._maybe_evict()
+            self._touch(deck.content_hash, entry)
+            return entry.deck
+
+    def acquire(self, deck) -> DeckHandle:
+        """Registra il mazzo e lo blocca per una sessione finché l'handle resta vivo."""
+        with self._lock:
+            deck = self.add(deck)
+            self._entries[deck.content_hash].pins += 1
+            # Le traduzioni crescono in background: il budget si ricontrolla a ogni nuova sessione
+            self._maybe_evict()
+        return DeckHandle(self, deck)
+
+    def _release(self, content_hash: str):
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+                entry.last_used = time.time()
+
+    def _touch(self, content_hash: str, entry: DeckEntry):
+        """Segna il mazzo come usato di recente (da chiamare con il lock acquisito)."""
+        entry.last_used = time.time()
+        self._entries.move_to_end(content_hash)
+
+    def translations(self, content_hash: str, src: str, dest: str) -> Dict[str, str]:
+        """Tabella delle traduzioni del mazzo (vuota se il mazzo non è registrato)."""
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                return TranslationTable()
+            table = entry.translations.get((src, dest))
+            if table is None:
+                table = entry.translations[(src, dest)] = TranslationTable()
+            return table
+
+    def index(self, content_hash: str, key, factory: Callable[[], object]):
+        """
+        Struttura derivata dal mazzo, creata con factory al primo uso e condivisa.
+
+        Se il mazzo non è registrato la struttura viene creata ma non conservata.
+        La struttura conta nel budget di memoria: se espone memory_bytes() viene
+        usato quello, altrimenti solo la dimensione dell'oggetto.
+        """
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None:
+                return factory()
+            value = entry.indexes.get(key)
+            if value is None:
+                value = entry.indexes[key] = factory()
+                self._maybe_evict()
+            return value
+
+    def add_evict_listener(self, callback: Callable[[str], None]):
+        """Registra una funzione chiamata con l'hash di ogni mazzo rimosso."""
+        self._evict_listeners.append(callback)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            entries = list(self._entries.values())
+        return sum(entry.memory_bytes() for entry in entries)
+
+    def _maybe_evict(self):
+        """Rimuove i mazzi non bloccati meno usati finché si rientra nel budget."""
+        used = self.memory_bytes()
+        if used <= self.memory_budget_bytes:
+            return
+        for content_hash, entry in list(self._entries.items()):
+            if used <= self.memory_budget_bytes:
+                break
+            if entry.pins > 0:
+                continue
+            used -= entry.memory_bytes()
+            del self._entries[content_hash]
+            self._evictions += 1
+            for callback in self._evict_listeners:
+                try:
+                    callback(content_hash)
+                except Exception:
+                    pass
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = list(self._entries.values())
+            evictions = self._evictions
+        return {
+            'decks': len(entries),
+            'pinned_decks': sum(1 for entry in entries if entry.pins > 0),
+            'sessions': sum(entry.pins for entry in entries),
+            'memory_bytes': sum(entry.memory_bytes() for entry in entries),
+            'memory_budget_bytes': self.memory_budget_bytes,
+            'evictions': evictions
+        }
+
+
+_shared_registry: Optional[DeckRegistry] = None
+_shared_lock = threading.Lock()
+
+
+def get_deck_registry() -> DeckRegistry:
+    """Restituisce il registro dei mazzi condiviso dal processo."""
+    global _shared_registry
+    if _shared_registry is None:
+        with _shared_lock:
+            if _shared_registry is None:
+                _shared_registry = DeckRegistry()
+    return _shared_registry
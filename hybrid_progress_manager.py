@@ -3,9 +3,17 @@ Manager ibrido che supporta sia storage locale che cloud.
 Si adatta automaticamente all'ambiente di esecuzione.
 """
 
+import logging
 import os
-import streamlit as st
-from typing import Dict, Tuple
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import perf_metrics
+import runtime
+from async_backend import InlineBackendAdapter, ThreadedBackendAdapter, get_background_loop
+from progress_stats import (BULK_BATCH_SIZE, DifficultWordsIndex, ProgressRecord, ProgressTotals,
+                            batched, normalize_records, verify_totals)
 
 # Import condizionali
 try:
@@ -15,52 +23,115 @@ except ImportError:
     DATABASE_AVAILABLE = False
 
 try:
-    from progress_manager import ProgressManager as LocalProgressManager
+    from progress_manager import get_progress_manager
     LOCAL_AVAILABLE = True
 except ImportError:
     LOCAL_AVAILABLE = False
 
+try:
+    from sqlite_progress_manager import DEFAULT_USER_ID, SQLiteProgressManager
+    SQLITE_AVAILABLE = True
+except ImportError:
+    SQLITE_AVAILABLE = False
+
+# Valori ammessi per PROGRESS_BACKEND (variabile d'ambiente o secret)
+BACKEND_CHOICES = ("auto", "supabase", "sqlite", "json", "session")
+
+# Attesa massima di una lettura prima di usare l'ultimo valore noto
+READ_TIMEOUT_SECONDS = 0.25
+# Attesa massima per operazioni esplicite dell'utente (reset, cambio mazzo)
+BLOCKING_TIMEOUT_SECONDS = 10.0
+
+logger = logging.getLogger(__name__)
+
 class HybridProgressManager:
     """
     Manager che sceglie automaticamente tra storage locale e cloud.
     
-    Priorità:
+    Priorità (PROGRESS_BACKEND = "auto"):
     1. Se in cloud con Supabase configurato → Database cloud
-    2. Se locale → File JSON locali  
-    3. Fallback → Session State
+    2. Se locale → Database SQLite locale
+    3. Se SQLite non disponibile → File JSON locali
+    4. Fallback → Session State
+    
+    Con PROGRESS_BACKEND = "supabase", "sqlite", "json" o "session" si forza un backend
+    (con fallback a Session State se non è utilizzabile).
+    
+    Le operazioni dei backend con I/O girano sull'event loop di background:
+    record_answer ritorna subito e le letture, se il backend è lento, usano
+    l'ultimo valore noto.
     """
     
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, user_id: Optional[str] = None):
+        """
+        Args:
+            file_name: Nome del file del mazzo (chiave del progresso)
+            user_id: Utente del progresso per i backend multiutente (Supabase, SQLite);
+                se None si usa quello della sessione (Supabase) o l'utente locale (SQLite)
+        """
         self.file_name = file_name
+        self.user_id = user_id
         self.backend = None
         self.backend_type = "unknown"
         
         # Inizializza il backend appropriato
         self._init_backend()
+        if isinstance(self.backend, SessionStateManager):
+            self._async = InlineBackendAdapter(self.backend)
+        else:
+            self._async = ThreadedBackendAdapter(self.backend)
+        
+        # Ultimi valori noti, aggiornati dalle letture completate e dalle risposte
+        self._lock = threading.Lock()
+        self._write_seq = 0
+        self._last_word_stats: Dict[str, Tuple[int, int]] = {}
+        self._last_totals: Optional[ProgressTotals] = None
+        self._last_difficult: Dict[Tuple[int, Optional[int]], list] = {}
+    
+    def _get_configured_backend(self) -> str:
+        """Legge PROGRESS_BACKEND da variabili d'ambiente o secrets."""
+        choice = os.getenv("PROGRESS_BACKEND") or runtime.get_secret("PROGRESS_BACKEND")
+        choice = (choice or "auto").strip().lower()
+        if choice not in BACKEND_CHOICES:
+            runtime.warning(f"PROGRESS_BACKEND non valido: {choice}, uso 'auto'")
+            choice = "auto"
+        return choice
     
     def _init_backend(self):
         """Seleziona e inizializza il backend di storage appropriato."""
+        choice = self._get_configured_backend()
+        is_cloud = self._is_cloud_deployment() if choice == "auto" else False
         
         # 1. Prova Database Cloud (per deployment)
-        if DATABASE_AVAILABLE and self._is_cloud_deployment():
+        if DATABASE_AVAILABLE and (choice == "supabase" or (choice == "auto" and is_cloud)):
             try:
-                self.backend = DatabaseManager(self.file_name)
+                self.backend = DatabaseManager(self.file_name, user_id=self.user_id)
                 if self.backend.is_cloud_enabled:
                     self.backend_type = "cloud_database"
                     return
             except Exception as e:
-                st.warning(f"Fallback da database cloud: {e}")
+                runtime.warning(f"Fallback da database cloud: {e}")
         
-        # 2. Prova Storage Locale (per sviluppo)
-        if LOCAL_AVAILABLE and not self._is_cloud_deployment():
+        # 2. Prova SQLite locale (default per deployment locali/self-hosted)
+        if SQLITE_AVAILABLE and (choice == "sqlite" or (choice == "auto" and not is_cloud)):
             try:
-                self.backend = LocalProgressManager(self.file_name)
+                self.backend = SQLiteProgressManager(self.file_name, user_id=self.user_id or DEFAULT_USER_ID)
+                self.backend_type = "local_sqlite"
+                return
+            except Exception as e:
+                runtime.warning(f"Fallback da database SQLite: {e}")
+        
+        # 3. Prova Storage Locale a file JSON
+        if LOCAL_AVAILABLE and (choice == "json" or (choice == "auto" and not is_cloud)):
+            try:
+                # Condiviso con le altre sessioni dello stesso mazzo
+                self.backend = get_progress_manager(self.file_name)
                 self.backend_type = "local_files"
                 return
             except Exception as e:
-                st.warning(f"Fallback da storage locale: {e}")
+                runtime.warning(f"Fallback da storage locale: {e}")
         
-        # 3. Fallback a Session State
+        # 4. Fallback a Session State
         self.backend = SessionStateManager(self.file_name)
         self.backend_type = "session_state"
     
@@ -70,7 +141,7 @@ class HybridProgressManager:
         try:
             cloud_indicators = [
                 os.getenv("STREAMLIT_SHARING"),  # Streamlit Sharing
-                hasattr(st, 'secrets') and "SUPABASE_URL" in st.secrets,
+                runtime.has_secret("SUPABASE_URL"),
                 "streamlit.app" in os.getenv("HOSTNAME", ""),
                 os.getenv("STREAMLIT_SERVER_HEADLESS") == "true"
             ]
@@ -79,25 +150,181 @@ class HybridProgressManager:
             # Se c'è un errore nell'accesso ai secrets, assumiamo sia locale
             return False
     
+    @property
+    def async_backend(self):
+        """
+        Interfaccia asincrona del backend (vedi AsyncProgressBackend), per chi ha
+        già un event loop (server API): le operazioni si attendono con await.
+        """
+        return self._async
+    
+    def _submit(self, method: str, *args) -> Future:
+        """Pianifica un'operazione del backend sull'event loop di background."""
+        return get_background_loop().submit(getattr(self._async, method)(*args))
+    
+    def _call(self, method: str, *args, timeout: float, fallback: Callable[[], Any],
+              on_result: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Esegue un'operazione attendendo al massimo timeout secondi.
+        
+        Se il backend non risponde in tempo restituisce fallback(); il risultato
+        arrivato in ritardo aggiorna comunque gli ultimi valori noti, a meno che
+        nel frattempo siano state registrate altre risposte.
+        """
+        perf_metrics.count("backend_calls")
+        if self._async.runs_inline:
+            result = self._async.call_sync(method, *args)
+            if on_result is not None:
+                on_result(result)
+            return result
+        
+        seq = self._write_seq
+        future = self._submit(method, *args)
+        
+        def _done(completed: Future):
+            if completed.cancelled() or completed.exception() is not None:
+                return
+            if on_result is not None:
+                with self._lock:
+                    if seq == self._write_seq:
+                        on_result(completed.result())
+        future.add_done_callback(_done)
+        
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            perf_metrics.count("backend_read_fallbacks")
+            logger.info("%s in ritardo, uso l'ultimo valore noto", method)
+        except Exception as e:
+            logger.warning("%s fallita: %s", method, e)
+        return fallback()
+    
+    def _fire(self, method: str, *args):
+        """Esegue un'operazione senza attenderla (gli errori vengono solo registrati)."""
+        perf_metrics.count("backend_calls")
+        if self._async.runs_inline:
+            self._async.call_sync(method, *args)
+            return
+        
+        def _log_error(completed: Future):
+            if not completed.cancelled() and completed.exception() is not None:
+                logger.warning("%s fallita: %s", method, completed.exception())
+        self._submit(method, *args).add_done_callback(_log_error)
+    
+    def _remember_word_stats(self, word: str, stats: Tuple[int, int]):
+        self._last_word_stats[word.lower().strip()] = tuple(stats)
+    
+    def _remember_totals(self, stats: Dict[str, int]):
+        self._last_totals = ProgressTotals(stats['total_words_practiced'], stats['total_correct'],
+                                           stats['total_wrong'])
+    
     def get_word_stats(self, word: str) -> Tuple[int, int]:
-        """Delega al backend attivo."""
-        return self.backend.get_word_stats(word)
+        """Statistiche della parola dal backend, o l'ultimo valore noto se è lento."""
+        return self._call('get_word_stats', word, timeout=READ_TIMEOUT_SECONDS,
+                          fallback=lambda: self._last_word_stats.get(word.lower().strip(), (0, 0)),
+                          on_result=lambda stats: self._remember_word_stats(word, stats))
     
     def record_answer(self, word: str, is_correct: bool):
-        """Delega al backend attivo."""
-        return self.backend.record_answer(word, is_correct)
+        """Registra la risposta senza attendere il backend."""
+        word_lower = word.lower().strip()
+        with self._lock:
+            self._write_seq += 1
+            # Aggiornamento ottimistico degli ultimi valori noti
+            known = self._last_word_stats.get(word_lower)
+            if known is not None:
+                correct, wrong = known
+                self._last_word_stats[word_lower] = (correct + int(is_correct), wrong + int(not is_correct))
+            if known is None:
+                # Non si sa se la parola è nuova: i totali si rileggono dal backend
+                self._last_totals = None
+            elif self._last_totals is not None:
+                self._last_totals.record(known == (0, 0), is_correct)
+            self._last_difficult.clear()
+        self._fire('record_answer', word, is_correct)
     
     def get_total_stats(self) -> Dict[str, int]:
-        """Delega al backend attivo."""
-        return self.backend.get_total_stats()
+        """Statistiche totali dal backend, o l'ultimo valore noto se è lento."""
+        return self._call('get_total_stats', timeout=READ_TIMEOUT_SECONDS,
+                          fallback=lambda: (self._last_totals or ProgressTotals()).as_stats(),
+                          on_result=self._remember_totals)
+    
+    def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list:
+        """Parole difficili dal backend, o l'ultima classifica nota se è lento."""
+        key = (min_attempts, limit)
+        return self._call('get_difficult_words', min_attempts, limit, timeout=READ_TIMEOUT_SECONDS,
+                          fallback=lambda: self._last_difficult.get(key, []),
+                          on_result=lambda words: self._last_difficult.__setitem__(key, words))
+    
+    def get_schedules(self) -> Dict[str, Tuple[int, float]]:
+        """Stato di ripasso salvato dal backend attivo (vuoto se non supportato)."""
+        return self._call('get_schedules', timeout=BLOCKING_TIMEOUT_SECONDS, fallback=dict)
+    
+    def save_schedule(self, word: str, box: int, due: float):
+        """Salva lo stato di ripasso senza attendere il backend."""
+        self._fire('save_schedule', word, box, due)
     
-    def get_difficult_words(self, min_attempts: int = 3) -> list:
-        """Delega al backend attivo."""
-        return self.backend.get_difficult_words(min_attempts)
+    def verify_totals(self) -> bool:
+        """Controllo di coerenza dei totali incrementali del backend attivo."""
+        return self._call('verify_totals', timeout=BLOCKING_TIMEOUT_SECONDS, fallback=lambda: True)
     
     def reset_all_progress(self):
-        """Delega al backend attivo."""
-        return self.backend.reset_all_progress()
+        """Reset del progresso: attende il backend, poi azzera gli ultimi valori noti."""
+        with self._lock:
+            self._write_seq += 1
+            self._last_word_stats.clear()
+            self._last_totals = ProgressTotals()
+            self._last_difficult.clear()
+        self._call('reset_all_progress', timeout=BLOCKING_TIMEOUT_SECONDS, fallback=lambda: None)
+    
+    def iter_progress(self, batch_size: int = BULK_BATCH_SIZE,
+                      after: Optional[str] = None) -> Iterator[List[ProgressRecord]]:
+        """
+        Esporta il progresso del backend attivo a blocchi di al massimo batch_size parole,
+        in ordine di parola (a partire da quella successiva ad after, se indicata).
+        
+        Le risposte in attesa vengono scritte prima; i blocchi si leggono nel
+        thread chiamante (operazione esplicita, es. riga di comando o migrazione).
+        """
+        self.flush(wait=True)
+        yield from self.backend.iter_progress(batch_size, after)
+    
+    def upsert_progress(self, records: Iterable[ProgressRecord]):
+        """
+        Importa un blocco di progresso e azzera gli ultimi valori noti.
+        
+        A differenza delle altre operazioni attende il backend senza timeout e
+        ne propaga gli errori: un'importazione non deve fallire in silenzio.
+        """
+        records = list(records)
+        with self._lock:
+            self._write_seq += 1
+            self._last_word_stats.clear()
+            self._last_totals = None
+            self._last_difficult.clear()
+        perf_metrics.count("backend_calls")
+        if self._async.runs_inline:
+            self._async.call_sync('upsert_progress', records)
+        else:
+            self._submit('upsert_progress', records).result()
+    
+    def flush(self, wait: bool = True):
+        """
+        Scrive le risposte in attesa, se il backend le accumula.
+        
+        Args:
+            wait: Se False il flush viene solo avviato in background
+        """
+        if wait:
+            self._call('flush', timeout=BLOCKING_TIMEOUT_SECONDS, fallback=lambda: None)
+        else:
+            self._fire('flush')
+    
+    def close(self):
+        """Scrive le risposte in attesa e rilascia il thread e le risorse del backend."""
+        self.flush(wait=True)
+        self._async.close()
+        if hasattr(self.backend, 'close'):
+            self.backend.close()
     
     def get_backend_info(self) -> Dict[str, str]:
         """Restituisce informazioni sul backend attivo."""
@@ -113,18 +340,27 @@ class HybridProgressManager:
         return base_info
 
 class SessionStateManager:
-    """Fallback manager che usa solo Streamlit Session State."""
+    """Fallback manager che usa solo lo stato di sessione (Streamlit Session State o, fuori da Streamlit, in memoria)."""
     
     def __init__(self, file_name: str):
         self.file_name = file_name
+        self._state = runtime.session_state()
         self.storage_key = f"progress_{file_name}"
+        self.totals_key = f"{self.storage_key}_totals"
+        self.difficult_key = f"{self.storage_key}_difficult"
         
-        if self.storage_key not in st.session_state:
-            st.session_state[self.storage_key] = {}
+        if self.storage_key not in self._state:
+            self._state[self.storage_key] = {}
+        if self.totals_key not in self._state:
+            self._state[self.totals_key] = ProgressTotals.from_progress(self._state[self.storage_key])
+        if self.difficult_key not in self._state:
+            self._state[self.difficult_key] = DifficultWordsIndex.from_progress(
+                self._state[self.storage_key]
+            )
     
     def get_word_stats(self, word: str) -> Tuple[int, int]:
         word_lower = word.lower().strip()
-        progress = st.session_state[self.storage_key]
+        progress = self._state[self.storage_key]
         
         if word_lower in progress:
             stats = progress[word_lower]
@@ -133,57 +369,61 @@ class SessionStateManager:
     
     def record_answer(self, word: str, is_correct: bool):
         word_lower = word.lower().strip()
-        progress = st.session_state[self.storage_key]
+        progress = self._state[self.storage_key]
         
-        if word_lower not in progress:
+        is_new_word = word_lower not in progress
+        if is_new_word:
             progress[word_lower] = {'correct': 0, 'wrong': 0}
         
         if is_correct:
             progress[word_lower]['correct'] += 1
         else:
             progress[word_lower]['wrong'] += 1
+        self._state[self.totals_key].record(is_new_word, is_correct)
+        stats = progress[word_lower]
+        self._state[self.difficult_key].update(word_lower, stats['correct'], stats['wrong'])
     
     def get_total_stats(self) -> Dict[str, int]:
-        progress = st.session_state[self.storage_key]
-        
-        total_correct = sum(stats.get('correct', 0) for stats in progress.values())
-        total_wrong = sum(stats.get('wrong', 0) for stats in progress.values())
-        total_words = len(progress)
-        total_attempts = total_correct + total_wrong
-        
-        accuracy = (total_correct / total_attempts * 100) if total_attempts > 0 else 0
-        
-        return {
-            'total_words_practiced': total_words,
-            'total_correct': total_correct,
-            'total_wrong': total_wrong,
-            'total_attempts': total_attempts,
-            'accuracy_percentage': round(accuracy, 1)
-        }
+        return self._state[self.totals_key].as_stats()
+    
+    def verify_totals(self) -> bool:
+        return verify_totals(self._state[self.totals_key], self._state[self.storage_key])
+    
+    def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list:
+        return self._state[self.difficult_key].top(min_attempts, limit)
+    
+    def get_schedules(self) -> Dict[str, Tuple[int, float]]:
+        progress = self._state[self.storage_key]
+        return {word: (stats['box'], stats['due']) for word, stats in progress.items() if 'box' in stats}
+    
+    def save_schedule(self, word: str, box: int, due: float):
+        stats = self._state[self.storage_key].get(word.lower().strip())
+        if stats is not None:
+            stats['box'] = box
+            stats['due'] = due
+    
+    def iter_progress(self, batch_size: int = BULK_BATCH_SIZE,
+                      after: Optional[str] = None) -> Iterator[List[ProgressRecord]]:
+        progress = self._state[self.storage_key]
+        words = sorted(word for word in progress if after is None or word > after)
+        for chunk in batched(words, batch_size):
+            yield [ProgressRecord.from_stats(word, progress[word]) for word in chunk]
     
-    def get_difficult_words(self, min_attempts: int = 3) -> list:
-        progress = st.session_state[self.storage_key]
-        difficult_words = []
-        
-        for word, stats in progress.items():
-            correct = stats.get('correct', 0)
-            wrong = stats.get('wrong', 0)
-            total = correct + wrong
-            
-            if total >= min_attempts and wrong > correct:
-                error_rate = wrong / total
-                difficult_words.append({
-                    'word': word,
-                    'correct': correct,
-                    'wrong': wrong,
-                    'error_rate': error_rate
-                })
-        
-        difficult_words.sort(key=lambda x: x['error_rate'], reverse=True)
-        return difficult_words
+    def upsert_progress(self, records: Iterable[ProgressRecord]):
+        progress = self._state[self.storage_key]
+        totals = self._state[self.totals_key]
+        difficult = self._state[self.difficult_key]
+        for word, record in normalize_records(records).items():
+            old = progress.get(word)
+            totals.update(None if old is None else (old.get('correct', 0), old.get('wrong', 0)),
+                          (record.correct, record.wrong))
+            progress[word] = record.as_stats()
+            difficult.update(word, record.correct, record.wrong)
     
     def reset_all_progress(self):
-        st.session_state[self.storage_key] = {}
+        self._state[self.storage_key] = {}
+        self._state[self.totals_key] = ProgressTotals()
+        self._state[self.difficult_key] = DifficultWordsIndex()
     
     def get_status_info(self) -> Dict[str, str]:
         return {
@@ -1,2 +1,353 @@
-# Entry point dell'applicazione Knowledge Base + Project Manager
+"""
+Entry point da riga di comando, senza Streamlit.
+Usa gli stessi mazzi compilati e gli stessi backend del progresso dell'app web,
+così esercitazioni nel terminale e operazioni in blocco (script, cron) partono
+in pochi millisecondi e condividono i dati con l'interfaccia.
 
+Uso:
+    python main.py drill Files/Words.xlsx --order ripasso --count 20
+    python main.py deck compile Files/*.xlsx
+    python main.py deck stats Files/Words.xlsx
+    python main.py progress export Words.xlsx -o progresso.csv
+    python main.py progress import Words.xlsx progresso.csv
+    python main.py progress migrate Words.xlsx --from json --to supabase --to-user <id>
+    python main.py difficult Words.xlsx --limit 10
+
+Il backend del progresso si sceglie come nell'app (PROGRESS_BACKEND) oppure
+con --backend; con Supabase --user-id indica l'utente a cui appartiene il progresso.
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from typing import Iterator, List, Optional
+
+import runtime
+from answer_matching import NEAR_MISS, AnswerIndex
+from deck_cache import CompiledDeck, DeckFormatError, load_deck_from_path
+from hybrid_progress_manager import BACKEND_CHOICES, HybridProgressManager
+from progress_migration import (BACKEND_KINDS, MigrationCheckpoint, MigrationError, default_checkpoint_path,
+                                 migrate_progress, open_backend)
+from progress_stats import BULK_BATCH_SIZE, ProgressRecord, batched
+from scheduler import LeitnerScheduler
+
+# Codici del traduttore per le lingue scritte nella prima riga dei mazzi (come in EnglishLearning.py)
+LANG_CODES = {"english": "en", "italian": "it"}
+ORDERS = ("ripasso", "casuale", "sequenziale")
+EXPORT_COLUMNS = ("word", "correct", "wrong", "box", "due")
+
+
+def open_progress(deck: str) -> HybridProgressManager:
+    """Gestore del progresso del mazzo: la chiave è il nome del file, come nell'app."""
+    return HybridProgressManager(os.path.basename(deck))
+
+
+def load_deck(path: str) -> CompiledDeck:
+    """Carica il mazzo e attende la lettura completa (nel terminale non c'è nulla da mostrare prima)."""
+    deck = load_deck_from_path(path)
+    deck.wait_until_loaded()
+    if deck.load_error:
+        print(f"⚠️ Lettura interrotta dopo {len(deck)} parole: {deck.load_error}", file=sys.stderr)
+    return deck
+
+
+def describe_deck(path: str, deck: CompiledDeck) -> str:
+    langs = deck.source_lang
+    if deck.languages:
+        langs += " → " + ", ".join(deck.languages)
+    return f"{os.path.basename(path)}: {len(deck)} parole · {langs}"
+
+
+# --- Esercitazione ---
+
+def translation_for(deck: CompiledDeck, index: int, answer_lang: str) -> Optional[str]:
+    """Traduzione inclusa nel mazzo o, in mancanza, dalla cache/traduttore online."""
+    translation = deck.bundled_translation(index, answer_lang)
+    if translation is not None:
+        return translation
+    from translation_cache import get_translation_cache
+    word = deck.words[index]
+    try:
+        return get_translation_cache().translate(word, LANG_CODES.get(deck.source_lang, deck.source_lang),
+                                                 LANG_CODES.get(answer_lang, answer_lang))
+    except Exception as e:
+        print(f"⚠️ Traduzione di '{word}' non disponibile: {e}", file=sys.stderr)
+        return None
+
+
+def next_index(order: str, deck: CompiledDeck, scheduler: LeitnerScheduler,
+               current: Optional[int]) -> int:
+    if order == "ripasso":
+        return scheduler.next_index(exclude=current)
+    if order == "casuale":
+        return random.randrange(len(deck))
+    return 0 if current is None else (current + 1) % len(deck)
+
+
+def cmd_drill(args) -> int:
+    deck = load_deck(args.deck)
+    answer_lang = args.answer_lang or (deck.languages[0] if deck.languages else "italian")
+    progress_manager = open_progress(args.deck)
+    scheduler = LeitnerScheduler(deck.words, progress_manager.get_schedules())
+    answer_index = AnswerIndex.for_deck(deck, answer_lang)
+
+    print(describe_deck(args.deck, deck))
+    print(f"Traduci in {answer_lang}. Invio senza risposta mostra la traduzione, Ctrl+D per uscire.\n")
+    asked = correct = 0
+    untranslated = 0
+    current = None
+    try:
+        while args.count is None or asked < args.count:
+            current = next_index(args.order, deck, scheduler, current)
+            word = deck.words[current]
+            translation = translation_for(deck, current, answer_lang)
+            if translation is None:
+                untranslated += 1
+                if untranslated >= len(deck):
+                    print("Nessuna traduzione disponibile per il mazzo", file=sys.stderr)
+                    break
+                continue
+            untranslated = 0
+            try:
+                answer = input(f"{word} → ").strip()
+            except EOFError:
+                print()
+                break
+            if not answer:
+                print(f"   💡 {translation}")
+                continue
+
+            bundled = deck.bundled_translation(current, answer_lang) is not None
+            match = answer_index.check(word, [translation], answer, bundled=bundled)
+            progress_manager.record_answer(word, match.is_correct)
+            box, due = scheduler.record(word, match.is_correct, index=current)
+            progress_manager.save_schedule(word, box, due)
+            asked += 1
+            correct += match.is_correct
+            if match.verdict == NEAR_MISS:
+                print(f"   ✏️ Quasi, ma non vale: si scrive \"{translation}\"")
+            elif match.is_correct:
+                print("   ✅ Corretto")
+            else:
+                print(f"   ❌ Risposta corretta: {translation}")
+    except KeyboardInterrupt:
+        print()
+    finally:
+        progress_manager.flush(wait=True)
+
+    stats = progress_manager.get_total_stats()
+    print(f"\nRisposte corrette: {correct}/{asked}. "
+          f"Totale mazzo: {stats['total_words_practiced']} parole praticate, "
+          f"precisione {stats['accuracy_percentage']}%")
+    return 0
+
+
+# --- Mazzi ---
+
+def cmd_deck_compile(args) -> int:
+    failed = 0
+    for path in args.paths:
+        started = time.perf_counter()
+        try:
+            deck = load_deck(path)
+        except (DeckFormatError, OSError) as e:
+            print(f"❌ {path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"{describe_deck(path, deck)} ({elapsed_ms:.0f} ms)")
+    return 1 if failed else 0
+
+
+def cmd_deck_stats(args) -> int:
+    try:
+        deck = load_deck(args.deck)
+    except (DeckFormatError, OSError) as e:
+        print(f"❌ {args.deck}: {e}", file=sys.stderr)
+        return 1
+    print(describe_deck(args.deck, deck))
+    print(f"  hash: {deck.content_hash[:16]}")
+    print(f"  memoria: {deck.memory_bytes() / 1024:.1f} KB")
+    for lang, column in deck.translations.items():
+        bundled = sum(1 for translation in column if translation)
+        print(f"  traduzioni in {lang}: {bundled}/{len(deck)}")
+
+    stats = open_progress(args.deck).get_total_stats()
+    print(f"  progresso: {stats['total_words_practiced']} parole praticate, "
+          f"{stats['total_correct']} corrette, {stats['total_wrong']} errate "
+          f"({stats['accuracy_percentage']}%)")
+    return 0
+
+
+# --- Progresso ---
+
+def _open_text(path: str, mode: str):
+    if path == "-":
+        return sys.stdout if "w" in mode else sys.stdin
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def read_records(stream) -> Iterator[ProgressRecord]:
+    """Record di un file CSV esportato con `progress export`."""
+    reader = csv.DictReader(stream)
+    missing = {"word", "correct", "wrong"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Colonne mancanti: {', '.join(sorted(missing))}")
+    for row in reader:
+        yield ProgressRecord(row["word"], int(row["correct"]), int(row["wrong"]),
+                             int(row.get("box") or 0), float(row.get("due") or 0.0))
+
+
+def cmd_progress_export(args) -> int:
+    progress_manager = open_progress(args.deck)
+    stream = _open_text(args.output, 'w')
+    exported = 0
+    try:
+        writer = csv.writer(stream)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in progress_manager.iter_progress(args.batch_size):
+            writer.writerows(batch)
+            exported += len(batch)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"Esportate {exported} parole", file=sys.stderr)
+    return 0
+
+
+def cmd_progress_import(args) -> int:
+    progress_manager = open_progress(args.deck)
+    imported = 0
+    started = time.perf_counter()
+    stream = _open_text(args.input, 'r')
+    try:
+        for batch in batched(read_records(stream), args.batch_size):
+            progress_manager.upsert_progress(batch)
+            imported += len(batch)
+    except ValueError as e:
+        print(f"❌ {args.input}: {e} (dopo {imported} parole)", file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        progress_manager.flush(wait=True)
+    print(f"Importate {imported} parole in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
+
+
+def cmd_progress_migrate(args) -> int:
+    if args.source == args.target and args.source_user == args.target_user:
+        print("❌ Origine e destinazione coincidono", file=sys.stderr)
+        return 1
+    failed = 0
+    for deck in args.decks:
+        file_name = os.path.basename(deck)
+        checkpoint = MigrationCheckpoint(
+            default_checkpoint_path(file_name, args.source, args.target),
+            {'file_name': file_name, 'source': args.source, 'source_user': args.source_user,
+             'target': args.target, 'target_user': args.target_user})
+        if args.restart:
+            checkpoint.clear()
+        source = target = None
+        try:
+            source = open_backend(args.source, file_name, args.source_user)
+            target = open_backend(args.target, file_name, args.target_user)
+            result = migrate_progress(
+                source, target, checkpoint, args.batch_size,
+                on_progress=lambda done, rate: print(f"  {file_name}: {done} parole ({rate:.0f} parole/s)",
+                                                     file=sys.stderr))
+        except (MigrationError, OSError, ValueError, RuntimeError) as e:
+            print(f"❌ {file_name}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        finally:
+            for backend in (source, target):
+                if hasattr(backend, 'close'):
+                    backend.close()
+        resumed = f", ripresa dopo '{result.resumed_after}'" if result.resumed_after else ""
+        print(f"{file_name}: {result.migrated} parole in {result.seconds:.2f} s "
+              f"({result.words_per_second:.0f} parole/s{resumed})")
+    return 1 if failed else 0
+
+
+def cmd_difficult(args) -> int:
+    words: List[dict] = open_progress(args.deck).get_difficult_words(args.min_attempts, args.limit)
+    if not words:
+        print("Nessuna parola difficile")
+        return 0
+    for item in words:
+        print(f"{item['word']:<30} {item['correct']:>4} ✓ {item['wrong']:>4} ✗  "
+              f"{item['error_rate'] * 100:5.1f}% errori")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="English Learning da riga di comando")
+    parser.add_argument("--backend", choices=BACKEND_CHOICES,
+                        help="Backend del progresso (default: PROGRESS_BACKEND o auto)")
+    parser.add_argument("--user-id", help="Utente del progresso (per Supabase)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    drill = commands.add_parser("drill", help="Esercitazione nel terminale")
+    drill.add_argument("deck", help="File del mazzo")
+    drill.add_argument("--order", choices=ORDERS, default="ripasso", help="Ordine delle parole")
+    drill.add_argument("--answer-lang", help="Lingua delle risposte (default: la prima inclusa nel mazzo)")
+    drill.add_argument("--count", type=int, help="Numero di domande (default: finché non si esce)")
+    drill.set_defaults(handler=cmd_drill)
+
+    deck = commands.add_parser("deck", help="Operazioni sui mazzi").add_subparsers(dest="deck_command",
+                                                                                 required=True)
+    compile_cmd = deck.add_parser("compile", help="Compila i mazzi nella cache")
+    compile_cmd.add_argument("paths", nargs="+", help="File dei mazzi")
+    compile_cmd.set_defaults(handler=cmd_deck_compile)
+    stats = deck.add_parser("stats", help="Statistiche di un mazzo e del suo progresso")
+    stats.add_argument("deck", help="File del mazzo")
+    stats.set_defaults(handler=cmd_deck_stats)
+
+    progress = commands.add_parser("progress", help="Esportazione e importazione del progresso")
+    progress = progress.add_subparsers(dest="progress_command", required=True)
+    export = progress.add_parser("export", help="Esporta il progresso in CSV")
+    export.add_argument("deck", help="Nome o percorso del mazzo")
+    export.add_argument("-o", "--output", default="-", help="File CSV (default: standard output)")
+    export.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Parole per blocco")
+    export.set_defaults(handler=cmd_progress_export)
+    import_cmd = progress.add_parser("import", help="Importa il progresso da CSV (sostituisce i valori)")
+    import_cmd.add_argument("deck", help="Nome o percorso del mazzo")
+    import_cmd.add_argument("input", help="File CSV esportato (- per lo standard input)")
+    import_cmd.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Parole per blocco")
+    import_cmd.set_defaults(handler=cmd_progress_import)
+
+    migrate = progress.add_parser("migrate", help="Copia il progresso da un backend a un altro (riprende "
+                                                  "da dove si era interrotta)")
+    migrate.add_argument("decks", nargs="+", help="Nomi o percorsi dei mazzi")
+    migrate.add_argument("--from", dest="source", choices=BACKEND_KINDS, required=True, help="Backend di origine")
+    migrate.add_argument("--to", dest="target", choices=BACKEND_KINDS, required=True,
+                         help="Backend di destinazione")
+    migrate.add_argument("--from-user", dest="source_user", help="Utente nell'origine (SQLite/Supabase)")
+    migrate.add_argument("--to-user", dest="target_user", help="Utente nella destinazione (SQLite/Supabase)")
+    migrate.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Parole per blocco")
+    migrate.add_argument("--restart", action="store_true", help="Ignora il checkpoint e riparte dall'inizio")
+    migrate.set_defaults(handler=cmd_progress_migrate)
+
+    difficult = commands.add_parser("difficult", help="Parole con più errori che risposte corrette")
+    difficult.add_argument("deck", help="Nome o percorso del mazzo")
+    difficult.add_argument("--min-attempts", type=int, default=3, help="Tentativi minimi")
+    difficult.add_argument("--limit", type=int, default=20, help="Numero massimo di parole")
+    difficult.set_defaults(handler=cmd_difficult)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.backend:
+        os.environ["PROGRESS_BACKEND"] = args.backend
+    if args.user_id:
+        runtime.session_state()['user_id'] = args.user_id
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
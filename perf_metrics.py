@@ -0,0 +1,179 @@
+"""
+Misura dei tempi di ogni rerun di Streamlit, divisi per fase (e, per il
+server API, di ogni richiesta).
+Si attiva con la variabile d'ambiente PERF_METRICS=1; da disattivato ogni
+chiamata si riduce al controllo di un flag. Con PERF_METRICS_FILE ogni rerun
+viene aggiunto come riga JSON al file indicato, da cui si ricavano p50/p95 per
+fase con `python perf_metrics.py <file>`.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ENABLED = os.getenv("PERF_METRICS", "").strip().lower() in ("1", "true", "yes", "on")
+METRICS_FILE = os.getenv("PERF_METRICS_FILE")
+
+# Contatori condivisi dal processo: le chiamate di rete avvengono anche nei thread di background
+_global_counters: Dict[str, int] = defaultdict(int)
+_global_lock = threading.Lock()
+_write_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NullSpan:
+    """Span che non misura nulla, usato quando le metriche sono disattivate."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "RerunMetrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.spans[self.name] = self.metrics.spans.get(self.name, 0.0) + elapsed
+        return False
+
+
+class RerunMetrics:
+    """Tempi per fase e contatori di un singolo rerun."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        with _global_lock:
+            self._global_start = dict(_global_counters)
+
+    def report(self) -> dict:
+        """Resoconto del rerun fino a questo momento (tempi in millisecondi)."""
+        with _global_lock:
+            network = {name: value - self._global_start.get(name, 0)
+                       for name, value in _global_counters.items()}
+        return {
+            'timestamp': self.started_at,
+            'total_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()},
+            'counters': dict(self.counters),
+            # Include anche il traffico delle altre sessioni dello stesso processo
+            'process_counters': {name: value for name, value in network.items() if value}
+        }
+
+
+def start_rerun() -> Optional[RerunMetrics]:
+    """Inizia la misura del rerun corrente (nel thread dello script)."""
+    if not ENABLED:
+        return None
+    metrics = RerunMetrics()
+    _local.current = metrics
+    return metrics
+
+
+def current() -> Optional[RerunMetrics]:
+    if not ENABLED:
+        return None
+    return getattr(_local, 'current', None)
+
+
+def span(name: str):
+    """Context manager che accumula il tempo della fase nel rerun corrente."""
+    if not ENABLED:
+        return _NULL_SPAN
+    metrics = getattr(_local, 'current', None)
+    return _Span(metrics, name) if metrics is not None else _NULL_SPAN
+
+
+def count(name: str, amount: int = 1):
+    """Incrementa un contatore del rerun corrente (es. chiamate al backend)."""
+    if not ENABLED:
+        return
+    metrics = getattr(_local, 'current', None)
+    if metrics is not None:
+        metrics.counters[name] += amount
+
+
+def count_global(name: str, amount: int = 1):
+    """Incrementa un contatore di processo (es. round trip di rete da thread di background)."""
+    if not ENABLED:
+        return
+    with _global_lock:
+        _global_counters[name] += amount
+
+
+def finish_rerun() -> Optional[dict]:
+    """Chiude la misura del rerun e la scrive nel file delle metriche, se configurato."""
+    metrics = current()
+    if metrics is None:
+        return None
+    _local.current = None
+    report = metrics.report()
+    write_report(report)
+    return report
+
+
+def write_report(report: dict):
+    """Aggiunge un resoconto al file delle metriche, se configurato."""
+    if not METRICS_FILE:
+        return
+    line = json.dumps(report, separators=(',', ':')) + "\n"
+    try:
+        with _write_lock, open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(line)
+    except OSError:
+        pass
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(path: str) -> Dict[str, Dict[str, float]]:
+    """Calcola p50/p95 per fase dal file JSON lines delle metriche."""
+    samples: Dict[str, List[float]] = defaultdict(list)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                report = json.loads(line)
+            except ValueError:
+                continue
+            samples['total'].append(report['total_ms'])
+            for phase, ms in report.get('phases_ms', {}).items():
+                samples[phase].append(ms)
+    return {phase: {'count': len(values),
+                    'p50_ms': percentile(values, 0.5),
+                    'p95_ms': percentile(values, 0.95)}
+            for phase, values in samples.items()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python perf_metrics.py <file_metriche.jsonl>")
+        sys.exit(2)
+    for phase, stats in sorted(summarize(sys.argv[1]).items()):
+        print(f"{phase:<20} n={stats['count']:<6} p50={stats['p50_ms']:.1f} ms  p95={stats['p95_ms']:.1f} ms")
@@ -0,0 +1,241 @@
+"""
+Pre-traduzione in background di un intero mazzo.
+Quando viene scelto un mazzo tutte le parole vengono tradotte con un pool di
+thread limitato e salvate nella cache delle traduzioni e nella tabella del
+mazzo nel registro condiviso, così il quiz può leggere le traduzioni senza
+attendere la rete. Tutto il lavoro, compresa la scansione del mazzo, avviene
+nel pool: il thread che avvia il job non attende nulla.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from deck_registry import get_deck_registry
+from translation_cache import TranslationCache, get_translation_cache, normalize_word
+
+# Numero massimo di richieste contemporanee al traduttore per tutto il processo
+MAX_CONCURRENT_TRANSLATIONS = 4
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.5
+# Un job terminato con parole non tradotte viene rilanciato dopo questo intervallo
+FAILED_RETRY_SECONDS = 60.0
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TRANSLATIONS,
+                               thread_name_prefix="pretranslation")
+
+
+class _RetryScheduler:
+    """
+    Rimette nel pool i tentativi falliti allo scadere del backoff.
+
+    Un solo thread attende le scadenze: i worker del pool non dormono mai tra
+    un tentativo e l'altro, quindi una parola che fallisce non blocca le altre.
+    """
+
+    def __init__(self):
+        self._queue: List[Tuple[float, int, Callable, tuple]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, delay: float, function: Callable, *args):
+        with self._condition:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._counter), function, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pretranslation-retry", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(timeout)
+                _, _, function, args = heapq.heappop(self._queue)
+            _executor.submit(function, *args)
+
+
+_retries = _RetryScheduler()
+
+
+class DeckPretranslator:
+    """Traduce in background tutte le parole di un mazzo per una coppia di lingue."""
+
+    def __init__(self, words: Sequence, src: str, dest: str,
+                 cache: Optional[TranslationCache] = None,
+                 store: Optional[Dict[str, str]] = None,
+                 bundled: Optional[Sequence] = None,
+                 max_retries: int = MAX_RETRIES,
+                 retry_backoff: float = RETRY_BACKOFF_SECONDS):
+        """
+        Args:
+            words: Parole del mazzo
+            src: Codice lingua sorgente
+            dest: Codice lingua di destinazione
+            cache: Cache delle traduzioni (default quella condivisa)
+            store: Tabella condivisa parola_normalizzata -> traduzione (es. quella del registro)
+            bundled: Traduzioni incluse nel mazzo, allineate a words (vuote se mancanti)
+            max_retries: Tentativi per parola
+            retry_backoff: Attesa prima del secondo tentativo, raddoppiata a ogni fallimento
+        """
+        self.src = src
+        self.dest = dest
+        self.cache = cache or get_translation_cache()
+        self.store = store if store is not None else {}
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # Scansione e deduplicazione avvengono nel pool (vedi _prepare)
+        self._source_words = words
+        self._bundled = bundled
+        self._words: Optional[List] = None
+
+        self._lock = threading.Lock()
+        self._done = 0
+        self._failed = 0
+        self._finished_at: Optional[float] = None
+        self._cancelled = False
+
+    def start(self):
+        """Avvia il job: scansione del mazzo e lettura della cache avvengono nel pool, non nel chiamante."""
+        _executor.submit(self._prepare)
+        return self
+
+    def _prepare(self):
+        """Copia le traduzioni incluse e quelle in cache, poi accoda le altre parole al traduttore."""
+        # Una sola richiesta per parola normalizzata, solo per le parole senza traduzione inclusa
+        unique_words: Dict[str, object] = {}
+        bundled = self._bundled if self._bundled is not None else itertools.repeat(None)
+        for word, translation in zip(self._source_words, bundled):
+            if translation:
+                self.store[normalize_word(word)] = translation
+            else:
+                unique_words.setdefault(normalize_word(word), word)
+        with self._lock:
+            self._words = list(unique_words.values())
+            if not self._words:
+                self._finished_at = time.monotonic()
+
+        for word in self._words:
+            if self._cancelled:
+                self._mark_done(failed=True)
+                continue
+            translation = self.cache.get(word, self.src, self.dest, record_stats=False)
+            if translation is not None:
+                self.store[normalize_word(word)] = translation
+                self._mark_done(failed=False)
+            else:
+                _executor.submit(self._translate_one, word)
+
+    def _mark_done(self, failed: bool):
+        with self._lock:
+            self._done += 1
+            if failed:
+                self._failed += 1
+            if self._done >= len(self._words):
+                self._finished_at = time.monotonic()
+
+    def _translate_one(self, word, attempt: int = 0):
+        """Un tentativo di traduzione; se fallisce la parola viene riaccodata dopo il backoff."""
+        if self._cancelled:
+            self._mark_done(failed=True)
+            return
+        try:
+            translation = self.cache.translate(word, self.src, self.dest)
+            if translation:
+                self.store[normalize_word(word)] = translation
+                self._mark_done(failed=False)
+                return
+        except Exception:
+            pass
+        if attempt + 1 < self.max_retries:
+            _retries.schedule(self.retry_backoff * (2 ** attempt), self._translate_one, word, attempt + 1)
+        else:
+            self._mark_done(failed=True)
+
+    def cancel(self):
+        """Interrompe le traduzioni non ancora eseguite."""
+        self._cancelled = True
+
+    def get(self, word) -> Optional[str]:
+        """Legge la traduzione dalla tabella del mazzo o dalla cache, senza mai bloccarsi sulla rete."""
+        translation = self.store.get(normalize_word(word))
+        if translation is not None:
+            return translation
+        return self.cache.get(word, self.src, self.dest)
+
+    def progress(self) -> Tuple[int, int]:
+        """
+        Restituisce (parole completate, parole da tradurre).
+
+        Finché la scansione del mazzo non è terminata il totale è il numero di parole del mazzo.
+        """
+        with self._lock:
+            if self._words is None:
+                return 0, len(self._source_words)
+            return self._done, len(self._words)
+
+    def is_done(self) -> bool:
+        done, total = self.progress()
+        return done >= total
+
+    def should_retry(self) -> bool:
+        """True se il job è terminato con errori da almeno FAILED_RETRY_SECONDS."""
+        with self._lock:
+            return (self._failed > 0 and self._finished_at is not None and
+                    time.monotonic() - self._finished_at >= FAILED_RETRY_SECONDS)
+
+    def get_status_info(self) -> Dict[str, int]:
+        done, total = self.progress()
+        return {'translated': done - self._failed, 'failed': self._failed, 'total': total}
+
+
+_jobs: Dict[Tuple[str, str, str], DeckPretranslator] = {}
+_jobs_lock = threading.Lock()
+
+
+def start_pretranslation(deck_key: str, words: Sequence, src: str, dest: str,
+                         bundled: Optional[Sequence] = None) -> DeckPretranslator:
+    """
+    Avvia (una sola volta per processo) la pre-traduzione di un mazzo.
+
+    Le traduzioni incluse nel mazzo vengono copiate nella tabella condivisa e
+    solo le parole senza traduzione vengono richieste al traduttore online.
+    Un job terminato con parole non tradotte viene sostituito da uno nuovo
+    dopo FAILED_RETRY_SECONDS.
+
+    Args:
+        deck_key: Identificativo del mazzo (es. hash del contenuto)
+        words: Parole del mazzo
+        src: Codice lingua sorgente
+        dest: Codice lingua di destinazione
+        bundled: Traduzioni incluse nel mazzo, allineate a words (vuote se mancanti)
+
+    Returns:
+        Il job di pre-traduzione, nuovo o già in corso
+    """
+    key = (deck_key, src, dest)
+    store = get_deck_registry().translations(deck_key, src, dest)
+    # Sotto il lock si registra solo il job: la scansione del mazzo avviene nel pool
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None and not job.should_retry():
+            return job
+        job = DeckPretranslator(words, src, dest, store=store, bundled=bundled)
+        _jobs[key] = job
+    # Fuori dal lock: l'avvio di un mazzo non fa attendere quello degli altri
+    return job.start()
+
+
+def _forget_deck(deck_key: str):
+    """Interrompe e dimentica i job di un mazzo rimosso dal registro."""
+    with _jobs_lock:
+        for key in [key for key in _jobs if key[0] == deck_key]:
+            _jobs.pop(key).cancel()
+
+
+get_deck_registry().add_evict_listener(_forget_deck)
@@ -1,26 +1,82 @@
 """
 Modulo per gestire il progresso dell'utente nell'apprendimento delle parole.
 Salva i dati localmente senza modificare i file originali su Git.
+
+Supporta due modalità di salvataggio:
+- "json": riscrive l'intero file JSON a ogni risposta (formato storico)
+- "journal": aggiunge un record compatto a un log per ogni risposta e
+  compatta periodicamente il log in uno snapshot, in background
+
+I file di un mazzo devono avere un solo gestore per processo: le sessioni
+usano get_progress_manager(), che condivide stato in memoria, log aperto e
+compattazione (istanze separate si cancellerebbero a vicenda i record).
 """
 
 import json
 import os
-from typing import Dict, Tuple
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from progress_stats import (BULK_BATCH_SIZE, DifficultWordsIndex, ProgressRecord, ProgressTotals,
+                            batched, normalize_records, verify_totals)
+
+STORAGE_MODES = ("json", "journal")
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Numero di record nel log oltre il quale avviene la compattazione
+JOURNAL_COMPACT_THRESHOLD = 1000
+# Con la policy "interval", intervallo minimo tra due fsync del log
+FSYNC_INTERVAL_SECONDS = 1.0
+SNAPSHOT_FORMAT_VERSION = 2
+# Tipo di record del journal che salva lo stato di ripasso di una parola
+SCHEDULE_RECORD = "s"
+# Tipo di record del journal che imposta il progresso completo di una parola (importazioni)
+SET_RECORD = "="
+
+
+def progress_file_path(file_name: str, progress_dir: str = "UserData") -> str:
+    """Percorso dello snapshot JSON del progresso di un mazzo."""
+    return os.path.join(progress_dir, f"{os.path.splitext(file_name)[0]}_progress.json")
+
 
 class ProgressManager:
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, storage_mode: Optional[str] = None,
+                 fsync_policy: Optional[str] = None,
+                 compact_threshold: int = JOURNAL_COMPACT_THRESHOLD):
         """
         Inizializza il gestore del progresso per un file specifico.
         
         Args:
             file_name: Nome del file Excel (es. "Words.xlsx")
+            storage_mode: "json" o "journal" (default da PROGRESS_STORAGE_MODE, poi "journal")
+            fsync_policy: "always", "interval" o "never" (default da PROGRESS_FSYNC, poi "always")
+            compact_threshold: Record nel log oltre i quali compattare
         """
         self.file_name = file_name
         self.progress_dir = "UserData"
-        self.progress_file = os.path.join(
-            self.progress_dir, 
-            f"{os.path.splitext(file_name)[0]}_progress.json"
-        )
+        self.progress_file = progress_file_path(file_name, self.progress_dir)
+        self.storage_mode = storage_mode or os.getenv("PROGRESS_STORAGE_MODE", "journal")
+        self.fsync_policy = fsync_policy or os.getenv("PROGRESS_FSYNC", "always")
+        if self.storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Modalità di salvataggio non valida: {self.storage_mode}")
+        if self.fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Policy fsync non valida: {self.fsync_policy}")
+        self.compact_threshold = compact_threshold
+        
+        # Stato del journal
+        self._log_prefix = f"{os.path.splitext(os.path.basename(self.progress_file))[0]}."
+        self._lock = threading.RLock()
+        self._log = None
+        self._log_generation = 1
+        self._log_records = 0
+        self._last_fsync = 0.0
+        self._compacting = False
+        self._compaction_thread = None
+        # Totali mantenuti in modo incrementale (salvati insieme al progresso)
+        self.totals = ProgressTotals()
+        self._difficult = DifficultWordsIndex()
         
         # Crea la directory se non esiste
         os.makedirs(self.progress_dir, exist_ok=True)
@@ -28,20 +84,266 @@ class ProgressManager:
         # Carica il progresso esistente
         self.progress = self._load_progress()
     
-    def _load_progress(self) -> Dict[str, Dict[str, int]]:
-        """Carica il progresso dal file JSON."""
+    def _read_snapshot(self) -> Tuple[Dict[str, Dict[str, int]], int, ProgressTotals]:
+        """
+        Legge il file JSON del progresso.
+        
+        Returns:
+            Tupla (progresso, ultima generazione di log già inclusa, totali)
+        """
         if os.path.exists(self.progress_file):
             try:
                 with open(self.progress_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    data = json.load(f)
             except (json.JSONDecodeError, FileNotFoundError):
-                return {}
-        return {}
+                return {}, 0, ProgressTotals()
+            if isinstance(data, dict) and data.get('format') == SNAPSHOT_FORMAT_VERSION:
+                progress = data.get('progress', {})
+                if 'totals' in data:
+                    totals = ProgressTotals.from_dict(data['totals'])
+                else:
+                    totals = ProgressTotals.from_progress(progress)
+                return progress, data.get('log_generation', 0), totals
+            # Formato storico: solo il dizionario delle parole, totali da ricalcolare
+            return data, 0, ProgressTotals.from_progress(data)
+        return {}, 0, ProgressTotals()
+    
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.progress_dir, f"{self._log_prefix}{generation}.log")
+    
+    def _list_log_generations(self) -> List[int]:
+        """Generazioni dei file di log presenti su disco, in ordine crescente."""
+        generations = []
+        for name in os.listdir(self.progress_dir):
+            if name.startswith(self._log_prefix) and name.endswith('.log'):
+                number = name[len(self._log_prefix):-len('.log')]
+                if number.isdigit():
+                    generations.append(int(number))
+        return sorted(generations)
+    
+    def _apply_record(self, progress: Dict[str, Dict[str, int]], totals: ProgressTotals,
+                      word: str, outcome, *values):
+        """
+        Applica un record del journal.
+        
+        outcome: 1 corretta, 0 errata, None reset della parola,
+        SCHEDULE_RECORD seguito da (scatola, scadenza) per lo stato di ripasso,
+        SET_RECORD seguito da (corrette, errate, scatola, scadenza) per un valore assoluto.
+        """
+        if outcome == SCHEDULE_RECORD:
+            if word in progress:
+                progress[word]['box'], progress[word]['due'] = values
+            return
+        if outcome == SET_RECORD:
+            record = ProgressRecord(word, *values)
+            old = progress.get(word)
+            totals.update(None if old is None else (old.get('correct', 0), old.get('wrong', 0)),
+                          (record.correct, record.wrong))
+            progress[word] = record.as_stats()
+            return
+        if outcome is None:
+            stats = progress.pop(word, None)
+            if stats is not None:
+                totals.update((stats.get('correct', 0), stats.get('wrong', 0)), None)
+            return
+        is_new_word = word not in progress
+        stats = progress.setdefault(word, {'correct': 0, 'wrong': 0})
+        if outcome:
+            stats['correct'] += 1
+        else:
+            stats['wrong'] += 1
+        totals.record(is_new_word, bool(outcome))
+    
+    def _replay_log(self, progress: Dict[str, Dict[str, int]], totals: ProgressTotals,
+                    path: str, repair: bool) -> int:
+        """
+        Riapplica un file di log al progresso.
+        
+        Un record finale troncato (crash durante la scrittura) viene ignorato e,
+        se repair è True, rimosso dal file.
+        
+        Returns:
+            Numero di record validi letti
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        
+        records = 0
+        valid_end = 0
+        for line in data.split(b"\n")[:-1]:
+            try:
+                record = json.loads(line)
+                self._apply_record(progress, totals, *record)
+            except (ValueError, TypeError):
+                break
+            records += 1
+            valid_end += len(line) + 1
+        
+        if repair and valid_end < len(data):
+            with open(path, 'r+b') as f:
+                f.truncate(valid_end)
+                f.flush()
+                os.fsync(f.fileno())
+        return records
+    
+    def _load_progress(self) -> Dict[str, Dict[str, int]]:
+        """Carica il progresso dal file JSON e riapplica gli eventuali log."""
+        progress, snapshot_generation, totals = self._read_snapshot()
+        
+        generations = self._list_log_generations()
+        for generation in generations:
+            if generation <= snapshot_generation:
+                # Log già incluso nello snapshot (compattazione interrotta dopo lo snapshot)
+                self._remove_log(generation)
+        live = [generation for generation in generations if generation > snapshot_generation]
+        
+        for generation in live:
+            records = self._replay_log(progress, totals, self._log_path(generation),
+                                       repair=generation == live[-1])
+            self._log_records = records
+        
+        self._log_generation = live[-1] if live else snapshot_generation + 1
+        self.progress = progress
+        self.totals = totals
+        self._difficult = DifficultWordsIndex.from_progress(progress)
+        
+        if self.storage_mode == "json":
+            if live:
+                # Passaggio da journal a json: consolida i log nel file JSON
+                self._log_generation = live[-1] + 1
+                self._save_progress()
+                for generation in live:
+                    self._remove_log(generation)
+        elif len(live) > 1:
+            # Compattazione interrotta prima dello snapshot: la completa ora
+            with self._lock:
+                self._compact(background=False)
+        
+        return progress
     
     def _save_progress(self):
         """Salva il progresso nel file JSON."""
-        with open(self.progress_file, 'w', encoding='utf-8') as f:
-            json.dump(self.progress, f, ensure_ascii=False, indent=2)
+        self._write_snapshot(self.progress, self.totals, self._log_generation - 1, indent=2)
+    
+    def _write_snapshot(self, progress: Dict[str, Dict[str, int]], totals: ProgressTotals,
+                        log_generation: int, indent: Optional[int] = None):
+        """Scrive lo snapshot in modo atomico (file temporaneo + fsync + rename)."""
+        tmp_path = f"{self.progress_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': SNAPSHOT_FORMAT_VERSION,
+                'log_generation': log_generation,
+                'totals': totals.to_dict(),
+                'progress': progress
+            }, f, ensure_ascii=False, indent=indent,
+                separators=None if indent else (',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.progress_file)
+    
+    def _open_log(self):
+        if self._log is None:
+            self._log = open(self._log_path(self._log_generation), 'ab')
+        return self._log
+    
+    def _append(self, word: str, outcome, *values):
+        """Aggiunge un record al journal: costo O(1) indipendente dalla storia."""
+        self._append_many([[word, outcome, *values]])
+    
+    def _append_many(self, records: List[list]):
+        """Aggiunge più record al journal con una sola scrittura (e un solo fsync)."""
+        data = "".join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n"
+                       for record in records)
+        with self._lock:
+            log = self._open_log()
+            log.write(data.encode('utf-8'))
+            log.flush()
+            now = time.monotonic()
+            if self.fsync_policy == "always" or (
+                    self.fsync_policy == "interval" and now - self._last_fsync >= FSYNC_INTERVAL_SECONDS):
+                os.fsync(log.fileno())
+                self._last_fsync = now
+            
+            self._log_records += len(records)
+            if self._log_records >= self.compact_threshold:
+                self._compact(background=True)
+    
+    def _compact(self, background: bool):
+        """
+        Compatta il journal in uno snapshot (da chiamare con il lock acquisito).
+        
+        Il log corrente viene chiuso e si passa a una nuova generazione; lo
+        snapshot dello stato attuale copre tutte le generazioni precedenti, che
+        vengono eliminate solo dopo che lo snapshot è stato scritto.
+        """
+        if self._compacting:
+            if background:
+                return
+            # Compattazione sincrona (es. reset): attende quella in corso
+            self._compaction_thread.join()
+        self._compacting = True
+        
+        progress_copy = {word: dict(stats) for word, stats in self.progress.items()}
+        totals_copy = ProgressTotals.from_dict(self.totals.to_dict())
+        covered_generation = self._log_generation
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self._log_generation += 1
+        self._log_records = 0
+        
+        def write():
+            try:
+                self._write_snapshot(progress_copy, totals_copy, covered_generation)
+                for generation in self._list_log_generations():
+                    if generation <= covered_generation:
+                        self._remove_log(generation)
+            finally:
+                self._compacting = False
+        
+        if background:
+            self._compaction_thread = threading.Thread(target=write, name="progress-compaction", daemon=True)
+            self._compaction_thread.start()
+        else:
+            write()
+    
+    def _remove_log(self, generation: int):
+        """Elimina un log già coperto dallo snapshot (può averlo già eliminato un'altra istanza)."""
+        try:
+            os.remove(self._log_path(generation))
+        except FileNotFoundError:
+            pass
+    
+    def _persist(self, word: str, outcome, *values):
+        """Rende persistente una modifica secondo la modalità di salvataggio."""
+        if self.storage_mode == "journal":
+            self._append(word, outcome, *values)
+        else:
+            self._save_progress()
+    
+    def flush(self):
+        """
+        Rende durevoli su disco le modifiche già scritte, qualunque sia la policy fsync.
+        
+        Un log chiuso per una compattazione ancora in corso è coperto dallo
+        snapshot solo quando questo è scritto: si attende la compattazione.
+        """
+        with self._lock:
+            if self._compacting:
+                self._compaction_thread.join()
+            if self._log is not None:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._last_fsync = time.monotonic()
+    
+    def close(self):
+        """Attende l'eventuale compattazione in corso e chiude il file di log aperto."""
+        with self._lock:
+            if self._compacting:
+                self._compaction_thread.join()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
     
     def get_word_stats(self, word: str) -> Tuple[int, int]:
         """
@@ -49,7 +351,7 @@ class ProgressManager:
         
         Args:
             word: La parola da controllare
-            
+        
         Returns:
             Tupla (risposte_corrette, risposte_errate)
         """
@@ -69,15 +371,20 @@ class ProgressManager:
         """
         word_lower = word.lower().strip()
         
-        if word_lower not in self.progress:
-            self.progress[word_lower] = {'correct': 0, 'wrong': 0}
-        
-        if is_correct:
-            self.progress[word_lower]['correct'] += 1
-        else:
-            self.progress[word_lower]['wrong'] += 1
-        
-        self._save_progress()
+        with self._lock:
+            is_new_word = word_lower not in self.progress
+            if is_new_word:
+                self.progress[word_lower] = {'correct': 0, 'wrong': 0}
+            
+            if is_correct:
+                self.progress[word_lower]['correct'] += 1
+            else:
+                self.progress[word_lower]['wrong'] += 1
+            self.totals.record(is_new_word, is_correct)
+            stats = self.progress[word_lower]
+            self._difficult.update(word_lower, stats['correct'], stats['wrong'])
+            
+            self._persist(word_lower, 1 if is_correct else 0)
     
     def get_total_stats(self) -> Dict[str, int]:
         """
@@ -86,59 +393,127 @@ class ProgressManager:
         Returns:
             Dizionario con le statistiche totali
         """
-        total_correct = sum(stats.get('correct', 0) for stats in self.progress.values())
-        total_wrong = sum(stats.get('wrong', 0) for stats in self.progress.values())
-        total_words = len(self.progress)
-        total_attempts = total_correct + total_wrong
-        
-        accuracy = (total_correct / total_attempts * 100) if total_attempts > 0 else 0
-        
-        return {
-            'total_words_practiced': total_words,
-            'total_correct': total_correct,
-            'total_wrong': total_wrong,
-            'total_attempts': total_attempts,
-            'accuracy_percentage': round(accuracy, 1)
-        }
+        return self.totals.as_stats()
+    
+    def verify_totals(self) -> bool:
+        """Verifica che i totali incrementali coincidano con un ricalcolo completo."""
+        with self._lock:
+            return verify_totals(self.totals, self.progress)
     
-    def get_difficult_words(self, min_attempts: int = 3) -> list:
+    def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list:
         """
         Ottiene le parole più difficili (con più errori che risposte corrette).
         
         Args:
             min_attempts: Numero minimo di tentativi per considerare una parola
+            limit: Numero massimo di parole da restituire (None = tutte)
             
         Returns:
             Lista di parole difficili ordinate per rapporto errori/totale
         """
-        difficult_words = []
+        with self._lock:
+            return self._difficult.top(min_attempts, limit)
+    
+    def get_schedules(self) -> Dict[str, Tuple[int, float]]:
+        """Stato di ripasso salvato per parola: {parola: (scatola, scadenza)}."""
+        with self._lock:
+            return {word: (stats['box'], stats['due'])
+                    for word, stats in self.progress.items() if 'box' in stats}
+    
+    def save_schedule(self, word: str, box: int, due: float):
+        """
+        Salva lo stato di ripasso di una parola già praticata.
         
-        for word, stats in self.progress.items():
-            correct = stats.get('correct', 0)
-            wrong = stats.get('wrong', 0)
-            total = correct + wrong
-            
-            if total >= min_attempts and wrong > correct:
-                error_rate = wrong / total
-                difficult_words.append({
-                    'word': word,
-                    'correct': correct,
-                    'wrong': wrong,
-                    'error_rate': error_rate
-                })
-        
-        # Ordina per tasso di errore decrescente
-        difficult_words.sort(key=lambda x: x['error_rate'], reverse=True)
-        return difficult_words
+        Args:
+            word: La parola
+            box: Scatola Leitner
+            due: Scadenza del prossimo ripasso (epoch in secondi)
+        """
+        word_lower = word.lower().strip()
+        with self._lock:
+            if word_lower not in self.progress:
+                return
+            self.progress[word_lower]['box'] = box
+            self.progress[word_lower]['due'] = due
+            self._persist(word_lower, SCHEDULE_RECORD, box, due)
+    
+    def iter_progress(self, batch_size: int = BULK_BATCH_SIZE,
+                      after: Optional[str] = None) -> Iterator[List[ProgressRecord]]:
+        """
+        Esporta il progresso a blocchi di al massimo batch_size parole, in ordine di parola.
+        
+        Args:
+            after: Riprende dalla parola successiva a questa (es. da un checkpoint)
+        
+        L'elenco delle parole viene fissato all'inizio: le risposte registrate
+        durante l'esportazione possono comparire o no, ma nessuna parola è ripetuta.
+        """
+        with self._lock:
+            words = sorted(word for word in self.progress if after is None or word > after)
+        for chunk in batched(words, batch_size):
+            with self._lock:
+                batch = [ProgressRecord.from_stats(word, self.progress[word])
+                         for word in chunk if word in self.progress]
+            if batch:
+                yield batch
+    
+    def upsert_progress(self, records: Iterable[ProgressRecord]):
+        """
+        Imposta il progresso completo delle parole indicate (importazione in blocco).
+        
+        I valori sostituiscono quelli esistenti; nel journal il blocco viene
+        scritto con una sola scrittura, in modalità json con un solo salvataggio.
+        """
+        records = normalize_records(records)
+        if not records:
+            return
+        with self._lock:
+            for word, record in records.items():
+                self._apply_record(self.progress, self.totals, word, SET_RECORD, *record[1:])
+                self._difficult.update(word, record.correct, record.wrong)
+            if self.storage_mode == "journal":
+                self._append_many([[word, SET_RECORD, *record[1:]] for word, record in records.items()])
+            else:
+                self._save_progress()
     
     def reset_word_progress(self, word: str):
         """Reset del progresso per una specifica parola."""
         word_lower = word.lower().strip()
-        if word_lower in self.progress:
-            del self.progress[word_lower]
-            self._save_progress()
+        with self._lock:
+            if word_lower in self.progress:
+                stats = self.progress.pop(word_lower)
+                self.totals.update((stats.get('correct', 0), stats.get('wrong', 0)), None)
+                self._difficult.remove(word_lower)
+                self._persist(word_lower, None)
     
     def reset_all_progress(self):
         """Reset di tutto il progresso."""
-        self.progress = {}
-        self._save_progress()
\ No newline at end of file
+        with self._lock:
+            self.progress = {}
+            self.totals = ProgressTotals()
+            self._difficult.clear()
+            if self.storage_mode == "journal":
+                self._compact(background=False)
+            else:
+                self._save_progress()
+
+
+# Gestori condivisi per file di progresso; rilasciati quando nessuna sessione li usa più
+_shared_managers: "weakref.WeakValueDictionary[str, ProgressManager]" = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+
+def get_progress_manager(file_name: str) -> ProgressManager:
+    """
+    Restituisce il gestore del progresso del mazzo condiviso dal processo.
+
+    Tutte le sessioni che aprono lo stesso mazzo scrivono attraverso lo stesso
+    journal: la compattazione include sempre le risposte di ognuna.
+    """
+    key = os.path.abspath(progress_file_path(file_name))
+    with _shared_lock:
+        manager = _shared_managers.get(key)
+        if manager is None:
+            manager = ProgressManager(file_name)
+            _shared_managers[key] = manager
+        return manager
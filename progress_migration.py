@@ -0,0 +1,162 @@
+"""
+Migrazione e sincronizzazione del progresso tra backend.
+Il progresso viene letto dal backend di origine a blocchi, in ordine di parola,
+e scritto nel backend di destinazione con un'importazione in blocco per blocco
+(un upsert per blocco invece di una scrittura per risposta). Dopo ogni blocco
+scritto l'ultima parola viene salvata in un checkpoint: una migrazione
+interrotta riprende da lì; prima del checkpoint la destinazione viene resa
+durevole (flush), così il checkpoint non precede mai i dati. La memoria usata è quella di un blocco (oltre a
+quella del backend stesso: i file JSON vengono comunque caricati interi).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from progress_stats import BULK_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+BACKEND_KINDS = ("json", "sqlite", "supabase", "session")
+CHECKPOINT_DIR = os.path.join("Cache", "migrations")
+CHECKPOINT_VERSION = 1
+# Intervallo minimo tra due resoconti di avanzamento
+REPORT_INTERVAL_SECONDS = 1.0
+
+
+class MigrationError(RuntimeError):
+    """La migrazione non può partire (backend non disponibile o non valido)."""
+
+
+class MigrationResult(NamedTuple):
+    migrated: int
+    # Parole già migrate in un'esecuzione precedente (ripresa da checkpoint)
+    resumed_after: Optional[str]
+    seconds: float
+
+    @property
+    def words_per_second(self) -> float:
+        return self.migrated / self.seconds if self.seconds > 0 else 0.0
+
+
+def open_backend(kind: str, file_name: str, user_id: Optional[str] = None):
+    """
+    Crea direttamente il backend indicato, senza i fallback di HybridProgressManager.
+
+    Args:
+        kind: "json", "sqlite", "supabase" o "session"
+        file_name: Nome del file del mazzo (chiave del progresso)
+        user_id: Utente del progresso (obbligatorio per Supabase, default "local" per SQLite)
+    """
+    if kind == "json":
+        from progress_manager import get_progress_manager
+        return get_progress_manager(file_name)
+    if kind == "sqlite":
+        from sqlite_progress_manager import DEFAULT_USER_ID, SQLiteProgressManager
+        return SQLiteProgressManager(file_name, user_id=user_id or DEFAULT_USER_ID)
+    if kind == "supabase":
+        if not user_id:
+            raise MigrationError("Per Supabase serve l'utente del progresso")
+        from database_manager import DatabaseManager
+        backend = DatabaseManager(file_name, user_id=user_id)
+        if not backend.is_cloud_enabled:
+            raise MigrationError("Supabase non configurato (SUPABASE_URL/SUPABASE_KEY) o non installato")
+        return backend
+    if kind == "session":
+        from hybrid_progress_manager import SessionStateManager
+        return SessionStateManager(file_name)
+    raise MigrationError(f"Backend non valido: {kind}")
+
+
+class MigrationCheckpoint:
+    """Ultima parola scritta nella destinazione, salvata con scrittura atomica."""
+
+    def __init__(self, path: str, key: dict):
+        """
+        Args:
+            path: File JSON del checkpoint
+            key: Origine e destinazione della migrazione: un checkpoint di un'altra
+                migrazione salvato nello stesso file viene ignorato
+        """
+        self.path = path
+        self.key = key
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != CHECKPOINT_VERSION or data.get('key') != self.key:
+            logger.warning("Checkpoint %s di un'altra migrazione: ignorato", self.path)
+            return None
+        return data
+
+    def save(self, last_word: str, migrated: int):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'key': self.key, 'last_word': last_word,
+                       'migrated': migrated, 'updated_at': time.time()}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def default_checkpoint_path(file_name: str, source: str, target: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{os.path.splitext(file_name)[0]}.{source}-{target}.json")
+
+
+def migrate_progress(source, target, checkpoint: Optional[MigrationCheckpoint] = None,
+                     batch_size: int = BULK_BATCH_SIZE,
+                     on_progress: Optional[Callable[[int, float], None]] = None) -> MigrationResult:
+    """
+    Copia il progresso da source a target a blocchi.
+
+    I valori della destinazione vengono sostituiti parola per parola (le parole
+    presenti solo nella destinazione restano), quindi ripetere un blocco dopo
+    un'interruzione non altera il risultato. A migrazione completata il
+    checkpoint viene rimosso: una nuova esecuzione risincronizza tutto.
+
+    Args:
+        source: Backend di origine (con iter_progress)
+        target: Backend di destinazione (con upsert_progress)
+        checkpoint: Checkpoint da cui riprendere e da aggiornare dopo ogni blocco
+        batch_size: Parole per blocco
+        on_progress: Chiamata al più ogni REPORT_INTERVAL_SECONDS con (parole migrate, parole/s)
+    """
+    state = checkpoint.load() if checkpoint is not None else None
+    after = state['last_word'] if state else None
+    migrated = state['migrated'] if state else 0
+    copied = 0
+    started = time.perf_counter()
+    last_report = started
+
+    durable = getattr(target, 'flush', None)
+    for batch in source.iter_progress(batch_size, after):
+        target.upsert_progress(batch)
+        copied += len(batch)
+        if checkpoint is not None:
+            # Il blocco deve essere su disco (es. fsync del journal) prima del checkpoint
+            if durable is not None:
+                durable()
+            checkpoint.save(batch[-1].word, migrated + copied)
+        now = time.perf_counter()
+        if on_progress is not None and now - last_report >= REPORT_INTERVAL_SECONDS:
+            on_progress(migrated + copied, copied / (now - started))
+            last_report = now
+
+    if durable is not None:
+        durable()
+    if checkpoint is not None:
+        checkpoint.clear()
+    return MigrationResult(copied, after, time.perf_counter() - started)
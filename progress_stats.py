@@ -0,0 +1,288 @@
+"""
+Statistiche aggregate del progresso mantenute in modo incrementale.
+I totali vengono aggiornati a ogni risposta e a ogni reset, così
+get_total_stats non deve più scorrere tutte le parole; allo stesso modo la
+classifica delle parole difficili è mantenuta in uno heap.
+"""
+
+import heapq
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Parole per blocco nelle esportazioni e importazioni in blocco
+BULK_BATCH_SIZE = 1000
+# Tentativi minimi di default perché una parola compaia tra le difficili
+DEFAULT_MIN_ATTEMPTS = 3
+# Soglie di tentativi con uno heap mantenuto (compresa quella di default); oltre,
+# lo heap della soglia usata meno di recente viene eliminato
+MAX_ATTEMPT_THRESHOLDS = 4
+
+
+class ProgressRecord(NamedTuple):
+    """Progresso completo di una parola, per esportazioni e importazioni in blocco."""
+    word: str
+    correct: int
+    wrong: int
+    box: int = 0
+    due: float = 0.0
+
+    @classmethod
+    def from_stats(cls, word: str, stats: Dict[str, int]) -> "ProgressRecord":
+        return cls(word, stats.get('correct', 0), stats.get('wrong', 0),
+                   stats.get('box', 0), stats.get('due', 0.0))
+
+    def as_stats(self) -> Dict[str, int]:
+        """Dizionario nel formato dei backend in memoria (box/due solo se in ripasso)."""
+        stats = {'correct': self.correct, 'wrong': self.wrong}
+        if self.box:
+            stats['box'] = self.box
+            stats['due'] = self.due
+        return stats
+
+
+def normalize_records(records: Iterable[ProgressRecord]) -> Dict[str, ProgressRecord]:
+    """Parole normalizzate come nelle risposte; a parità di parola vince l'ultimo record."""
+    normalized = {}
+    for record in records:
+        word = record.word.lower().strip()
+        if word:
+            normalized[word] = record._replace(word=word)
+    return normalized
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Divide una sequenza in blocchi di al massimo size elementi."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ProgressTotals:
+    """Totali correnti: parole praticate, risposte corrette ed errate."""
+
+    __slots__ = ("words", "correct", "wrong")
+
+    def __init__(self, words: int = 0, correct: int = 0, wrong: int = 0):
+        self.words = words
+        self.correct = correct
+        self.wrong = wrong
+
+    @classmethod
+    def from_progress(cls, progress: Dict[str, Dict[str, int]]) -> "ProgressTotals":
+        """Ricalcola i totali da zero (caricamento di dati legacy o verifica)."""
+        totals = cls()
+        for stats in progress.values():
+            totals.words += 1
+            totals.correct += stats.get('correct', 0)
+            totals.wrong += stats.get('wrong', 0)
+        return totals
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> "ProgressTotals":
+        return cls(data.get('words', 0), data.get('correct', 0), data.get('wrong', 0))
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'words': self.words, 'correct': self.correct, 'wrong': self.wrong}
+
+    def update(self, old: Optional[Tuple[int, int]], new: Optional[Tuple[int, int]]):
+        """
+        Aggiorna i totali per il cambio di stato di una parola.
+
+        Args:
+            old: (corrette, errate) prima della modifica, None se la parola non esisteva
+            new: (corrette, errate) dopo la modifica, None se la parola è stata rimossa
+        """
+        if old is not None:
+            self.words -= 1
+            self.correct -= old[0]
+            self.wrong -= old[1]
+        if new is not None:
+            self.words += 1
+            self.correct += new[0]
+            self.wrong += new[1]
+
+    def record(self, is_new_word: bool, is_correct: bool):
+        """Aggiornamento rapido per una singola risposta."""
+        if is_new_word:
+            self.words += 1
+        if is_correct:
+            self.correct += 1
+        else:
+            self.wrong += 1
+
+    def as_stats(self) -> Dict[str, int]:
+        """Dizionario nel formato restituito da get_total_stats."""
+        total_attempts = self.correct + self.wrong
+        accuracy = (self.correct / total_attempts * 100) if total_attempts > 0 else 0
+        return {
+            'total_words_practiced': self.words,
+            'total_correct': self.correct,
+            'total_wrong': self.wrong,
+            'total_attempts': total_attempts,
+            'accuracy_percentage': round(accuracy, 1)
+        }
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ProgressTotals):
+            return NotImplemented
+        return (self.words, self.correct, self.wrong) == (other.words, other.correct, other.wrong)
+
+    def __repr__(self) -> str:
+        return f"ProgressTotals(words={self.words}, correct={self.correct}, wrong={self.wrong})"
+
+
+def verify_totals(totals: ProgressTotals, progress: Dict[str, Dict[str, int]]) -> bool:
+    """Controllo di coerenza: confronta i totali incrementali con un ricalcolo completo."""
+    return totals == ProgressTotals.from_progress(progress)
+
+
+class DifficultWordsIndex:
+    """
+    Classifica incrementale delle parole difficili (più errori che risposte corrette).
+
+    Usa uno heap per soglia di tentativi, ordinato per tasso di errore
+    decrescente, con invalidazione pigra: una parola entra nello heap di una
+    soglia solo quando l'ha raggiunta, così top() legge le prime k parole in
+    O(k log n) senza scorrere quelle con pochi tentativi. Gli heap sono al più
+    MAX_ATTEMPT_THRESHOLDS, quindi ogni aggiornamento costa O(log n) per un
+    numero limitato di soglie; ognuno viene ricostruito quando le voci obsolete
+    superano quelle valide. A parità di tasso di errore l'ordine è quello di
+    prima registrazione, come nell'ordinamento stabile originale.
+    """
+
+    def __init__(self):
+        # Soglia di tentativi -> heap di voci (-tasso_errore, ordine, versione, parola), dalla
+        # meno alla più usata di recente; quello della soglia di default esiste sempre,
+        # gli altri nascono al primo top()
+        self._heaps: Dict[int, List[Tuple[float, int, int, str]]] = {DEFAULT_MIN_ATTEMPTS: []}
+        # Soglia -> voci valide nel suo heap (le altre sono obsolete)
+        self._live: Dict[int, int] = {DEFAULT_MIN_ATTEMPTS: 0}
+        # parola -> (versione, corrette, errate) per le sole parole difficili
+        self._current: Dict[str, Tuple[int, int, int]] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._version = 0
+        # Voci dello heap esaminate dall'ultima chiamata a top()
+        self.last_scanned = 0
+
+    @classmethod
+    def from_progress(cls, progress: Dict[str, Dict[str, int]]) -> "DifficultWordsIndex":
+        """Costruisce l'indice in O(n) a partire dal progresso completo."""
+        index = cls()
+        for word, stats in progress.items():
+            index._order[word] = index._next_order
+            index._next_order += 1
+            correct, wrong = stats.get('correct', 0), stats.get('wrong', 0)
+            if wrong > correct:
+                index._version += 1
+                index._current[word] = (index._version, correct, wrong)
+        heap = index._heaps[DEFAULT_MIN_ATTEMPTS] = index._build_heap(DEFAULT_MIN_ATTEMPTS)
+        index._live[DEFAULT_MIN_ATTEMPTS] = len(heap)
+        return index
+
+    def _entry(self, word: str, version: int, correct: int, wrong: int) -> Tuple[float, int, int, str]:
+        return -wrong / (correct + wrong), self._order[word], version, word
+
+    def _build_heap(self, min_attempts: int) -> List[Tuple[float, int, int, str]]:
+        """Heap delle parole difficili con almeno min_attempts tentativi, in O(n)."""
+        heap = [self._entry(word, version, correct, wrong)
+                for word, (version, correct, wrong) in self._current.items()
+                if correct + wrong >= min_attempts]
+        heapq.heapify(heap)
+        return heap
+
+    def update(self, word: str, correct: int, wrong: int):
+        """Aggiorna la posizione di una parola dopo una risposta."""
+        if word not in self._order:
+            self._order[word] = self._next_order
+            self._next_order += 1
+        previous = self._current.get(word)
+        entry = None
+        if wrong > correct:
+            self._version += 1
+            self._current[word] = (self._version, correct, wrong)
+            entry = self._entry(word, self._version, correct, wrong)
+        else:
+            self._current.pop(word, None)
+        for min_attempts, heap in self._heaps.items():
+            # La voce precedente della parola, se era nello heap, diventa obsoleta
+            was_listed = previous is not None and previous[1] + previous[2] >= min_attempts
+            if entry is not None and correct + wrong >= min_attempts:
+                heapq.heappush(heap, entry)
+                self._live[min_attempts] += 1 - was_listed
+            elif was_listed:
+                self._live[min_attempts] -= 1
+        self._maybe_rebuild()
+
+    def remove(self, word: str):
+        """Rimuove una parola (reset del suo progresso)."""
+        previous = self._current.pop(word, None)
+        self._order.pop(word, None)
+        if previous is not None:
+            for min_attempts in self._heaps:
+                if previous[1] + previous[2] >= min_attempts:
+                    self._live[min_attempts] -= 1
+        self._maybe_rebuild()
+
+    def clear(self):
+        self.__init__()
+
+    def _maybe_rebuild(self):
+        """Ricostruisce gli heap in cui le voci obsolete superano quelle valide."""
+        for min_attempts, heap in self._heaps.items():
+            if len(heap) > 2 * self._live[min_attempts] + 64:
+                heap[:] = self._build_heap(min_attempts)
+                self._live[min_attempts] = len(heap)
+
+    def _heap_for(self, min_attempts: int) -> List[Tuple[float, int, int, str]]:
+        """Heap della soglia, creato se manca; la soglia diventa la più usata di recente."""
+        heap = self._heaps.pop(min_attempts, None)
+        if heap is None:
+            if len(self._heaps) >= MAX_ATTEMPT_THRESHOLDS:
+                # Elimina la soglia usata meno di recente (mai quella di default)
+                oldest = next(key for key in self._heaps if key != DEFAULT_MIN_ATTEMPTS)
+                del self._heaps[oldest]
+                del self._live[oldest]
+            heap = self._build_heap(min_attempts)
+            self._live[min_attempts] = len(heap)
+        self._heaps[min_attempts] = heap
+        return heap
+
+    def top(self, min_attempts: int = DEFAULT_MIN_ATTEMPTS, limit: Optional[int] = None) -> list:
+        """
+        Restituisce le parole difficili ordinate per tasso di errore decrescente.
+
+        Args:
+            min_attempts: Numero minimo di tentativi per considerare una parola
+            limit: Numero massimo di parole (None = tutte)
+        """
+        # Una parola difficile ha sempre almeno un tentativo
+        min_attempts = max(1, min_attempts)
+        heap = self._heap_for(min_attempts)
+
+        result = []
+        valid_entries = []
+        scanned = 0
+        while heap and (limit is None or len(result) < limit):
+            entry = heapq.heappop(heap)
+            scanned += 1
+            current = self._current.get(entry[3])
+            if current is None or current[0] != entry[2]:
+                # Voce obsoleta: la parola è stata aggiornata o rimossa (viene scartata)
+                continue
+            valid_entries.append(entry)
+            _, correct, wrong = current
+            result.append({
+                'word': entry[3],
+                'correct': correct,
+                'wrong': wrong,
+                'error_rate': -entry[0]
+            })
+        for entry in valid_entries:
+            heapq.heappush(heap, entry)
+        self.last_scanned = scanned
+        return result
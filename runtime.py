@@ -0,0 +1,102 @@
+"""
+Ambiente di esecuzione dei gestori del progresso.
+Sotto `streamlit run` stato di sessione, secrets e avvisi sono quelli di
+Streamlit; fuori (riga di comando, server API, benchmark) si usano uno stato
+in memoria, le variabili d'ambiente e il logging, senza importare Streamlit.
+"""
+
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, MutableMapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stato di sessione fuori da Streamlit: uno per processo, o uno per contesto con session_scope()
+_default_state: Dict[str, object] = {}
+_session_state: ContextVar[MutableMapping] = ContextVar("session_state", default=_default_state)
+# Secrets impostati da codice (es. opzioni della riga di comando), prima delle variabili d'ambiente
+_secrets: Dict[str, str] = {}
+
+
+def streamlit_module():
+    """Il modulo streamlit se il processo gira sotto `streamlit run`, altrimenti None."""
+    st = sys.modules.get("streamlit")
+    if st is None:
+        return None
+    try:
+        from streamlit import runtime as streamlit_runtime
+        return st if streamlit_runtime.exists() else None
+    except Exception:
+        return None
+
+
+def session_state() -> MutableMapping:
+    """Stato della sessione corrente (st.session_state dentro Streamlit)."""
+    st = streamlit_module()
+    if st is not None:
+        return st.session_state
+    return _session_state.get()
+
+
+@contextmanager
+def session_scope(state: Optional[MutableMapping] = None) -> Iterator[MutableMapping]:
+    """
+    Usa uno stato di sessione separato nel contesto corrente (es. un client del server API).
+
+    Args:
+        state: Stato da usare; se None ne viene creato uno vuoto
+    """
+    token = _session_state.set(state if state is not None else {})
+    try:
+        yield _session_state.get()
+    finally:
+        _session_state.reset(token)
+
+
+def set_secrets(values: Dict[str, str]):
+    """Imposta secrets da codice; valgono fuori da Streamlit e prima delle variabili d'ambiente."""
+    _secrets.update(values)
+
+
+def get_secret(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Legge un secret da st.secrets (se sotto Streamlit), da set_secrets() o dall'ambiente."""
+    st = streamlit_module()
+    if st is not None:
+        try:
+            value = st.secrets.get(name)
+        except Exception:
+            # Nessun file secrets.toml
+            value = None
+        if value:
+            return value
+    return _secrets.get(name) or os.getenv(name) or default
+
+
+def has_secret(name: str) -> bool:
+    """True se il secret è configurato esplicitamente (st.secrets o set_secrets, non l'ambiente)."""
+    st = streamlit_module()
+    if st is not None:
+        try:
+            return name in st.secrets
+        except Exception:
+            return False
+    return name in _secrets
+
+
+def warning(message: str):
+    st = streamlit_module()
+    if st is not None:
+        st.warning(message)
+    else:
+        logger.warning(message)
+
+
+def error(message: str):
+    st = streamlit_module()
+    if st is not None:
+        st.error(message)
+    else:
+        logger.error(message)
@@ -0,0 +1,157 @@
+"""
+Scheduler di ripasso a intervalli crescenti (sistema Leitner).
+Ogni parola sta in una "scatola": una risposta corretta la sposta nella scatola
+successiva (intervallo più lungo), una errata la riporta nella prima. La
+prossima parola è quella con la scadenza più vicina, letta da una coda a
+priorità in O(log n) anche per mazzi molto grandi.
+"""
+
+import heapq
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Intervallo (secondi) prima di rivedere una parola, per scatola
+LEITNER_INTERVALS = {
+    1: 60,               # 1 minuto
+    2: 10 * 60,          # 10 minuti
+    3: 60 * 60,          # 1 ora
+    4: 24 * 60 * 60,     # 1 giorno
+    5: 3 * 24 * 60 * 60  # 3 giorni
+}
+MAX_BOX = max(LEITNER_INTERVALS)
+
+
+def schedule_key(word) -> str:
+    """Chiave della parola, coerente con quella usata dai gestori del progresso."""
+    return str(word).lower().strip()
+
+
+class LeitnerScheduler:
+    def __init__(self, words: Sequence, schedules: Optional[Dict[str, Tuple[int, float]]] = None):
+        """
+        Costruisce la coda di ripasso per un mazzo.
+
+        Lo stato per parola esiste solo per le parole già studiate: le parole
+        nuove vengono lette in ordine dal mazzo condiviso con un cursore, così
+        la memoria per sessione cresce con le parole viste e non con il mazzo.
+
+        Args:
+            words: Parole del mazzo, nell'ordine del file (non viene copiato)
+            schedules: Stato salvato per parola: {parola: (scatola, scadenza_epoch)}
+        """
+        schedules = schedules or {}
+        self._words = words
+        # Stato delle parole studiate: chiave -> (scatola, scadenza, versione, indice)
+        self._state: Dict[str, Tuple[int, float, int, int]] = {}
+        heap: List[Tuple[float, int, int, str]] = []
+
+        if schedules:
+            for idx, word in enumerate(words):
+                key = schedule_key(word)
+                if key in schedules and key not in self._state:
+                    box, due = schedules[key]
+                    self._state[key] = (box, due, 0, idx)
+                    heap.append((due, idx, 0, key))
+
+        heapq.heapify(heap)
+        self._heap = heap
+        # Prossima posizione del mazzo da cui cercare parole mai viste
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def _peek_due(self) -> Optional[Tuple[float, int, int, str]]:
+        """Voce valida con la scadenza più vicina, scartando quelle obsolete."""
+        while self._heap:
+            entry = self._heap[0]
+            state = self._state.get(entry[3])
+            if state is not None and state[2] == entry[2]:
+                return entry
+            heapq.heappop(self._heap)
+        return None
+
+    def _new_words(self, exclude: Optional[int]):
+        """Indici delle prossime parole mai viste a partire dal cursore."""
+        while self._cursor < len(self._words) and schedule_key(self._words[self._cursor]) in self._state:
+            self._cursor += 1
+        idx = self._cursor
+        while idx < len(self._words):
+            if idx != exclude and schedule_key(self._words[idx]) not in self._state:
+                return idx
+            idx += 1
+        return None
+
+    def next_index(self, exclude: Optional[int] = None, now: Optional[float] = None) -> int:
+        """
+        Restituisce l'indice della prossima parola da studiare.
+
+        Prima le parole scadute, poi quelle mai viste nell'ordine del file,
+        infine quella con la scadenza più vicina.
+
+        Args:
+            exclude: Indice da evitare se possibile (di solito la parola appena vista)
+        """
+        now = time.time() if now is None else now
+        due_entry = self._peek_due()
+        fallback = None
+        if due_entry is not None and due_entry[1] == exclude:
+            # Guarda la seconda voce valida senza perdere la prima
+            fallback = heapq.heappop(self._heap)
+            due_entry = self._peek_due()
+            heapq.heappush(self._heap, fallback)
+
+        if due_entry is not None and due_entry[0] <= now:
+            return due_entry[1]
+        new_idx = self._new_words(exclude)
+        if new_idx is not None:
+            return new_idx
+        if due_entry is not None:
+            return due_entry[1]
+        if fallback is not None:
+            return fallback[1]
+        return 0
+
+    def record(self, word, is_correct: bool, now: Optional[float] = None,
+               index: Optional[int] = None) -> Tuple[int, float]:
+        """
+        Aggiorna la scatola e la scadenza di una parola dopo una risposta.
+
+        Args:
+            index: Posizione della parola nel mazzo, se nota (evita una ricerca)
+
+        Returns:
+            Nuovo stato (scatola, scadenza_epoch) da salvare nel backend
+        """
+        key = schedule_key(word)
+        now = time.time() if now is None else now
+        if key in self._state:
+            box, _, version, idx = self._state[key]
+        else:
+            idx = index if index is not None else self._find_index(key)
+            if idx is None:
+                return 0, 0.0
+            box, version = 0, 0
+
+        box = min(box + 1, MAX_BOX) if is_correct else 1
+        due = now + LEITNER_INTERVALS[box]
+        version += 1
+        self._state[key] = (box, due, version, idx)
+        heapq.heappush(self._heap, (due, idx, version, key))
+
+        # Evita che le voci obsolete facciano crescere troppo lo heap
+        if len(self._heap) > 2 * len(self._state) + 64:
+            self._heap = [(due, i, v, k) for k, (_, due, v, i) in self._state.items()]
+            heapq.heapify(self._heap)
+        return box, due
+
+    def _find_index(self, key: str) -> Optional[int]:
+        for idx, word in enumerate(self._words):
+            if schedule_key(word) == key:
+                return idx
+        return None
+
+    def get_state(self, word) -> Tuple[int, float]:
+        """Stato (scatola, scadenza) di una parola."""
+        box, due, _, _ = self._state.get(schedule_key(word), (0, 0.0, 0, 0))
+        return box, due
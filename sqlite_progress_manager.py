@@ -0,0 +1,355 @@
+"""
+Backend di progresso su SQLite embedded.
+Pensato per deployment locali/self-hosted: database in modalità WAL, incrementi
+transazionali e statistiche calcolate con aggregati SQL, senza caricare tutte
+le parole in memoria.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from progress_stats import (BULK_BATCH_SIZE, ProgressRecord, ProgressTotals, batched,
+                            normalize_records)
+
+DEFAULT_DB_PATH = os.path.join("UserData", "progress.sqlite3")
+# Utente dell'app locale, a cui appartiene il progresso dei vecchi file JSON
+DEFAULT_USER_ID = "local"
+# Parametri per query IN (...): sotto il limite storico di 999 variabili di SQLite
+MAX_QUERY_PARAMS = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    user_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    word TEXT NOT NULL,
+    correct_count INTEGER NOT NULL DEFAULT 0,
+    wrong_count INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    box INTEGER NOT NULL DEFAULT 0,
+    due_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, file_name, word)
+);
+CREATE TABLE IF NOT EXISTS progress_totals (
+    user_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    words INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    wrong INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, file_name)
+);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    user_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    imported_at REAL NOT NULL,
+    PRIMARY KEY (user_id, file_name)
+);
+"""
+
+
+class SQLiteProgressManager:
+    def __init__(self, file_name: str, db_path: Optional[str] = None, user_id: str = DEFAULT_USER_ID):
+        """
+        Inizializza il gestore del progresso su SQLite.
+
+        Args:
+            file_name: Nome del file Excel (es. "Words.xlsx")
+            db_path: Percorso del database (default da PROGRESS_SQLITE_PATH)
+            user_id: Utente a cui appartiene il progresso
+        """
+        self.file_name = file_name
+        self.user_id = user_id
+        self.db_path = db_path or os.getenv("PROGRESS_SQLITE_PATH", DEFAULT_DB_PATH)
+        # Una connessione per thread: Streamlit esegue ogni script run in un thread
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._migrate_schema()
+        self._import_legacy_progress()
+        self._ensure_totals_row()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_schema(self):
+        """Aggiunge le colonne dello stato di ripasso ai database creati in precedenza."""
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(progress)")}
+        with conn:
+            if "box" not in columns:
+                conn.execute("ALTER TABLE progress ADD COLUMN box INTEGER NOT NULL DEFAULT 0")
+            if "due_at" not in columns:
+                conn.execute("ALTER TABLE progress ADD COLUMN due_at REAL NOT NULL DEFAULT 0")
+
+    def _import_legacy_progress(self):
+        """Importa una sola volta il progresso salvato in precedenza nei file JSON (utente locale)."""
+        if self.user_id != DEFAULT_USER_ID:
+            # I file JSON sono dell'utente locale: gli altri utenti (es. client del server API) partono da zero
+            return
+        conn = self._connection()
+        already_imported = conn.execute(
+            "SELECT 1 FROM legacy_imports WHERE user_id = ? AND file_name = ?",
+            (self.user_id, self.file_name)
+        ).fetchone()
+        if already_imported:
+            return
+
+        # Snapshot JSON e/o log del journal di ProgressManager
+        legacy_prefix = f"{os.path.splitext(self.file_name)[0]}_progress."
+        legacy_dir = "UserData"
+        has_legacy = os.path.isdir(legacy_dir) and any(
+            name.startswith(legacy_prefix) for name in os.listdir(legacy_dir)
+        )
+        rows = []
+        if has_legacy:
+            from progress_manager import get_progress_manager
+            # Il gestore condiviso: una seconda istanza potrebbe compattare i log di un'altra sessione
+            legacy = get_progress_manager(self.file_name)
+            now = time.time()
+            with legacy._lock:
+                rows = [(self.user_id, self.file_name, word, stats.get('correct', 0), stats.get('wrong', 0), now,
+                         stats.get('box', 0), stats.get('due', 0.0))
+                        for word, stats in legacy.progress.items()]
+
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO progress "
+                "(user_id, file_name, word, correct_count, wrong_count, updated_at, box, due_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO legacy_imports (user_id, file_name, imported_at) VALUES (?, ?, ?)",
+                (self.user_id, self.file_name, time.time())
+            )
+
+    def _aggregate_totals(self, conn: sqlite3.Connection) -> ProgressTotals:
+        """Ricalcolo completo dei totali con un aggregato SQL."""
+        words, correct, wrong = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(correct_count), 0), COALESCE(SUM(wrong_count), 0) "
+            "FROM progress WHERE user_id = ? AND file_name = ?",
+            (self.user_id, self.file_name)
+        ).fetchone()
+        return ProgressTotals(words, correct, wrong)
+
+    def _ensure_totals_row(self):
+        """Crea la riga dei totali per database creati prima della tabella progress_totals."""
+        conn = self._connection()
+        with conn:
+            exists = conn.execute(
+                "SELECT 1 FROM progress_totals WHERE user_id = ? AND file_name = ?",
+                (self.user_id, self.file_name)
+            ).fetchone()
+            if not exists:
+                self._write_totals(conn, self._aggregate_totals(conn))
+
+    def _write_totals(self, conn: sqlite3.Connection, totals: ProgressTotals):
+        conn.execute(
+            "INSERT OR REPLACE INTO progress_totals (user_id, file_name, words, correct, wrong) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.user_id, self.file_name, totals.words, totals.correct, totals.wrong)
+        )
+
+    def _add_to_totals(self, conn: sqlite3.Connection, words: int, correct: int, wrong: int):
+        conn.execute(
+            "UPDATE progress_totals SET words = words + ?, correct = correct + ?, wrong = wrong + ? "
+            "WHERE user_id = ? AND file_name = ?",
+            (words, correct, wrong, self.user_id, self.file_name)
+        )
+
+    def get_word_stats(self, word: str) -> Tuple[int, int]:
+        """
+        Ottiene le statistiche per una parola.
+
+        Args:
+            word: La parola da controllare
+
+        Returns:
+            Tupla (risposte_corrette, risposte_errate)
+        """
+        row = self._connection().execute(
+            "SELECT correct_count, wrong_count FROM progress WHERE user_id = ? AND file_name = ? AND word = ?",
+            (self.user_id, self.file_name, word.lower().strip())
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def record_answer(self, word: str, is_correct: bool):
+        """
+        Registra una risposta con un incremento transazionale.
+
+        Args:
+            word: La parola per cui registrare la risposta
+            is_correct: True se la risposta è corretta, False altrimenti
+        """
+        correct, wrong = int(is_correct), int(not is_correct)
+        key = (self.user_id, self.file_name, word.lower().strip())
+        conn = self._connection()
+        with conn:
+            # Incremento e totali nella stessa transazione. BEGIN IMMEDIATE prende subito il
+            # lock di scrittura: due processi non possono vedere entrambi la parola come nuova
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute(
+                "SELECT 1 FROM progress WHERE user_id = ? AND file_name = ? AND word = ?", key
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO progress (user_id, file_name, word, correct_count, wrong_count, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, file_name, word) DO UPDATE SET "
+                "correct_count = correct_count + excluded.correct_count, "
+                "wrong_count = wrong_count + excluded.wrong_count, updated_at = excluded.updated_at",
+                (*key, correct, wrong, time.time())
+            )
+            self._add_to_totals(conn, 0 if exists else 1, correct, wrong)
+
+    def _stored_totals(self) -> ProgressTotals:
+        row = self._connection().execute(
+            "SELECT words, correct, wrong FROM progress_totals WHERE user_id = ? AND file_name = ?",
+            (self.user_id, self.file_name)
+        ).fetchone()
+        return ProgressTotals(*row) if row else ProgressTotals()
+
+    def get_total_stats(self) -> Dict[str, int]:
+        """Ottiene le statistiche totali dalla riga dei totali: una sola lettura per chiave."""
+        return self._stored_totals().as_stats()
+
+    def verify_totals(self) -> bool:
+        """Verifica che i totali incrementali coincidano con un ricalcolo completo."""
+        return self._stored_totals() == self._aggregate_totals(self._connection())
+
+    def get_difficult_words(self, min_attempts: int = 3, limit: Optional[int] = None) -> list:
+        """Ottiene le parole più difficili, filtrate, ordinate e limitate direttamente in SQL."""
+        rows = self._connection().execute(
+            "SELECT word, correct_count, wrong_count, "
+            "CAST(wrong_count AS REAL) / (correct_count + wrong_count) AS error_rate "
+            "FROM progress WHERE user_id = ? AND file_name = ? "
+            "AND correct_count + wrong_count >= ? AND wrong_count > correct_count "
+            "ORDER BY error_rate DESC, rowid LIMIT ?",
+            (self.user_id, self.file_name, min_attempts, -1 if limit is None else limit)
+        ).fetchall()
+        return [{'word': word, 'correct': correct, 'wrong': wrong, 'error_rate': error_rate}
+                for word, correct, wrong, error_rate in rows]
+
+    def get_schedules(self) -> Dict[str, Tuple[int, float]]:
+        """Stato di ripasso per parola: {parola: (scatola, scadenza)}."""
+        rows = self._connection().execute(
+            "SELECT word, box, due_at FROM progress WHERE user_id = ? AND file_name = ? AND box > 0",
+            (self.user_id, self.file_name)
+        ).fetchall()
+        return {word: (box, due_at) for word, box, due_at in rows}
+
+    def save_schedule(self, word: str, box: int, due: float):
+        """Salva lo stato di ripasso di una parola già registrata."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE progress SET box = ?, due_at = ? WHERE user_id = ? AND file_name = ? AND word = ?",
+                (box, due, self.user_id, self.file_name, word.lower().strip())
+            )
+
+    def iter_progress(self, batch_size: int = BULK_BATCH_SIZE,
+                      after: Optional[str] = None) -> Iterator[List[ProgressRecord]]:
+        """
+        Esporta il progresso a blocchi, in ordine di parola, senza caricare tutte le parole.
+
+        Ogni blocco è una query sulla chiave primaria che riparte dall'ultima parola
+        letta: nessuna transazione resta aperta tra un blocco e l'altro.
+
+        Args:
+            after: Riprende dalla parola successiva a questa (es. da un checkpoint)
+        """
+        conn = self._connection()
+        last = after or ""
+        while True:
+            rows = conn.execute(
+                "SELECT word, correct_count, wrong_count, box, due_at FROM progress "
+                "WHERE user_id = ? AND file_name = ? AND word > ? ORDER BY word LIMIT ?",
+                (self.user_id, self.file_name, last, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [ProgressRecord(*row) for row in rows]
+            last = rows[-1][0]
+
+    def upsert_progress(self, records: Iterable[ProgressRecord]):
+        """
+        Imposta il progresso completo delle parole indicate in una sola transazione.
+
+        I totali vengono corretti con la differenza rispetto ai valori precedenti,
+        senza ricalcolare l'aggregato su tutto il mazzo.
+        """
+        records = normalize_records(records)
+        if not records:
+            return
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            previous: Dict[str, Tuple[int, int]] = {}
+            for chunk in batched(records, MAX_QUERY_PARAMS):
+                rows = conn.execute(
+                    "SELECT word, correct_count, wrong_count FROM progress "
+                    f"WHERE user_id = ? AND file_name = ? AND word IN ({','.join('?' * len(chunk))})",
+                    (self.user_id, self.file_name, *chunk)
+                )
+                previous.update((word, (correct, wrong)) for word, correct, wrong in rows)
+            conn.executemany(
+                "INSERT INTO progress (user_id, file_name, word, correct_count, wrong_count, updated_at, box, due_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, file_name, word) DO UPDATE SET "
+                "correct_count = excluded.correct_count, wrong_count = excluded.wrong_count, "
+                "updated_at = excluded.updated_at, box = excluded.box, due_at = excluded.due_at",
+                [(self.user_id, self.file_name, word, record.correct, record.wrong, now, record.box, record.due)
+                 for word, record in records.items()]
+            )
+            delta = ProgressTotals()
+            for word, record in records.items():
+                delta.update(previous.get(word), (record.correct, record.wrong))
+            self._add_to_totals(conn, delta.words, delta.correct, delta.wrong)
+
+    def flush(self):
+        """
+        Rende durevoli su disco le transazioni già confermate.
+
+        Con synchronous=NORMAL il WAL non viene sincronizzato a ogni commit:
+        il checkpoint lo sincronizza e lo riporta nel database.
+        """
+        self._connection().execute("PRAGMA wal_checkpoint(FULL)")
+
+    def reset_word_progress(self, word: str):
+        """Reset del progresso per una specifica parola."""
+        key = (self.user_id, self.file_name, word.lower().strip())
+        conn = self._connection()
+        with conn:
+            row = conn.execute(
+                "SELECT correct_count, wrong_count FROM progress WHERE user_id = ? AND file_name = ? AND word = ?",
+                key
+            ).fetchone()
+            if row:
+                conn.execute("DELETE FROM progress WHERE user_id = ? AND file_name = ? AND word = ?", key)
+                self._add_to_totals(conn, -1, -row[0], -row[1])
+
+    def reset_all_progress(self):
+        """Reset di tutto il progresso del file."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM progress WHERE user_id = ? AND file_name = ?",
+                (self.user_id, self.file_name)
+            )
+            self._write_totals(conn, ProgressTotals())
+
+    def get_status_info(self) -> Dict[str, str]:
+        return {
+            "storage_type": "SQLite locale (WAL)",
+            "is_persistent": "Sì",
+            "db_path": self.db_path
+        }
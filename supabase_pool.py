@@ -0,0 +1,159 @@
+"""
+Client Supabase condiviso da tutto il processo.
+Il client viene creato una sola volta e riusato da tutte le sessioni e da tutti
+i mazzi; la verifica dello schema avviene all'avvio e un thread in background
+controlla periodicamente la connessione, ricreando il client se non risponde.
+"""
+
+import importlib.util
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import perf_metrics
+
+# Il pacchetto supabase è pesante da importare: si controlla solo che sia installato
+# e lo si importa alla creazione del primo client
+SUPABASE_AVAILABLE = importlib.util.find_spec("supabase") is not None
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL_SECONDS = 60.0
+
+
+def create_client(url: str, key: str):
+    """Crea un client Supabase, importando il pacchetto al primo uso."""
+    from supabase import create_client as supabase_create_client
+    return supabase_create_client(url, key)
+
+
+class SupabasePool:
+    """
+    Client Supabase condiviso con warm-up e controlli di salute.
+
+    Espone table() e rpc() come il client originale, delegando sempre al
+    client corrente: chi lo usa non deve accorgersi delle riconnessioni.
+    """
+
+    def __init__(self, url: str, key: str, health_interval: float = HEALTH_CHECK_INTERVAL_SECONDS):
+        """
+        Crea il client e verifica lo schema.
+
+        Args:
+            url: URL del progetto Supabase
+            key: Chiave API
+            health_interval: Secondi tra due controlli della connessione
+        """
+        self.url = url
+        self.key = key
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._client = create_client(url, key)
+        self.healthy = True
+        self.schema_ok = False
+        # Colonne box/due_at dello stato di ripasso (assenti nei database non migrati)
+        self.has_schedule_columns = False
+        self.reconnects = 0
+        self.last_check = 0.0
+        self._stop = threading.Event()
+
+        self._check_schema()
+        self._thread = threading.Thread(target=self._health_loop, name="supabase-health", daemon=True)
+        self._thread.start()
+
+    @property
+    def client(self):
+        return self._client
+
+    def table(self, name: str):
+        # Ogni query costruita dall'app viene eseguita una volta: un round trip
+        perf_metrics.count_global("supabase_round_trips")
+        return self._client.table(name)
+
+    def rpc(self, name: str, params: Optional[dict] = None):
+        perf_metrics.count_global("supabase_round_trips")
+        return self._client.rpc(name, params or {})
+
+    def _probe(self, client, columns: str = "word") -> bool:
+        try:
+            client.table("progress").select(columns).limit(1).execute()
+            return True
+        except Exception as e:
+            logger.warning("Controllo Supabase fallito (%s): %s", columns, e)
+            return False
+
+    def _check_schedule_columns(self, client):
+        self.has_schedule_columns = self._probe(client, "box, due_at")
+        if not self.has_schedule_columns:
+            logger.warning("Colonne box/due_at assenti: lo stato di ripasso non viene salvato "
+                           "(vedi ALTER TABLE in DEPLOYMENT.md)")
+
+    def _check_schema(self):
+        """Verifica una sola volta, all'avvio, che la tabella progress sia raggiungibile."""
+        self.schema_ok = self._probe(self._client)
+        self.healthy = self.schema_ok
+        self.last_check = time.time()
+        if not self.schema_ok:
+            # In un deployment reale la tabella si crea con le migrations (vedi DEPLOYMENT.md)
+            logger.warning("Tabella progress non raggiungibile: verificare lo schema su Supabase")
+        else:
+            self._check_schedule_columns(self._client)
+
+    def check_health(self) -> bool:
+        """Controlla la connessione e ricrea il client se non risponde."""
+        healthy = self._probe(self._client)
+        if not healthy:
+            try:
+                client = create_client(self.url, self.key)
+                if self._probe(client):
+                    with self._lock:
+                        self._client = client
+                        self.reconnects += 1
+                    healthy = True
+                    logger.info("Client Supabase ricreato dopo un controllo fallito")
+            except Exception as e:
+                logger.warning("Riconnessione a Supabase fallita: %s", e)
+        if healthy and not self.has_schedule_columns:
+            # Le colonne possono essere state aggiunte dopo l'avvio
+            self._check_schedule_columns(self._client)
+        self.healthy = healthy
+        self.last_check = time.time()
+        return healthy
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def close(self):
+        """Ferma i controlli periodici."""
+        self._stop.set()
+
+    def get_status_info(self) -> Dict[str, str]:
+        return {
+            "connection_healthy": "Sì" if self.healthy else "No",
+            "reconnects": self.reconnects,
+            "schedule_columns": "Sì" if self.has_schedule_columns else "No",
+            "last_health_check_seconds": round(time.time() - self.last_check)
+        }
+
+
+_shared_pool: Optional[SupabasePool] = None
+_shared_credentials: Optional[Tuple[str, str]] = None
+_shared_lock = threading.Lock()
+
+
+def get_supabase_pool(url: str, key: str) -> SupabasePool:
+    """
+    Restituisce il client condiviso, creandolo (con verifica dello schema) al primo uso.
+
+    Se le credenziali cambiano il client precedente viene sostituito.
+    """
+    global _shared_pool, _shared_credentials
+    with _shared_lock:
+        if _shared_pool is None or _shared_credentials != (url, key):
+            if _shared_pool is not None:
+                _shared_pool.close()
+            _shared_pool = SupabasePool(url, key)
+            _shared_credentials = (url, key)
+        return _shared_pool
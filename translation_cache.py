@@ -0,0 +1,232 @@
+"""
+Cache delle traduzioni a due livelli davanti a GoogleTranslator.
+Livello 1: LRU in memoria, condivisa da tutte le sessioni del processo.
+Livello 2: database SQLite su disco, persistente tra i riavvii, con eviction
+delle voci usate meno di recente quando supera la dimensione massima.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import perf_metrics
+
+CACHE_PATH = os.path.join("Cache", "translations.sqlite3")
+# Gli aggiornamenti di last_used delle hit su disco vengono scritti a gruppi:
+# al più ogni TOUCH_BATCH_SIZE hit o TOUCH_INTERVAL_SECONDS secondi
+TOUCH_BATCH_SIZE = 256
+TOUCH_INTERVAL_SECONDS = 5.0
+
+
+def normalize_word(word) -> str:
+    """Forma normalizzata della parola usata nella chiave della cache."""
+    return str(word).strip().lower()
+
+
+class TranslationCache:
+    def __init__(self, db_path: str = CACHE_PATH, memory_size: int = 4096,
+                 disk_max_entries: int = 200_000):
+        """
+        Inizializza la cache.
+
+        Args:
+            db_path: Percorso del database SQLite (livello su disco)
+            memory_size: Numero massimo di voci nella LRU in memoria
+            disk_max_entries: Numero massimo di voci su disco prima dell'eviction
+        """
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+        # Hit su disco il cui last_used non è ancora stato scritto: chiave -> istante d'uso
+        self._pending_touches: Dict[Tuple[str, str, str], float] = {}
+        self._last_touch_flush = time.monotonic()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._init_disk()
+
+    def _init_disk(self):
+        """Apre il database su disco; se non è possibile la cache resta solo in memoria."""
+        try:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    src TEXT NOT NULL,
+                    dest TEXT NOT NULL,
+                    word TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (src, dest, word)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)")
+            conn.commit()
+            self._disk_count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            self._conn = conn
+        except sqlite3.Error:
+            self._conn = None
+
+    def _remember(self, key: Tuple[str, str, str], translation: str):
+        """Inserisce nella LRU in memoria (da chiamare con il lock acquisito)."""
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, word, src: str, dest: str, record_stats: bool = True) -> Optional[str]:
+        """
+        Cerca una traduzione nella cache senza mai chiamare la rete.
+
+        Args:
+            word: Parola da tradurre
+            src: Codice lingua sorgente
+            dest: Codice lingua di destinazione
+            record_stats: False per non aggiornare i contatori (es. controlli in background)
+        """
+        key = (src, dest, normalize_word(word))
+        with self._lock:
+            translation = self._memory.get(key)
+            if translation is not None:
+                self._memory.move_to_end(key)
+                if record_stats:
+                    self.counters['memory_hits'] += 1
+                return translation
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT translation FROM translations WHERE src = ? AND dest = ? AND word = ?",
+                        key
+                    ).fetchone()
+                    if row:
+                        self._pending_touches[key] = time.time()
+                        if (len(self._pending_touches) >= TOUCH_BATCH_SIZE or
+                                time.monotonic() - self._last_touch_flush >= TOUCH_INTERVAL_SECONDS):
+                            self._flush_touches()
+                        self._remember(key, row[0])
+                        if record_stats:
+                            self.counters['disk_hits'] += 1
+                        return row[0]
+                except sqlite3.Error:
+                    pass
+
+            if record_stats:
+                self.counters['misses'] += 1
+            return None
+
+    def put(self, word, src: str, dest: str, translation: str):
+        """Salva una traduzione in entrambi i livelli."""
+        key = (src, dest, normalize_word(word))
+        with self._lock:
+            self._remember(key, translation)
+            if self._conn is None:
+                return
+            try:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM translations WHERE src = ? AND dest = ? AND word = ?", key
+                ).fetchone() is not None
+                self._pending_touches.pop(key, None)
+                self._conn.execute(
+                    "INSERT INTO translations (src, dest, word, translation, last_used) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (src, dest, word) DO UPDATE SET "
+                    "translation = excluded.translation, last_used = excluded.last_used",
+                    (*key, translation, time.time())
+                )
+                self._conn.commit()
+                # Una voce già presente viene solo aggiornata: non cambia il conteggio
+                if not exists:
+                    self._disk_count += 1
+                if self._disk_count > self.disk_max_entries:
+                    self._evict_disk()
+            except sqlite3.Error:
+                pass
+
+    def _flush_touches(self):
+        """Scrive in un'unica transazione i last_used delle hit su disco (con il lock acquisito)."""
+        self._last_touch_flush = time.monotonic()
+        if not self._pending_touches or self._conn is None:
+            return
+        touches = [(used, *key) for key, used in self._pending_touches.items()]
+        self._pending_touches.clear()
+        try:
+            self._conn.executemany(
+                "UPDATE translations SET last_used = ? WHERE src = ? AND dest = ? AND word = ?",
+                touches
+            )
+            self._conn.commit()
+        except sqlite3.Error:
+            # last_used serve solo all'eviction: perderne qualcuno non altera le traduzioni
+            pass
+
+    def flush(self):
+        """Scrive subito gli aggiornamenti di last_used ancora in attesa."""
+        with self._lock:
+            self._flush_touches()
+
+    def _evict_disk(self):
+        """Elimina le voci usate meno di recente fino al 90% della capienza."""
+        # L'ordine per last_used deve tenere conto delle hit ancora in attesa
+        self._flush_touches()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        excess = self._disk_count - int(self.disk_max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM translations WHERE rowid IN "
+            "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+        self._disk_count -= excess
+        self.counters['evictions'] += excess
+
+    def translate(self, word, src: str, dest: str) -> str:
+        """
+        Restituisce la traduzione dalla cache o, se assente, da GoogleTranslator.
+
+        Le eccezioni del traduttore vengono propagate al chiamante.
+        """
+        translation = self.get(word, src, dest)
+        if translation is not None:
+            return translation
+
+        perf_metrics.count_global("translation_requests")
+        # Importato solo alla prima traduzione online: con la cache calda non serve mai
+        from deep_translator import GoogleTranslator
+        translation = GoogleTranslator(source=src, target=dest).translate(str(word))
+        if translation:
+            self.put(word, src, dest, translation)
+        return translation
+
+    def get_stats(self) -> Dict[str, int]:
+        """Contatori di hit/miss e dimensioni dei due livelli."""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = self._disk_count
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        hits = stats['memory_hits'] + stats['disk_hits']
+        stats['hit_rate_percentage'] = round(hits / lookups * 100, 1) if lookups > 0 else 0
+        return stats
+
+
+_shared_cache: Optional[TranslationCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_translation_cache() -> TranslationCache:
+    """Restituisce la cache condivisa dal processo, creandola al primo uso."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = TranslationCache()
+    return _shared_cache